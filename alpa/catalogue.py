@@ -0,0 +1,303 @@
+"""
+On-disk catalogue of packages built from metadata of every package branch, so
+repo-wide questions don't need a checkout of each branch.
+"""
+import logging
+import re
+import sqlite3
+from contextlib import closing
+from typing import Optional
+
+from yaml import YAMLError, safe_load
+
+from alpa.config.alpa_repo import AlpaRepoConfig
+from alpa.constants import (
+    ALPA_CONFIG_FILE_NAMES,
+    ALPA_FEAT_BRANCH_PREFIX,
+    MAIN_BRANCH,
+    METADATA_FILE_NAMES,
+)
+from alpa.exceptions import AlpaConfException
+from alpa.git import GitCMD
+
+
+logger = logging.getLogger(__name__)
+
+
+_SCHEMA_VERSION = 1
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE packages (
+    name TEXT PRIMARY KEY,
+    tip TEXT NOT NULL,
+    spec_name TEXT,
+    spec_version TEXT,
+    autoupdate INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE maintainers (
+    package TEXT NOT NULL REFERENCES packages(name) ON DELETE CASCADE,
+    nick TEXT,
+    email TEXT
+);
+CREATE TABLE targets (
+    package TEXT NOT NULL REFERENCES packages(name) ON DELETE CASCADE,
+    target TEXT NOT NULL
+);
+CREATE TABLE arches (
+    package TEXT NOT NULL REFERENCES packages(name) ON DELETE CASCADE,
+    arch TEXT NOT NULL
+);
+CREATE INDEX maintainers_nick ON maintainers(nick);
+CREATE INDEX maintainers_email ON maintainers(email);
+CREATE INDEX maintainers_package ON maintainers(package);
+CREATE INDEX targets_target ON targets(target);
+CREATE INDEX targets_package ON targets(package);
+CREATE INDEX arches_arch ON arches(arch);
+CREATE INDEX arches_package ON arches(package);
+"""
+
+_SPEC_TAG_REGEX = r"^{tag}:\s*(\S+)"
+
+
+class PackageCatalogue:
+    """
+    SQLite database in `<git common dir>/alpa/catalogue.sqlite` indexing
+    metadata, spec Name/Version and tip commit of every package branch of
+    a remote. Only branches whose tip changed are read again on update.
+    """
+
+    DB_FILE_NAME = "catalogue.sqlite"
+
+    def __init__(self, git: GitCMD, remote: str) -> None:
+        self.git = git
+        self.remote = remote
+        self._db = sqlite3.connect(str(git.alpa_dir / self.DB_FILE_NAME))
+        self._db.execute("PRAGMA foreign_keys = ON")
+        self._ensure_schema()
+
+    def _ensure_schema(self) -> None:
+        (version,) = self._db.execute("PRAGMA user_version").fetchone()
+        if version == _SCHEMA_VERSION:
+            return
+
+        logger.debug(f"Creating package catalogue schema version {_SCHEMA_VERSION}")
+        with self._db:
+            for (table,) in self._db.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            ).fetchall():
+                self._db.execute(f"DROP TABLE {table}")
+
+            self._db.executescript(_SCHEMA)
+            self._db.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+    def close(self) -> None:
+        self._db.close()
+
+    def _remote_tips(self) -> dict[str, str]:
+        # recently fetched refs may have been updated by another command
+        output = self.git.git_cmd(
+            [
+                "for-each-ref",
+                "--format=%(refname:lstrip=3) %(objectname)",
+                f"refs/remotes/{self.remote}/",
+            ],
+            use_cache=False,
+        ).stdout
+        tips = {}
+        for line in output.splitlines():
+            name, _, tip = line.partition(" ")
+            tips[name] = tip
+
+        return tips
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,))
+        result = row.fetchone()
+        return None if result is None else result[0]
+
+    def _load_repo_config(self) -> Optional[AlpaRepoConfig]:
+        content = self.git.read_first_blob(
+            f"{self.remote}/{MAIN_BRANCH}", ALPA_CONFIG_FILE_NAMES
+        )
+        if content is None:
+            return None
+
+        try:
+            return AlpaRepoConfig._config_from_dict(safe_load(content))
+        except (YAMLError, AlpaConfException, KeyError, TypeError) as exc:
+            logger.warning(f"Unable to parse alpa config of {self.remote}: {exc}")
+            return None
+
+    @staticmethod
+    def _parse_spec_tag(spec: Optional[str], tag: str) -> Optional[str]:
+        if spec is None:
+            return None
+
+        match = re.search(_SPEC_TAG_REGEX.format(tag=tag), spec, re.MULTILINE)
+        return None if match is None else match.group(1)
+
+    @staticmethod
+    def _as_set(package: str, key: str, value: object) -> set[str]:
+        if value is None:
+            return set()
+
+        # single target or arch written without a list
+        if isinstance(value, str):
+            return {value}
+
+        if isinstance(value, list) and all(isinstance(item, str) for item in value):
+            return set(value)
+
+        logger.warning(f"Ignoring {key} of {package}, not a list of strings")
+        return set()
+
+    @staticmethod
+    def _maintainers(package: str, value: object) -> list[tuple]:
+        if value is None:
+            return []
+
+        if not isinstance(value, list):
+            logger.warning(f"Ignoring maintainers of {package}, not a list")
+            return []
+
+        maintainers = []
+        for maintainer in value:
+            user = maintainer.get("user") if isinstance(maintainer, dict) else None
+            if not isinstance(user, dict):
+                logger.warning(f"Ignoring malformed maintainer of {package}")
+                continue
+
+            maintainers.append((package, user.get("nick"), user.get("email")))
+
+        return maintainers
+
+    def _index_package(
+        self, package: str, tip: str, repo_config: Optional[AlpaRepoConfig]
+    ) -> None:
+        ref = f"{self.remote}/{package}"
+        metadata: dict = {}
+        raw_metadata = self.git.read_first_blob(ref, METADATA_FILE_NAMES)
+        if raw_metadata is not None:
+            try:
+                metadata = safe_load(raw_metadata) or {}
+            except YAMLError as exc:
+                logger.warning(f"Unable to parse metadata of {package}: {exc}")
+
+        if not isinstance(metadata, dict):
+            logger.warning(f"Ignoring metadata of {package}, not a mapping")
+            metadata = {}
+
+        spec = self.git.read_blob(ref, f"{package}.spec")
+        self._db.execute("DELETE FROM packages WHERE name = ?", (package,))
+        self._db.execute(
+            "INSERT INTO packages VALUES (?, ?, ?, ?, ?)",
+            (
+                package,
+                tip,
+                self._parse_spec_tag(spec, "Name"),
+                self._parse_spec_tag(spec, "Version"),
+                int(metadata.get("autoupdate") is not None),
+            ),
+        )
+
+        maintainers = self._maintainers(package, metadata.get("maintainers"))
+        # same merging as in MetadataConfig
+        targets = self._as_set(package, "targets", metadata.get("targets"))
+        arches = self._as_set(package, "arch", metadata.get("arch"))
+        if repo_config is not None and repo_config.targets is not None:
+            targets |= repo_config.targets
+
+        if repo_config is not None and repo_config.arch is not None:
+            arches |= repo_config.arch
+        elif not arches:
+            arches = {"x86_64"}
+
+        self._db.executemany("INSERT INTO maintainers VALUES (?, ?, ?)", maintainers)
+        self._db.executemany(
+            "INSERT INTO targets VALUES (?, ?)", [(package, t) for t in targets]
+        )
+        self._db.executemany(
+            "INSERT INTO arches VALUES (?, ?)", [(package, a) for a in arches]
+        )
+
+    def update(self) -> int:
+        """
+        Indexes package branches whose remote tip changed since the last update
+        and drops deleted ones. Returns number of (re)indexed packages.
+        """
+        tips = self._remote_tips()
+        main_tip = tips.pop(MAIN_BRANCH, "")
+        tips.pop("HEAD", None)
+        package_tips = {
+            name: tip
+            for name, tip in tips.items()
+            if not name.startswith(ALPA_FEAT_BRANCH_PREFIX)
+        }
+
+        with self._db:
+            if self._get_meta("main_tip") != main_tip:
+                # repo config may have changed targets or arch of every package
+                self._db.execute("DELETE FROM packages")
+                self._db.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('main_tip', ?)", (main_tip,)
+                )
+
+            indexed_tips = dict(
+                self._db.execute("SELECT name, tip FROM packages").fetchall()
+            )
+            removed = indexed_tips.keys() - package_tips.keys()
+            self._db.executemany(
+                "DELETE FROM packages WHERE name = ?", [(name,) for name in removed]
+            )
+
+            changed = [
+                name
+                for name, tip in package_tips.items()
+                if indexed_tips.get(name) != tip
+            ]
+            repo_config = self._load_repo_config() if changed else None
+            for package in changed:
+                self._index_package(package, package_tips[package], repo_config)
+
+        logger.debug(
+            f"Package catalogue updated: {len(changed)} indexed, {len(removed)} removed"
+        )
+        return len(changed)
+
+    def query(
+        self,
+        prefix: str = "",
+        maintainer: Optional[str] = None,
+        target: Optional[str] = None,
+        arch: Optional[str] = None,
+        autoupdate: bool = False,
+    ) -> list[str]:
+        conditions = []
+        params: list[str] = []
+        if prefix:
+            conditions.append("name >= ? AND name < ?")
+            params += [prefix, prefix + chr(0x10FFFF)]
+
+        if maintainer is not None:
+            conditions.append(
+                "name IN (SELECT package FROM maintainers WHERE nick = ? OR email = ?)"
+            )
+            params += [maintainer, maintainer]
+
+        if target is not None:
+            conditions.append("name IN (SELECT package FROM targets WHERE target = ?)")
+            params.append(target)
+
+        if arch is not None:
+            conditions.append("name IN (SELECT package FROM arches WHERE arch = ?)")
+            params.append(arch)
+
+        if autoupdate:
+            conditions.append("autoupdate = 1")
+
+        sql = "SELECT name FROM packages"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+
+        with closing(self._db.execute(sql + " ORDER BY name", params)) as cursor:
+            return [name for (name,) in cursor.fetchall()]
@@ -0,0 +1,245 @@
+"""
+Build status of the pull request of a package, aggregated from check runs and
+commit statuses of its head commit.
+"""
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from alpa.constants import (
+    CHECKS_POLL_BACKOFF,
+    CHECKS_POLL_MAX_INTERVAL,
+    CHECKS_POLL_MIN_INTERVAL,
+    CheckStateEnum,
+)
+from alpa.gh import GithubAPI, GithubRepo
+
+
+logger = logging.getLogger(__name__)
+
+
+# open PRs of the branch with check runs and statuses of their head commit
+CHECKS_QUERY = """
+query($owner: String!, $name: String!, $head: String!, $base: String!) {
+  repository(owner: $owner, name: $name) {
+    pullRequests(
+      headRefName: $head
+      baseRefName: $base
+      states: OPEN
+      first: 10
+      orderBy: {field: CREATED_AT, direction: DESC}
+    ) {
+      nodes {
+        number
+        url
+        headRefOid
+        headRepository { nameWithOwner }
+        commits(last: 1) {
+          nodes {
+            commit {
+              statusCheckRollup {
+                contexts(first: 100) {
+                  totalCount
+                  nodes {
+                    __typename
+                    ... on CheckRun { name status conclusion detailsUrl }
+                    ... on StatusContext { context state targetUrl }
+                  }
+                }
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+_PASSED_CONCLUSIONS = {"SUCCESS", "NEUTRAL", "SKIPPED"}
+_STATUS_STATES = {
+    "SUCCESS": CheckStateEnum.success,
+    "PENDING": CheckStateEnum.pending,
+    "EXPECTED": CheckStateEnum.pending,
+    "FAILURE": CheckStateEnum.failure,
+    "ERROR": CheckStateEnum.failure,
+}
+
+
+@dataclass
+class CheckResult:
+    name: str
+    state: CheckStateEnum
+    url: Optional[str]
+
+    @classmethod
+    def from_graphql(cls, context: dict[str, Any]) -> "CheckResult":
+        if context["__typename"] == "CheckRun":
+            if context["status"] != "COMPLETED":
+                state = CheckStateEnum.pending
+            elif context["conclusion"] in _PASSED_CONCLUSIONS:
+                state = CheckStateEnum.success
+            else:
+                state = CheckStateEnum.failure
+
+            return cls(context["name"], state, context["detailsUrl"])
+
+        return cls(
+            context["context"],
+            _STATUS_STATES.get(context["state"], CheckStateEnum.pending),
+            context["targetUrl"],
+        )
+
+
+@dataclass
+class PullRequestChecks:
+    number: int
+    url: str
+    head_sha: str
+    checks: list[CheckResult]
+    # the PR has more checks than fit into the query
+    truncated: bool = False
+
+    @classmethod
+    def from_graphql(cls, pull_request: dict[str, Any]) -> "PullRequestChecks":
+        checks = []
+        truncated = False
+        for commit in pull_request["commits"]["nodes"]:
+            rollup = commit["commit"]["statusCheckRollup"]
+            if rollup is None:
+                continue
+
+            contexts = rollup["contexts"]
+            checks += [CheckResult.from_graphql(node) for node in contexts["nodes"]]
+            truncated = contexts["totalCount"] > len(contexts["nodes"])
+
+        return cls(
+            number=pull_request["number"],
+            url=pull_request["url"],
+            head_sha=pull_request["headRefOid"],
+            checks=checks,
+            truncated=truncated,
+        )
+
+    @property
+    def state(self) -> CheckStateEnum:
+        """Pending until the first check reports, failed if any check failed"""
+        states = {check.state for check in self.checks}
+        if CheckStateEnum.failure in states:
+            return CheckStateEnum.failure
+
+        if CheckStateEnum.pending in states or not states:
+            return CheckStateEnum.pending
+
+        return CheckStateEnum.success
+
+
+class ChecksWatcher:
+    """
+    Finds the open PR of `head` branch of `head_repo` against `base` branch of
+    `repo` and gets all its checks by one GraphQL query.
+
+    Watching polls the PR, its check runs and statuses by REST requests
+    conditional on the previous responses. GitHub doesn't count unchanged
+    responses against the rate limit, the GraphQL query is repeated only after
+    some of them changed. The poll interval grows while nothing changes.
+    """
+
+    def __init__(
+        self,
+        api: GithubAPI,
+        repo: GithubRepo,
+        head_repo: GithubRepo,
+        head: str,
+        base: str,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.api = api
+        self.repo = repo
+        self.head_repo = head_repo
+        self.head = head
+        self.base = base
+        self._sleep = sleep
+
+    @property
+    def _full_name(self) -> str:
+        return f"{self.repo.namespace}/{self.repo.repo_name}"
+
+    def fetch(self) -> Optional[PullRequestChecks]:
+        _, response = self.api.client.requester.graphql_query(
+            CHECKS_QUERY,
+            {
+                "owner": self.repo.namespace,
+                "name": self.repo.repo_name,
+                "head": self.head,
+                "base": self.base,
+            },
+        )
+        head = f"{self.head_repo.namespace}/{self.head_repo.repo_name}".lower()
+        pull_requests = response["data"]["repository"]["pullRequests"]["nodes"]
+        for pull_request in pull_requests:
+            # branches of other forks may have the same name
+            head_repository = pull_request["headRepository"] or {}
+            if head_repository.get("nameWithOwner", "").lower() == head:
+                return PullRequestChecks.from_graphql(pull_request)
+
+        return None
+
+    def _fingerprint(self, checks: PullRequestChecks) -> tuple:
+        requester = self.api.client.requester
+        paths = [
+            f"/repos/{self._full_name}/pulls/{checks.number}",
+            f"/repos/{self._full_name}/commits/{checks.head_sha}/check-runs"
+            "?per_page=100",
+            f"/repos/{self._full_name}/commits/{checks.head_sha}/status",
+        ]
+        return tuple(
+            str(requester.requestJsonAndCheck("GET", path)[1]) for path in paths
+        )
+
+    def watch(
+        self,
+        on_change: Callable[[Optional[PullRequestChecks]], None],
+        timeout: Optional[float] = None,
+    ) -> Optional[PullRequestChecks]:
+        """
+        Calls `on_change` with the checks every time they change until none of
+        them is pending, the PR is closed or `timeout` seconds pass.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        checks = self.fetch()
+        on_change(checks)
+        if checks is None:
+            return None
+
+        fingerprint = self._fingerprint(checks)
+        interval = float(CHECKS_POLL_MIN_INTERVAL)
+        while checks.state == CheckStateEnum.pending:
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                interval = min(interval, remaining)
+
+            self._sleep(interval)
+            new_fingerprint = self._fingerprint(checks)
+            if new_fingerprint == fingerprint:
+                interval = min(interval * CHECKS_POLL_BACKOFF, CHECKS_POLL_MAX_INTERVAL)
+                logger.debug(f"Checks unchanged, next poll in {interval:.0f} s")
+                continue
+
+            new_checks = self.fetch()
+            on_change(new_checks)
+            if new_checks is None:
+                return None
+
+            # new commit has other check runs and statuses to poll
+            if new_checks.head_sha != checks.head_sha:
+                new_fingerprint = self._fingerprint(new_checks)
+
+            checks, fingerprint = new_checks, new_fingerprint
+            interval = float(CHECKS_POLL_MIN_INTERVAL)
+
+        return checks
@@ -3,12 +3,26 @@ These commands need GH API token.
 """
 
 
+import time
 from os import getcwd
 from pathlib import Path
+from typing import Optional, TextIO
 
 import click
 
-from alpa.repository.branch import AlpaRepoBranch
+from github import GithubException
+
+from alpa.checks import ChecksWatcher, PullRequestChecks
+from alpa.constants import (
+    CHECKS_EXIT_FAILURE,
+    CHECKS_EXIT_NO_PR,
+    CHECKS_EXIT_PENDING,
+    CheckStateEnum,
+    RequestEnum,
+    RequestResultEnum,
+)
+from alpa.gh import GithubAPI
+from alpa.repository.branch import AlpaRepoBranch, LocalRepoBranch
 
 
 pkg_name = click.argument("name", type=str)
@@ -21,15 +35,144 @@ def create(name: str) -> None:
     AlpaRepoBranch(Path(getcwd())).create_package(name)
 
 
+def _packages_from_args(name: Optional[str], from_file: Optional[TextIO]) -> list[str]:
+    if (name is None) == (from_file is None):
+        raise click.UsageError("Specify either package NAME or --from-file")
+
+    if from_file is None:
+        return [name] if name is not None else []
+
+    packages = []
+    for line in from_file:
+        package = line.split("#", 1)[0].strip()
+        if package:
+            packages.append(package)
+
+    return packages
+
+
+def _request_packages(
+    request_type: RequestEnum, name: Optional[str], from_file: Optional[TextIO]
+) -> None:
+    packages = _packages_from_args(name, from_file)
+    results = AlpaRepoBranch(Path(getcwd())).request_packages(request_type, packages)
+    for package, result in results.items():
+        click.echo(f"{package}: {result.value}")
+
+    if RequestResultEnum.failed in results.values():
+        raise click.ClickException("Some of the requests failed")
+
+
+requests_file = click.option(
+    "--from-file",
+    type=click.File(),
+    help="File with one package per line, `-` for stdin",
+)
+
+
 @click.command("delete")
-@pkg_name
-def delete(name: str) -> None:
+@click.argument("name", type=str, required=False)
+@requests_file
+def delete(name: Optional[str], from_file: Optional[TextIO]) -> None:
     """Request deleting existing package"""
-    AlpaRepoBranch(Path(getcwd())).request_package_delete(name)
+    _request_packages(RequestEnum.delete, name, from_file)
 
 
 @click.command("request-package")
-@pkg_name
-def request_package(name: str) -> None:
+@click.argument("name", type=str, required=False)
+@requests_file
+def request_package(name: Optional[str], from_file: Optional[TextIO]) -> None:
     """Request new branch for new package in Alpa repo"""
-    AlpaRepoBranch(Path(getcwd())).request_package(name)
+    _request_packages(RequestEnum.create, name, from_file)
+
+
+@click.command("gh-status")
+def gh_status() -> None:
+    """Show remaining GitHub API budget of your token"""
+    # only the token is needed, bootstrapping the repo would spend the budget
+    repo_name = LocalRepoBranch(Path(getcwd())).repo_name
+    rate_limits = GithubAPI(repo_name).rate_limits()
+    for name, rate_limit in rate_limits.items():
+        resets_in = max(rate_limit.reset - time.time(), 0)
+        click.echo(
+            f"{name}: {rate_limit.remaining}/{rate_limit.limit} remaining, "
+            f"resets in {resets_in / 60:.0f} min"
+        )
+
+
+_CHECK_STATE_COLORS = {
+    CheckStateEnum.success: "green",
+    CheckStateEnum.failure: "red",
+    CheckStateEnum.pending: "yellow",
+}
+_CHECKS_EXIT_CODES = {
+    CheckStateEnum.success: 0,
+    CheckStateEnum.failure: CHECKS_EXIT_FAILURE,
+    CheckStateEnum.pending: CHECKS_EXIT_PENDING,
+}
+
+
+def _show_checks(checks: Optional[PullRequestChecks]) -> None:
+    if checks is None:
+        return
+
+    click.echo(f"PR#{checks.number} {checks.url}")
+    for check in checks.checks:
+        line = f"  {check.state.value:<8} {check.name}"
+        if check.url and check.state == CheckStateEnum.failure:
+            line += f" {check.url}"
+
+        click.secho(line, fg=_CHECK_STATE_COLORS[check.state])
+
+    if checks.truncated:
+        click.echo("  ... more checks on the PR page")
+
+    click.secho(checks.state.value, fg=_CHECK_STATE_COLORS[checks.state], bold=True)
+
+
+@click.command("checks")
+@click.option(
+    "-w",
+    "--watch",
+    is_flag=True,
+    default=False,
+    help="Wait until all checks finish, print them whenever they change",
+)
+@click.option(
+    "--timeout",
+    type=click.FloatRange(min=0),
+    default=None,
+    help="Stop watching after TIMEOUT seconds",
+)
+@click.pass_context
+def checks(ctx: click.Context, watch: bool, timeout: Optional[float]) -> None:
+    """
+    Show checks of the PR of package you are on.
+
+    Exits with 0 if all checks passed, 1 if any of them failed, 3 if some are
+    still running and 4 if there is no open PR.
+    """
+    alpa = AlpaRepoBranch(Path(getcwd()))
+    watcher = ChecksWatcher(
+        alpa.gh_api,
+        alpa.gh_repo.get_root_repo(),
+        alpa.gh_repo,
+        head=alpa.feat_branch,
+        base=alpa.package,
+    )
+    try:
+        if watch:
+            result = watcher.watch(_show_checks, timeout)
+        else:
+            result = watcher.fetch()
+            _show_checks(result)
+    except GithubException as exc:
+        raise click.ClickException(f"Unable to get checks of the PR: {exc}")
+
+    if result is None:
+        click.secho(
+            f"No open PR of {alpa.feat_branch} into {alpa.package}", fg="red", err=True
+        )
+        ctx.exit(CHECKS_EXIT_NO_PR)
+
+    ctx.exit(_CHECKS_EXIT_CODES[result.state])
@@ -1,26 +1,35 @@
+from typing import Optional
+
 import click
 
-from alpa.cli.alpa_repo import create, delete, request_package
+from alpa.cli.alpa_repo import create, delete, request_package, gh_status, checks
 from alpa.cli.local_repo import (
     show_history,
+    status,
     switch,
     commit,
     pull,
     push,
     list_,
+    search,
+    foreach,
+    prune,
+    maintenance,
     add,
     get_pkg_archive,
     mockbuild,
     create_packit_config,
 )
+from alpa.gh_stats import api_stats
 from alpa.repository.branch import AlpaRepoBranch
 
 # TODO: get rid of the repetitive _Repo(Path(getcwd()))
 
 
 @click.group()
-def entry_point() -> None:
-    pass
+@click.pass_context
+def entry_point(ctx: click.Context) -> None:
+    ctx.call_on_close(lambda: api_stats.report(ctx.invoked_subcommand))
 
 
 # commands that don't require git repo at all
@@ -29,21 +38,44 @@ def entry_point() -> None:
 @entry_point.command("clone")
 @click.argument("url", type=str)
 @click.option("--fork", is_flag=True, default=False)
-def clone(url: str, fork: bool) -> None:
+@click.option(
+    "--lazy",
+    is_flag=True,
+    default=False,
+    help="Clone only main branch without file contents, packages are fetched on "
+    "demand",
+)
+@click.option(
+    "--depth",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Fetch only last DEPTH commits of each package, requires --lazy",
+)
+def clone(url: str, fork: bool, lazy: bool, depth: Optional[int]) -> None:
     """Clone and prepare Alpa repository"""
-    AlpaRepoBranch.clone(url, fork)
+    if depth is not None and not lazy:
+        raise click.UsageError("--depth can be used only with --lazy")
+
+    AlpaRepoBranch.clone(url, fork, lazy, depth)
 
 
 entry_point.add_command(create)
 entry_point.add_command(delete)
 entry_point.add_command(request_package)
+entry_point.add_command(gh_status)
+entry_point.add_command(checks)
 
 entry_point.add_command(show_history)
+entry_point.add_command(status)
 entry_point.add_command(switch)
 entry_point.add_command(commit)
 entry_point.add_command(pull)
 entry_point.add_command(push)
 entry_point.add_command(list_)
+entry_point.add_command(search)
+entry_point.add_command(foreach)
+entry_point.add_command(prune)
+entry_point.add_command(maintenance)
 entry_point.add_command(add)
 entry_point.add_command(get_pkg_archive)
 entry_point.add_command(mockbuild)
@@ -2,20 +2,39 @@
 These commands need to create LocalRepo -> no GH token required
 """
 import os
+import re
 import subprocess
 from os import getcwd
 from pathlib import Path
 from shutil import which
+from typing import Optional
 
 import click
 from click import ClickException
+from alpa.constants import ALPA_FEAT_BRANCH_PREFIX
 
 from alpa.config import MetadataConfig
+from alpa.foreach import ForeachResult, PackageForeach
+from alpa.maintenance import RepoMaintenance
 from alpa.repository.branch import LocalRepoBranch, AlpaRepoBranch
 
 from alpa.messages import NO_PRE_COMMIT
 
-pkg_name = click.argument("name", type=str)
+
+def _complete_package_name(
+    ctx: click.Context, param: click.Parameter, incomplete: str
+) -> list[str]:
+    try:
+        # shells keep only suggestions starting with the typed prefix, fuzzy
+        # matches are left to `alpa search`
+        local_repo = LocalRepoBranch(Path(getcwd()))
+        return local_repo.get_packages(re.escape(incomplete))
+    except (ClickException, FileNotFoundError):
+        # completion must never fail loudly
+        return []
+
+
+pkg_name = click.argument("name", type=str, shell_complete=_complete_package_name)
 
 
 @click.command("show-history")
@@ -34,14 +53,59 @@ def show_history(oneline: bool) -> None:
         params.append("--oneline")
 
     local_repo = LocalRepoBranch(Path(getcwd()))
-    click.echo(local_repo.get_history_of_branch(local_repo.branch, params))
+    local_repo.deepen_history(local_repo.branch)
+    for line in local_repo.iter_history_of_branch(local_repo.branch, params):
+        click.echo(line)
+
+
+@click.command("status")
+def status() -> None:
+    """Show state of the package you are working on"""
+    local_repo = LocalRepoBranch(Path(getcwd()))
+    git_status = local_repo.status()
+    if git_status.branch is None:
+        click.echo("Not on any package (detached HEAD)")
+    else:
+        click.echo(f"On package {local_repo.package} (branch {git_status.branch})")
+
+    if git_status.upstream is not None and (git_status.ahead or git_status.behind):
+        click.echo(
+            f"Compared to {git_status.upstream}: {git_status.ahead} commit(s) "
+            f"ahead, {git_status.behind} commit(s) behind"
+        )
+
+    output = local_repo.get_status_output(git_status)
+    click.echo(output.rstrip() if output else "Nothing to commit, package is clean")
 
 
 @click.command("switch")
 @pkg_name
-def switch(name: str) -> None:
+@click.option(
+    "-w",
+    "--worktree",
+    is_flag=True,
+    default=False,
+    help=(
+        "Use the package's own worktree, prints its path. "
+        "Enable it permanently by `git config alpa.worktrees true`."
+    ),
+)
+def switch(name: str, worktree: bool) -> None:
     """Switch to specified package"""
-    LocalRepoBranch(Path(getcwd())).switch_to_package(name)
+    local_repo = LocalRepoBranch(Path(getcwd()))
+    if not worktree and not local_repo.worktrees_enabled:
+        local_repo.switch_to_package(name)
+        return
+
+    package_worktree = local_repo.get_package_worktree(name)
+    if package_worktree is None:
+        click.secho(f"Package {name} doesn't exist!", fg="red", err=True)
+        return
+
+    # only the path goes to stdout so `cd "$(alpa switch -w pkg)"` works
+    click.echo(f"Package {name} is in worktree, enter it by:", err=True)
+    click.echo(f"cd {package_worktree}", err=True)
+    click.echo(str(package_worktree))
 
 
 @click.command("commit")
@@ -134,9 +198,157 @@ def pull() -> None:
 
 @click.command("list")
 @click.option("-p", "--pattern", type=str, default="", help="Optional pattern to match")
-def list_(pattern: str) -> None:
-    """List all packages or packages matching regex"""
-    for pkg in LocalRepoBranch(Path(getcwd())).get_packages(pattern):
+@click.option(
+    "--maintainer", type=str, help="Only packages maintained by this nick or email"
+)
+@click.option("--target", type=str, help="Only packages built for this target")
+@click.option("--arch", type=str, help="Only packages built for this architecture")
+@click.option(
+    "--autoupdate",
+    is_flag=True,
+    default=False,
+    help="Only packages with autoupdate enabled",
+)
+def list_(
+    pattern: str,
+    maintainer: Optional[str],
+    target: Optional[str],
+    arch: Optional[str],
+    autoupdate: bool,
+) -> None:
+    """List all packages or packages matching regex and metadata filters"""
+    local_repo = LocalRepoBranch(Path(getcwd()))
+    if maintainer is None and target is None and arch is None and not autoupdate:
+        for pkg in local_repo.iter_packages(pattern):
+            click.echo(pkg)
+
+        return
+
+    for pkg in local_repo.query_packages(pattern, maintainer, target, arch, autoupdate):
+        click.echo(pkg)
+
+
+@click.command("maintenance")
+@click.option(
+    "--auto",
+    is_flag=True,
+    default=False,
+    help="Run only tasks the repository needs according to its object counts",
+)
+def maintenance(auto: bool) -> None:
+    """Optimize the repository for fast history and status queries"""
+    local_repo = LocalRepoBranch(Path(getcwd()))
+    repo_maintenance = RepoMaintenance(local_repo.git)
+    acceleration = repo_maintenance.enable_status_acceleration()
+    click.echo(
+        "Untracked cache: "
+        + ("enabled" if acceleration.untracked_cache else "not enabled")
+    )
+    if acceleration.fsmonitor is None:
+        click.echo("Filesystem monitor: not supported by your git")
+    else:
+        click.echo(
+            "Filesystem monitor: "
+            + ("running" if acceleration.fsmonitor else "not running")
+        )
+
+    before = repo_maintenance.stats()
+    if auto:
+        tasks = repo_maintenance.needed_tasks(before)
+    else:
+        tasks = repo_maintenance.all_tasks(before)
+
+    if not tasks:
+        click.echo("Repository doesn't need any maintenance")
+        return
+
+    timings_before = repo_maintenance.time_hot_queries(local_repo.branch)
+    click.echo(f"Running maintenance tasks: {', '.join(tasks)}")
+    if not repo_maintenance.run(tasks):
+        raise ClickException("Repository maintenance failed")
+
+    after = repo_maintenance.stats()
+    timings_after = repo_maintenance.time_hot_queries(local_repo.branch)
+    click.echo(
+        f"Loose objects: {before.loose} -> {after.loose}, "
+        f"packs: {before.packs} -> {after.packs}"
+    )
+    for query, took in timings_before.items():
+        click.echo(
+            f"git {query}: {took * 1000:.1f} ms -> "
+            f"{timings_after[query] * 1000:.1f} ms"
+        )
+
+
+@click.command("prune")
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    default=False,
+    help="Only show feature branches which would be deleted",
+)
+def prune(dry_run: bool) -> None:
+    """Delete local feature branches of packages which were merged"""
+    local_repo = LocalRepoBranch(Path(getcwd()))
+    pruned = local_repo.prune_feature_branches(dry_run)
+    if not pruned:
+        click.echo("No merged feature branches to delete")
+        return
+
+    action = "Would delete" if dry_run else "Deleted"
+    for branch, commit in pruned.items():
+        package = branch.removeprefix(ALPA_FEAT_BRANCH_PREFIX)
+        click.echo(
+            f"{action} feature branch {branch} of package {package} "
+            f"(was {commit[:10]})"
+        )
+
+
+@click.command("foreach")
+@click.option("-p", "--pattern", type=str, default="", help="Optional pattern to match")
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=os.cpu_count() or 1,
+    show_default=True,
+    help="How many packages to process in parallel",
+)
+@click.argument("command", nargs=-1, required=True, type=click.UNPROCESSED)
+def foreach(pattern: str, jobs: int, command: tuple[str, ...]) -> None:
+    """
+    Run command in every package, e.g. `alpa foreach -j 4 -- ls`.
+
+    Each package is checked out in its own temporary worktree. Name of the
+    package is available in ALPA_PACKAGE environment variable.
+    """
+
+    def print_result(result: ForeachResult) -> None:
+        color = "green" if result.succeeded else "red"
+        click.secho(f"==> {result.package} (exit {result.retval})", fg=color)
+        if result.output:
+            click.echo(result.output.rstrip())
+
+    local_repo = LocalRepoBranch(Path(getcwd()))
+    packages = list(local_repo.iter_packages(pattern))
+    results = PackageForeach(
+        local_repo.git, local_repo.remote_name, jobs, local_repo.fetcher
+    ).run(packages, list(command), print_result)
+
+    failed = sorted(result.package for result in results if not result.succeeded)
+    click.echo(f"\n{len(results) - len(failed)} succeeded, {len(failed)} failed")
+    if failed:
+        raise ClickException(f"Command failed for: {', '.join(failed)}")
+
+
+@click.command("search")
+@click.argument("query", type=str)
+@click.option(
+    "-n", "--limit", type=int, default=20, show_default=True, help="Max results"
+)
+def search(query: str, limit: int) -> None:
+    """Fuzzy search for packages, best matches first"""
+    for pkg in LocalRepoBranch(Path(getcwd())).search_packages(query, limit):
         click.echo(pkg)
 
 
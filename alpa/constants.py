@@ -5,9 +5,63 @@ UPSTREAM_NAME = "upstream"
 ORIGIN_NAME = "origin"
 MAIN_BRANCH = "main"
 
+# how many git processes may run at once when queries are run concurrently
+GIT_CMD_MAX_CONCURRENCY = 4
+
+# alpa's own data (caches, indexes, ...) are stored in <git common dir>/alpa
+ALPA_GIT_DIR_NAME = "alpa"
+# seconds after which the snapshot of remote branches is refreshed
+REMOTE_REFS_CACHE_TTL = 5 * 60
+# how many idle package worktrees are kept when worktrees are enabled
+MAX_PACKAGE_WORKTREES = 10
+# seconds within which a remote branch isn't fetched again
+FETCH_MAX_AGE = 60
+# above this many branches `git ls-remote` lists all branches instead of patterns
+FETCH_MAX_LS_REMOTE_PATTERNS = 100
+# thresholds crossing which triggers repository maintenance after fetch
+MAINTENANCE_MAX_LOOSE_OBJECTS = 1000
+MAINTENANCE_MAX_PACKS = 20
+MAINTENANCE_MIN_COMMIT_GRAPH_OBJECTS = 10000
+
 
 GH_API_TOKEN_NAME = "ALPA_GH_API_TOKEN"
+# base URL of GitHub API, e.g. a local stand-in of it for offline testing
+GH_API_URL_NAME = "ALPA_GH_API_URL"
+# `-` reports GitHub API calls of a command to stderr, a path appends them there
+GH_STATS_ENV_NAME = "ALPA_GH_STATS"
 GH_WRITE_ACCESS = ["admin", "write"]
+# seconds for which permission of a user to a repository is cached
+GH_PERMISSION_CACHE_TTL = 24 * 60 * 60
+# bytes of GitHub API responses kept for conditional requests, per token
+GH_RESPONSE_CACHE_MAX_SIZE = 50 * 1024 * 1024
+# part of the rate limit below which GitHub API requests are paced
+GH_RATE_LIMIT_RESERVE = 0.1
+# rate limit resource of REST requests not counted against a special one
+GH_RATE_LIMIT_DEFAULT_RESOURCE = "core"
+# longest wait for the rate limit, a longer one fails the request instead
+GH_RATE_LIMIT_MAX_WAIT = 15 * 60
+GH_RATE_LIMIT_MAX_RETRIES = 3
+# GitHub asks to wait at least a minute after hitting secondary rate limit
+GH_SECONDARY_RATE_LIMIT_WAIT = 60
+# issues created at once, GitHub punishes bursts of content-creating requests
+GH_MAX_CONCURRENT_REQUESTS = 4
+
+# watching of PR checks, the poll interval grows while nothing changes
+CHECKS_POLL_MIN_INTERVAL = 10
+CHECKS_POLL_MAX_INTERVAL = 2 * 60
+CHECKS_POLL_BACKOFF = 1.5
+# exit codes of `alpa checks`, 0 means all checks passed
+CHECKS_EXIT_FAILURE = 1
+CHECKS_EXIT_PENDING = 3
+CHECKS_EXIT_NO_PR = 4
+
+# pooling of keep-alive HTTP connections shared by the whole process
+HTTP_MAX_HOSTS = 10
+HTTP_MAX_CONNECTIONS_PER_HOST = 4
+HTTP_MAX_RETRIES = 3
+# seconds to wait for connection or data when downloading sources
+HTTP_TIMEOUT = 60
+HTTP_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
 
 ALPA_ISSUE_REPO_NAME = "issue-repo"
 ALPA_FEAT_BRANCH_PREFIX = "__feat_"
@@ -48,3 +102,15 @@ DELETE_PACKAGE_REQUEST_TITLE = (
 class RequestEnum(str, Enum):
     delete = "delete"
     create = "create"
+
+
+class CheckStateEnum(str, Enum):
+    success = "success"
+    failure = "failure"
+    pending = "pending"
+
+
+class RequestResultEnum(str, Enum):
+    created = "created"
+    duplicate = "duplicate"
+    failed = "failed"
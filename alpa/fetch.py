@@ -0,0 +1,215 @@
+"""
+Fetching of only those remote branches a command works with. Every branch is
+fetched at most once per freshness window, no matter how many callers ask for it.
+"""
+import logging
+import time
+from typing import Iterable, Optional
+
+from alpa.constants import FETCH_MAX_AGE, FETCH_MAX_LS_REMOTE_PATTERNS
+from alpa.git import GitCMD, GitCmdResult
+from alpa.state_file import load_json_state, save_json_state
+
+
+logger = logging.getLogger(__name__)
+
+
+class FetchCoordinator:
+    """
+    Fetches branches of a remote with exact refspecs. A fetch is one
+    `git ls-remote` finding which branches exist, then one `git fetch` of them,
+    or two if some are new in a shallow clone: those are fetched with `depth`
+    so they don't deepen it. Time of the last fetch of every branch is stored
+    in the git directory and branches fetched within `max_age` seconds are not
+    fetched again.
+    """
+
+    def __init__(
+        self,
+        git: GitCMD,
+        remote: str,
+        max_age: float = FETCH_MAX_AGE,
+        depth: Optional[int] = None,
+    ) -> None:
+        self.git = git
+        self.remote = remote
+        self.max_age = max_age
+        self.depth = depth
+        self._state_file = git.alpa_dir / f"fetch-state-{remote}.json"
+        # whether a `git fetch` ran since the last maintenance check
+        self.fetched = False
+
+    def _load_fetched_at(self) -> dict[str, float]:
+        return load_json_state(self._state_file, "fetch state file")
+
+    def _save_fetched_at(self, fetched_at: dict[str, float]) -> None:
+        save_json_state(self._state_file, fetched_at)
+
+    def _tracking_ref(self, branch: str) -> str:
+        return f"refs/remotes/{self.remote}/{branch}"
+
+    def _refspec(self, branch: str) -> str:
+        return f"+refs/heads/{branch}:{self._tracking_ref(branch)}"
+
+    def has_tracking_ref(self, branch: str) -> bool:
+        ref = self._tracking_ref(branch)
+        if self.git.refs is not None:
+            exists = self.git.refs.ref_exists(ref)
+            if exists is not None:
+                return exists
+
+        return self.git.git_cmd(["show-ref", "--verify", "--quiet", ref]).retval == 0
+
+    def tracked_branches(self) -> set[str]:
+        """Branches of the remote with a remote-tracking ref, by one git call"""
+        output = self.git.git_cmd(
+            [
+                "for-each-ref",
+                "--format=%(refname:lstrip=3)",
+                f"refs/remotes/{self.remote}/",
+            ],
+            use_cache=False,
+        ).stdout
+        return set(output.splitlines())
+
+    def ls_remote_cmd(self, branches: list[str]) -> list[str]:
+        """Command listing which of the branches exist on the remote"""
+        heads = [f"refs/heads/{branch}" for branch in branches]
+        patterns = heads if len(heads) <= FETCH_MAX_LS_REMOTE_PATTERNS else []
+        return ["ls-remote", "--heads", self.remote] + patterns
+
+    def remote_branches(
+        self, branches: list[str], ls_remote: Optional[GitCmdResult] = None
+    ) -> Optional[set[str]]:
+        """
+        Returns which of the branches exist on the remote, None if unknown.
+        `ls_remote` is result of `ls_remote_cmd` if it was already run.
+        """
+        heads = [f"refs/heads/{branch}" for branch in branches]
+        result = ls_remote or self.git.git_cmd(self.ls_remote_cmd(branches))
+        if result.retval != 0:
+            logger.warning(f"Unable to list branches of {self.remote}")
+            logger.debug(result.stderr)
+            return None
+
+        # ls-remote patterns match ends of refs, keep exact matches only
+        refs = {line.split("\t")[-1] for line in result.stdout.splitlines()}
+        return {branch for branch, head in zip(branches, heads) if head in refs}
+
+    def _fetch(self, branches: list[str], depth: Optional[int]) -> bool:
+        cmd = ["fetch", "--stdin"]
+        if depth is not None:
+            cmd += ["--depth", str(depth)]
+
+        # refspecs of thousands of packages don't fit on the command line
+        refspecs = "".join(f"{self._refspec(branch)}\n" for branch in branches)
+        result = self.git.git_cmd(cmd + [self.remote], input=refspecs)
+        if result.retval != 0:
+            logger.warning(f"Unable to fetch {branches} from {self.remote}")
+            logger.debug(result.stderr)
+            return False
+
+        self.fetched = True
+        return True
+
+    def _drop_tracking_refs(self, branches: list[str], tracked: set[str]) -> None:
+        stale_refs = [
+            f"delete {self._tracking_ref(branch)}\n"
+            for branch in branches
+            if branch in tracked
+        ]
+        if stale_refs:
+            self.git.git_cmd(["update-ref", "--stdin"], input="".join(stale_refs))
+
+    def stale_branches(
+        self, branches: Iterable[str], max_age: Optional[float] = None
+    ) -> list[str]:
+        """Branches not fetched within `max_age` seconds"""
+        if max_age is None:
+            max_age = self.max_age
+
+        fetched_at = self._load_fetched_at()
+        now = time.time()
+        return [
+            branch
+            for branch in dict.fromkeys(branches)
+            if max_age <= 0 or now - fetched_at.get(branch, 0.0) > max_age
+        ]
+
+    def fetch(
+        self, branches: Iterable[str], max_age: Optional[float] = None
+    ) -> dict[str, Optional[bool]]:
+        """
+        Makes remote-tracking refs of `branches` at most `max_age` seconds old
+        and returns whether each of them exists on the remote. None means the
+        remote couldn't be reached and the existence is unknown.
+
+        Remote-tracking refs of branches deleted on the remote are removed.
+        """
+        branches = list(dict.fromkeys(branches))
+        stale = self.stale_branches(branches, max_age)
+        return self.fetch_listed(branches, stale)
+
+    def fetch_listed(
+        self,
+        branches: list[str],
+        stale: list[str],
+        ls_remote: Optional[GitCmdResult] = None,
+    ) -> dict[str, Optional[bool]]:
+        """
+        Same as `fetch` for `stale` branches found by `stale_branches`. Their
+        `ls_remote_cmd` may have already run together with other commands.
+        """
+        fetched_at = self._load_fetched_at()
+        now = time.time()
+        tracked = self.tracked_branches()
+        results: dict[str, Optional[bool]] = {
+            branch: branch in tracked for branch in branches if branch not in stale
+        }
+        on_remote = self.remote_branches(stale, ls_remote) if stale else set()
+        if on_remote is None:
+            results.update(dict.fromkeys(stale))
+            return {branch: results[branch] for branch in branches}
+
+        missing = [branch for branch in stale if branch not in on_remote]
+        self._drop_tracking_refs(missing, tracked)
+        results.update(dict.fromkeys(missing, False))
+        fetched_at.update(dict.fromkeys(missing, now))
+
+        existing = [branch for branch in stale if branch in on_remote]
+        if existing:
+            new = (
+                []
+                if self.depth is None
+                else [branch for branch in existing if branch not in tracked]
+            )
+            groups = [
+                ([branch for branch in existing if branch not in new], None),
+                (new, self.depth),
+            ]
+            logger.debug(f"Fetching {existing} from {self.remote}")
+            for group, group_depth in groups:
+                if not group:
+                    continue
+
+                fetched = self._fetch(group, group_depth)
+                results.update(dict.fromkeys(group, True if fetched else None))
+                if fetched:
+                    fetched_at.update(dict.fromkeys(group, now))
+
+        if stale:
+            self._save_fetched_at(fetched_at)
+
+        return {branch: results[branch] for branch in branches}
+
+    def invalidate(self, branches: Optional[Iterable[str]] = None) -> None:
+        """Forget fetch times of `branches` or all branches if not specified"""
+        if branches is None:
+            self._state_file.unlink(missing_ok=True)
+            return
+
+        fetched_at = self._load_fetched_at()
+        for branch in branches:
+            fetched_at.pop(branch, None)
+
+        self._save_fetched_at(fetched_at)
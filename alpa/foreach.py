@@ -0,0 +1,124 @@
+"""
+Running a command over many packages at once, each package checked out in its
+own temporary git worktree.
+"""
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+from alpa.fetch import FetchCoordinator
+from alpa.git import GitCMD
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ForeachResult:
+    package: str
+    retval: int
+    output: str
+
+    @property
+    def succeeded(self) -> bool:
+        return self.retval == 0
+
+
+class PackageForeach:
+    """
+    Materializes each package branch of a remote in a detached worktree and
+    runs the command there, `jobs` packages at a time. Worktrees are added and
+    removed one at a time, git doesn't lock its worktree administrative files.
+    """
+
+    def __init__(
+        self,
+        git: GitCMD,
+        remote: str,
+        jobs: int,
+        fetcher: Optional[FetchCoordinator] = None,
+    ) -> None:
+        self.git = git
+        self.remote = remote
+        self.jobs = jobs
+        self.fetcher = fetcher or FetchCoordinator(git, remote)
+        self._worktrees_lock = threading.Lock()
+
+    def _run_in_worktree(
+        self, package: str, command: list[str], worktrees_root: Path
+    ) -> ForeachResult:
+        worktree = worktrees_root / package
+        with self._worktrees_lock:
+            add_result = self.git.git_cmd(
+                [
+                    "worktree",
+                    "add",
+                    "--detach",
+                    str(worktree),
+                    f"{self.remote}/{package}",
+                ]
+            )
+
+        if add_result.retval != 0:
+            return ForeachResult(package, add_result.retval, add_result.stderr)
+
+        env = dict(os.environ)
+        env["ALPA_PACKAGE"] = package
+        try:
+            process = subprocess.run(
+                command,
+                cwd=worktree,
+                env=env,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+            )
+            return ForeachResult(
+                package, process.returncode, process.stdout.decode(errors="replace")
+            )
+        except OSError as exc:
+            return ForeachResult(package, 127, str(exc))
+        finally:
+            with self._worktrees_lock:
+                self.git.git_cmd(["worktree", "remove", "--force", str(worktree)])
+
+    def run(
+        self,
+        packages: Iterable[str],
+        command: list[str],
+        on_result: Optional[Callable[[ForeachResult], None]] = None,
+    ) -> list[ForeachResult]:
+        """
+        Returns results in order of completion, `on_result` is called as soon
+        as each package finishes.
+        """
+        # lazy clones have remote-tracking refs only of fetched packages
+        packages = list(packages)
+        self.fetcher.fetch(packages)
+        worktrees_root = Path(tempfile.mkdtemp(prefix="alpa-foreach-"))
+        results = []
+        try:
+            with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+                futures = [
+                    executor.submit(
+                        self._run_in_worktree, package, command, worktrees_root
+                    )
+                    for package in packages
+                ]
+                for future in as_completed(futures):
+                    result = future.result()
+                    logger.debug(f"{result.package} finished with {result.retval}")
+                    results.append(result)
+                    if on_result is not None:
+                        on_result(result)
+        finally:
+            shutil.rmtree(worktrees_root, ignore_errors=True)
+            self.git.git_cmd(["worktree", "prune"])
+
+        return results
@@ -2,40 +2,345 @@
 Wrapper aroung pygithub API since the documentation is awful..
 """
 import logging
+import re
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
 from os import getenv
-from typing import Optional
+from typing import Any, Iterator, Mapping, Optional
+from urllib.parse import urlparse
 
 import click
 from click import UsageError
-from github import Github, Issue, PullRequest, UnknownObjectException
+from github import (
+    Consts,
+    Github,
+    GithubException,
+    PullRequest,
+    RateLimitExceededException,
+    UnknownObjectException,
+)
+from github.Issue import Issue
+from github.Repository import Repository
+from github.Requester import Requester, RequestsResponse
 
 from alpa.config.alpa_local import AlpaLocalConfig
-from alpa.constants import GH_API_TOKEN_NAME, GH_WRITE_ACCESS
+from alpa.constants import (
+    GH_API_TOKEN_NAME,
+    GH_API_URL_NAME,
+    GH_RATE_LIMIT_DEFAULT_RESOURCE,
+    GH_RATE_LIMIT_MAX_RETRIES,
+    GH_RATE_LIMIT_MAX_WAIT,
+    GH_RATE_LIMIT_RESERVE,
+    GH_SECONDARY_RATE_LIMIT_WAIT,
+    GH_WRITE_ACCESS,
+)
+from alpa.gh_cache import CachingHTTPSConnection, PermissionCache
 from alpa.messages import NO_GH_API_KEY_FOUND, RETURNING_CLONE_URL_MSG
 
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class RateLimitStatus:
+    limit: int
+    remaining: int
+    reset: float
+
+
+class RateLimitScheduler:
+    """
+    Budgets of GitHub API requests known from rate limit headers of responses,
+    one for every rate limit resource (`core`, `graphql`, `search`, ...). Once
+    less than `GH_RATE_LIMIT_RESERVE` of a limit remains, requests counted
+    against it are spread evenly until it resets instead of running into it.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.budgets: dict[str, RateLimitStatus] = {}
+        self.blocked_until = 0.0
+
+    @staticmethod
+    def resource(url: str) -> str:
+        """Rate limit resource the request to `url` is counted against"""
+        path = urlparse(url).path
+        if path in ("/graphql", "/api/graphql"):
+            return "graphql"
+
+        search = re.fullmatch(r"(?:/api/v3)?/search/(\w+)", path)
+        if search is not None:
+            return "code_search" if search.group(1) == "code" else "search"
+
+        return GH_RATE_LIMIT_DEFAULT_RESOURCE
+
+    def delay(self, resource: str = GH_RATE_LIMIT_DEFAULT_RESOURCE) -> float:
+        """
+        Returns seconds to wait before the next request counted against
+        `resource` and reserves it, unless the wait is too long to be taken.
+        """
+        with self._lock:
+            now = time.time()
+            delay = max(self.blocked_until - now, 0.0)
+            budget = self.budgets.get(resource)
+            if budget is None or budget.reset <= now:
+                return delay
+
+            if budget.remaining <= 0:
+                delay = max(delay, budget.reset - now)
+            elif budget.remaining < budget.limit * GH_RATE_LIMIT_RESERVE:
+                delay = max(delay, (budget.reset - now) / budget.remaining)
+
+            if delay <= GH_RATE_LIMIT_MAX_WAIT:
+                budget.remaining -= 1
+
+            return delay
+
+    def wait(self, resource: str = GH_RATE_LIMIT_DEFAULT_RESOURCE) -> None:
+        delay = self.delay(resource)
+        if delay > GH_RATE_LIMIT_MAX_WAIT:
+            message = (
+                f"GitHub API rate limit of {resource} requests resets in "
+                f"{delay / 60:.0f} minutes, try again later"
+            )
+            raise RateLimitExceededException(403, {"message": message})
+
+        if delay > 0:
+            logger.info(f"Pacing GitHub API {resource} requests, waiting {delay:.1f} s")
+            time.sleep(delay)
+
+    def update(
+        self,
+        status: int,
+        headers: Mapping[str, str],
+        body: str,
+        resource: str = GH_RATE_LIMIT_DEFAULT_RESOURCE,
+    ) -> float:
+        """
+        Updates the budget of the resource named by the response, `resource`
+        of the request if it names none. Returns seconds after which
+        the request should be retried if it hit a rate limit, otherwise 0.
+        """
+        now = time.time()
+        resource = headers.get("X-RateLimit-Resource", resource)
+        with self._lock:
+            if "X-RateLimit-Remaining" in headers:
+                self.budgets[resource] = RateLimitStatus(
+                    limit=int(headers.get("X-RateLimit-Limit", 0)),
+                    remaining=int(headers["X-RateLimit-Remaining"]),
+                    reset=float(headers.get("X-RateLimit-Reset", now)),
+                )
+
+            if status not in (403, 429):
+                return 0.0
+
+            budget = self.budgets.get(resource)
+            if "Retry-After" in headers:
+                retry_after = float(headers["Retry-After"])
+            elif budget is not None and budget.remaining == 0:
+                # the exhausted budget delays only requests of its resource
+                return max(budget.reset - now, 1.0)
+            elif "secondary rate limit" in body.lower():
+                retry_after = GH_SECONDARY_RATE_LIMIT_WAIT
+            else:
+                # permission denied, not a rate limit
+                return 0.0
+
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+            return max(retry_after, 1.0)
+
+
+class ScheduledHTTPSConnection(CachingHTTPSConnection):
+    """
+    Connection respecting the rate limit of the token. Identical GET requests
+    running at the same time are sent only once and share the response.
+    """
+
+    _schedulers: dict[Optional[str], RateLimitScheduler] = {}
+    _in_flight: dict[tuple, Future] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def scheduler(cls, authorization: Optional[str]) -> RateLimitScheduler:
+        with cls._lock:
+            return cls._schedulers.setdefault(authorization, RateLimitScheduler())
+
+    def _scheduled_response(self) -> RequestsResponse:
+        scheduler = self.scheduler(self.headers.get("Authorization"))
+        resource = scheduler.resource(self.url)
+        for attempt in range(GH_RATE_LIMIT_MAX_RETRIES + 1):
+            scheduler.wait(resource)
+            response = super().getresponse()
+            retry_after = scheduler.update(
+                response.status,
+                response.headers,
+                response.read() if response.status in (403, 429) else "",
+                resource,
+            )
+            if not retry_after:
+                return response
+
+            if attempt == GH_RATE_LIMIT_MAX_RETRIES or (
+                retry_after > GH_RATE_LIMIT_MAX_WAIT
+            ):
+                break
+
+            logger.warning(
+                f"GitHub API rate limit hit, retrying in {retry_after:.0f} s"
+            )
+
+        return response
+
+    def getresponse(self) -> RequestsResponse:
+        if self.verb.upper() != "GET" or self.stream:
+            return self._scheduled_response()
+
+        key = (
+            self.headers.get("Authorization"),
+            self.headers.get("Accept"),
+            self.host,
+            self.port,
+            self.url,
+        )
+        with self._lock:
+            in_flight = self._in_flight.get(key)
+            if in_flight is None:
+                future: Future = Future()
+                self._in_flight[key] = future
+
+        if in_flight is not None:
+            logger.debug(f"Waiting for the same request in flight: {self.url}")
+            return in_flight.result()
+
+        try:
+            response = self._scheduled_response()
+            future.set_result(response)
+            return response
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+
+class ScheduledHTTPConnection(ScheduledHTTPSConnection):
+    """Plain HTTP variant for GitHub stand-ins set by `ALPA_GH_API_URL`"""
+
+    def __init__(self, host: str, port: Optional[int] = None, **kwargs: Any) -> None:
+        super().__init__(host, port or 80, **kwargs)
+        self.protocol = "http"
+
+
+# everything commands working with Alpa repository need to know about it
+BOOTSTRAP_QUERY = """
+query($owner: String!, $name: String!) {
+  viewer { login }
+  repository(owner: $owner, name: $name) {
+    ...repo
+    parent { ...repo }
+  }
+}
+
+fragment repo on Repository {
+  nameWithOwner
+  isFork
+  sshUrl
+  url
+  viewerPermission
+}
+"""
+
+# GraphQL repository permissions as returned by the REST collaborator permission
+_GRAPHQL_PERMISSIONS = {
+    "ADMIN": "admin",
+    "MAINTAIN": "write",
+    "WRITE": "write",
+    "TRIAGE": "read",
+    "READ": "read",
+}
+
+
+@dataclass
+class RepoSnapshot:
+    """Repository data fetched by the bootstrap query"""
+
+    full_name: str
+    is_fork: bool
+    ssh_url: str
+    clone_url: str
+    viewer_permission: str
+
+    @classmethod
+    def from_graphql(cls, repository: dict[str, Any]) -> "RepoSnapshot":
+        return cls(
+            full_name=repository["nameWithOwner"],
+            is_fork=repository["isFork"],
+            ssh_url=repository["sshUrl"],
+            clone_url=f"{repository['url']}.git",
+            viewer_permission=_GRAPHQL_PERMISSIONS.get(
+                repository["viewerPermission"] or "", "none"
+            ),
+        )
+
+
 class GithubRepo:
-    def __init__(self, api: Github, namespace: str, repo_name: str) -> None:
+    """
+    Proxy of a GitHub repository, the repository is fetched on first access to
+    its data. Use `GithubAPI.get_repo` so every repository has one proxy.
+    """
+
+    def __init__(
+        self,
+        api: "GithubAPI",
+        namespace: str,
+        repo_name: str,
+        repo: Optional[Repository] = None,
+    ) -> None:
         self.namespace = namespace
         self.repo_name = repo_name
 
         self._api = api
-        self._repo = api.get_repo(f"{namespace}/{repo_name}")
+        self._fetched_repo = repo
+        self._upstream: Optional[GithubRepo] = None
+        self._snapshot: Optional[RepoSnapshot] = None
+        self._permission_cache = PermissionCache()
+
+    def hydrate(
+        self, snapshot: RepoSnapshot, upstream: Optional["GithubRepo"] = None
+    ) -> None:
+        self._snapshot = snapshot
+        if upstream is not None:
+            self._upstream = upstream
+
+    @property
+    def _repo(self) -> Repository:
+        if self._fetched_repo is None:
+            logger.debug(f"Fetching repo {self.namespace}/{self.repo_name}")
+            self._fetched_repo = self._api.client.get_repo(
+                f"{self.namespace}/{self.repo_name}"
+            )
+
+        return self._fetched_repo
 
     @property
     def clone_url(self) -> str:
-        if self.has_write_access(self._api.get_user().login):
+        if self.has_write_access(self.api_user):
+            if self._snapshot is not None:
+                return self._snapshot.ssh_url
+
             return self._repo.ssh_url
 
+        full_name = self._snapshot.full_name if self._snapshot else self._repo.full_name
         click.secho(
-            RETURNING_CLONE_URL_MSG.format(
-                user=self._api.get_user().login, repo=self._repo.full_name
-            ),
+            RETURNING_CLONE_URL_MSG.format(user=self.api_user, repo=full_name),
             fg="bright_yellow",
         )
+        if self._snapshot is not None:
+            return self._snapshot.clone_url
+
         return self._repo.clone_url
 
     @property
@@ -48,29 +353,52 @@ class GithubRepo:
 
     @property
     def is_fork(self) -> bool:
+        if self._snapshot is not None:
+            return self._snapshot.is_fork
+
         return self._repo.fork
 
     @property
     def api_user(self) -> str:
-        return self._api.get_user().login
+        return self._api.gh_user
+
+    def get_permission(self, user: str) -> str:
+        try:
+            return self._repo.get_collaborator_permission(user)
+        except GithubException as exc:
+            # only users with push access can see permissions of collaborators
+            if exc.status in (403, 404):
+                return "none"
+
+            raise
 
     def has_write_access(self, user: str) -> bool:
-        for collaborator in self._repo.get_collaborators():
-            if collaborator.login != user:
-                continue
+        if self._snapshot is not None and user == self.api_user:
+            return self._snapshot.viewer_permission in GH_WRITE_ACCESS
 
-            return (
-                self._repo.get_collaborator_permission(collaborator) in GH_WRITE_ACCESS
-            )
+        full_name = f"{self.namespace}/{self.repo_name}"
+        if self._permission_cache.get(full_name, user) in GH_WRITE_ACCESS:
+            return True
+
+        # missing write access is never taken from cache, it may have been granted
+        permission = self.get_permission(user)
+        self._permission_cache.set(full_name, user, permission)
+        return permission in GH_WRITE_ACCESS
 
-        return False
+    def forget_permission(self, user: str) -> None:
+        self._permission_cache.invalidate(f"{self.namespace}/{self.repo_name}", user)
 
     def get_upstream(self) -> Optional["GithubRepo"]:
         if not self.is_fork:
             return None
 
-        namespace, repo_name = self._repo.source.full_name.split("/")
-        return GithubRepo(self._api, namespace, repo_name)
+        if self._upstream is None:
+            # the source repository comes with the fork, don't fetch it again
+            source = self._repo.source
+            namespace, repo_name = source.full_name.split("/")
+            self._upstream = self._api.get_repo(namespace, repo_name, source)
+
+        return self._upstream
 
     def get_root_repo(self) -> "GithubRepo":
         root_repo = self.get_upstream()
@@ -79,8 +407,11 @@ class GithubRepo:
 
         return root_repo
 
-    def create_issue(self, title: str, body: str) -> Issue:
-        return self.get_root_repo()._repo.create_issue(title, body)
+    def create_issue(
+        self, title: str, body: str, labels: Optional[list[str]] = None
+    ) -> Issue:
+        # labels set at creation save a request per issue
+        return self.get_root_repo()._repo.create_issue(title, body, labels=labels or [])
 
     def create_pr(
         self, title: str, body: str, source_branch: str, target_branch: str = "main"
@@ -99,17 +430,39 @@ class GithubRepo:
     def get_issues(self, state: str, labels: list[str]) -> list[Issue]:
         return list(self._repo.get_issues(state=state, labels=labels))
 
+    def iter_issues(self, state: str, labels: list[str]) -> Iterator[Issue]:
+        """Yields issues page by page as they are fetched, skips pull requests"""
+        for issue in self._repo.get_issues(state=state, labels=labels):
+            if issue.pull_request is None:
+                yield issue
+
 
 class GithubAPI:
     def __init__(self, repo_name: str, gh_token: Optional[str] = None) -> None:
-        if gh_token is not None:
-            self._gh_api = Github(gh_token)
-        else:
-            self._gh_api = Github(self._get_access_token(repo_name))
+        # both connection classes share the interface, PyGithub types don't know
+        Requester.injectConnectionClasses(
+            ScheduledHTTPConnection, ScheduledHTTPSConnection  # type: ignore[arg-type]
+        )
+        if gh_token is None:
+            gh_token = self._get_access_token(repo_name)
+
+        base_url = getenv(GH_API_URL_NAME) or Consts.DEFAULT_BASE_URL
+        self._gh_api = Github(gh_token, base_url=base_url.rstrip("/"))
+
+        # identity map of repositories by lowercase `namespace/repo`
+        self._repos: dict[str, GithubRepo] = {}
+        self._gh_user: Optional[str] = None
+
+    @property
+    def client(self) -> Github:
+        return self._gh_api
 
     @property
     def gh_user(self) -> str:
-        return self._gh_api.get_user().login
+        if self._gh_user is None:
+            self._gh_user = self._gh_api.get_user().login
+
+        return self._gh_user
 
     @staticmethod
     def _get_access_token(repo_name: str) -> str:
@@ -125,6 +478,67 @@ class GithubAPI:
 
         return access_token_config.gh_api_token
 
-    def get_repo(self, namespace: str, repo_name: str) -> GithubRepo:
-        logger.info(f"Trying to find repo: {namespace}/{repo_name}")
-        return GithubRepo(self._gh_api, namespace, repo_name)
+    def bootstrap(self, namespace: str, repo_name: str) -> GithubRepo:
+        """
+        Returns the repository with its parent and the user already known,
+        all fetched by a single GraphQL query.
+        """
+        gh_repo = self.get_repo(namespace, repo_name)
+        if gh_repo._snapshot is not None:
+            return gh_repo
+
+        try:
+            _, response = self._gh_api.requester.graphql_query(
+                BOOTSTRAP_QUERY, {"owner": namespace, "name": repo_name}
+            )
+        except GithubException as exc:
+            # REST requests are made on demand instead
+            logger.debug(f"Bootstrap query of {namespace}/{repo_name} failed: {exc}")
+            return gh_repo
+
+        data = response["data"]
+        self._gh_user = data["viewer"]["login"]
+        repository = data["repository"]
+        upstream = None
+        parent = None
+        if repository["parent"] is not None:
+            parent = RepoSnapshot.from_graphql(repository["parent"])
+
+        # upstream is the root of the fork network like `source` in REST, parent
+        # of a fork of a fork isn't the root and the root is fetched on demand
+        if parent is not None and not parent.is_fork:
+            parent_namespace, parent_name = parent.full_name.split("/")
+            upstream = self.get_repo(parent_namespace, parent_name)
+            upstream.hydrate(parent)
+
+        gh_repo.hydrate(RepoSnapshot.from_graphql(repository), upstream)
+        return gh_repo
+
+    def rate_limits(self) -> dict[str, RateLimitStatus]:
+        """Current budgets of the token, this request doesn't consume any"""
+        _, data = self._gh_api.requester.requestJsonAndCheck("GET", "/rate_limit")
+        resources: dict[str, Any] = data["resources"]
+        return {
+            name: RateLimitStatus(
+                limit=resource["limit"],
+                remaining=resource["remaining"],
+                reset=float(resource["reset"]),
+            )
+            for name, resource in resources.items()
+        }
+
+    def get_repo(
+        self, namespace: str, repo_name: str, repo: Optional[Repository] = None
+    ) -> GithubRepo:
+        """
+        Returns the only proxy of the repository, `repo` is its already fetched
+        data if there are any.
+        """
+        key = f"{namespace}/{repo_name}".lower()
+        gh_repo = self._repos.get(key)
+        if gh_repo is None:
+            logger.info(f"Trying to find repo: {namespace}/{repo_name}")
+            gh_repo = GithubRepo(self, namespace, repo_name, repo)
+            self._repos[key] = gh_repo
+
+        return gh_repo
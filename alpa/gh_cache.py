@@ -0,0 +1,269 @@
+"""
+On-disk caches of GitHub API responses shared by all Alpa repositories of
+the user.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+import requests
+from github.Requester import (
+    HTTPSRequestsConnectionClass,
+    Requester,
+    RequestsResponse,
+)
+from requests.structures import CaseInsensitiveDict
+
+from alpa.constants import GH_PERMISSION_CACHE_TTL, GH_RESPONSE_CACHE_MAX_SIZE
+from alpa.gh_stats import api_stats
+from alpa.http_sessions import http_sessions
+from alpa.state_file import load_json_state, save_json_state, write_atomically
+
+
+logger = logging.getLogger(__name__)
+
+GITHUB_SESSION = "github"
+
+
+def _private_dir(path: Path) -> Path:
+    # cached responses may come from private repositories
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if path.stat().st_mode & 0o077:
+        path.chmod(0o700)
+
+    return path
+
+
+def user_cache_dir() -> Path:
+    cache_home = os.getenv("XDG_CACHE_HOME") or "~/.cache"
+    return _private_dir(Path(cache_home).expanduser() / "alpa")
+
+
+class PermissionCache:
+    """
+    Permissions of users to GitHub repositories, each of them valid for
+    `ttl` seconds.
+    """
+
+    FILE_NAME = "permissions.json"
+
+    def __init__(
+        self, cache_dir: Optional[Path] = None, ttl: int = GH_PERMISSION_CACHE_TTL
+    ) -> None:
+        self.ttl = ttl
+        self._cache_file = (cache_dir or user_cache_dir()) / self.FILE_NAME
+
+    @staticmethod
+    def _key(repo: str, user: str) -> str:
+        return f"{repo.lower()}:{user.lower()}"
+
+    def _load(self) -> dict[str, list]:
+        return load_json_state(self._cache_file, "permission cache")
+
+    def _save(self, permissions: dict[str, list]) -> None:
+        save_json_state(self._cache_file, permissions, mode=0o600)
+
+    def get(self, repo: str, user: str) -> Optional[str]:
+        """Returns permission of the user to the repo unless it expired"""
+        cached = self._load().get(self._key(repo, user))
+        if cached is None:
+            return None
+
+        permission, stored_at = cached
+        if time.time() - stored_at > self.ttl:
+            return None
+
+        return permission
+
+    def set(self, repo: str, user: str, permission: str) -> None:
+        permissions = self._load()
+        now = time.time()
+        # drop expired entries so the file doesn't grow forever
+        permissions = {
+            key: value
+            for key, value in permissions.items()
+            if now - value[1] <= self.ttl
+        }
+        permissions[self._key(repo, user)] = [permission, now]
+        self._save(permissions)
+
+    def invalidate(
+        self, repo: Optional[str] = None, user: Optional[str] = None
+    ) -> None:
+        """
+        Forgets permissions of the user to the repo. Missing `repo` or `user`
+        matches any of them.
+        """
+        permissions = self._load()
+        for key in list(permissions):
+            cached_repo, _, cached_user = key.rpartition(":")
+            if (repo is None or cached_repo == repo.lower()) and (
+                user is None or cached_user == user.lower()
+            ):
+                del permissions[key]
+
+        self._save(permissions)
+
+
+@dataclass
+class CachedResponse:
+    body: str
+    headers: dict[str, str]
+
+    @property
+    def validators(self) -> dict[str, str]:
+        """Headers making the request conditional on the cached response"""
+        headers = CaseInsensitiveDict(self.headers)
+        validators = {}
+        if "ETag" in headers:
+            validators["If-None-Match"] = headers["ETag"]
+
+        if "Last-Modified" in headers:
+            validators["If-Modified-Since"] = headers["Last-Modified"]
+
+        return validators
+
+
+class ResponseCache:
+    """
+    Bodies of GitHub API responses with their validators, one directory per
+    API token so users never see each other's responses. Least recently used
+    responses are evicted once the directory exceeds `max_size` bytes.
+    """
+
+    def __init__(
+        self, cache_dir: Path, max_size: int = GH_RESPONSE_CACHE_MAX_SIZE
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        _private_dir(cache_dir)
+
+    @classmethod
+    def for_token(cls, authorization: Optional[str]) -> "ResponseCache":
+        token_dir = "anonymous"
+        if authorization:
+            token_dir = hashlib.sha256(authorization.encode()).hexdigest()[:16]
+
+        return cls(_private_dir(user_cache_dir() / "github") / token_dir)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{hashlib.sha256(key.encode()).hexdigest()}.json"
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        path = self._path(key)
+        try:
+            cached = CachedResponse(**json.loads(path.read_text()))
+        except FileNotFoundError:
+            return None
+        except (ValueError, TypeError) as exc:
+            logger.debug(f"Dropping broken cached response {path}: {exc}")
+            path.unlink(missing_ok=True)
+            return None
+
+        # mtime is the time of the last use
+        os.utime(path)
+        return cached
+
+    def set(self, key: str, response: CachedResponse) -> None:
+        write_atomically(self._path(key), json.dumps(asdict(response)), mode=0o600)
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+
+            path.unlink(missing_ok=True)
+            size -= entry_size
+
+
+class CachingHTTPSConnection(HTTPSRequestsConnectionClass):
+    """
+    PyGithub connection sending GET requests conditionally on the cached
+    responses. GitHub doesn't count `304 Not Modified` against the rate limit,
+    its cached body is returned to PyGithub as `200 OK` instead.
+    """
+
+    def __init__(self, host: str, port: Optional[int] = None, **kwargs: Any) -> None:
+        # PyGithub creates new connection for every request once connection
+        # classes are injected, the shared session keeps connections alive.
+        # The base class isn't initialized, its session and adapter would be
+        # created just to be thrown away.
+        self.host = host
+        self.port = port if port else 443
+        self.protocol = "https"
+        self.timeout = kwargs.get("timeout")
+        self.verify = kwargs.get("verify", True)
+        self.session = http_sessions.session(GITHUB_SESSION)
+        self.session.auth = Requester.noopAuth
+
+    def _send(self) -> RequestsResponse:
+        start = time.perf_counter()
+        response = super().getresponse()
+        received = 0 if self.stream else len(response.read().encode())
+        sent = len(self.input) if isinstance(self.input, (str, bytes)) else 0
+        api_stats.record(
+            self.verb,
+            self.url,
+            response.status,
+            sent,
+            received,
+            time.perf_counter() - start,
+        )
+        return response
+
+    def getresponse(self) -> RequestsResponse:
+        if self.verb.upper() != "GET" or self.stream:
+            return self._send()
+
+        cache = ResponseCache.for_token(self.headers.get("Authorization"))
+        key = f"{self.headers.get('Accept', '')} {self.host}:{self.port}{self.url}"
+        cached = cache.get(key)
+        if cached is not None:
+            self.headers = {**self.headers, **cached.validators}
+
+        response = self._send()
+        if response.status == 304 and cached is not None:
+            logger.debug(f"Using cached response of {self.url}")
+            # rate limit and validators are taken from the fresh response
+            headers = CaseInsensitiveDict(cached.headers)
+            headers.update(response.headers)
+            refreshed = CachedResponse(cached.body, dict(headers))
+            cache.set(key, refreshed)
+            return self._cached_response(self.url, refreshed)
+
+        if response.status == 200 and (
+            "ETag" in response.headers or "Last-Modified" in response.headers
+        ):
+            cache.set(key, CachedResponse(response.read(), dict(response.headers)))
+
+        return response
+
+    @staticmethod
+    def _cached_response(url: str, cached: CachedResponse) -> RequestsResponse:
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.encoding = "utf-8"
+        response.headers = CaseInsensitiveDict(cached.headers)
+        response._content = cached.body.encode()
+        return RequestsResponse(response)
+
+    def close(self) -> None:
+        # the session is shared with other connections
+        pass
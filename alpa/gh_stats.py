@@ -0,0 +1,130 @@
+"""
+Counts, sizes and latencies of GitHub API calls made by a command, so a change
+adding API calls to a command is easy to spot.
+"""
+import json
+import logging
+import threading
+from dataclasses import asdict, dataclass
+from os import getenv
+from typing import Optional
+from urllib.parse import urlparse
+
+import click
+
+from alpa.constants import GH_STATS_ENV_NAME
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class EndpointStats:
+    calls: int = 0
+    # conditional requests answered from the response cache
+    not_modified: int = 0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    seconds: float = 0.0
+
+    def add(self, other: "EndpointStats") -> None:
+        self.calls += other.calls
+        self.not_modified += other.not_modified
+        self.bytes_sent += other.bytes_sent
+        self.bytes_received += other.bytes_received
+        self.seconds += other.seconds
+
+
+class ApiCallStats:
+    """
+    GitHub API calls of the process grouped by method and path. Every HTTP
+    round trip is one call, retries included.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.endpoints: dict[str, EndpointStats] = {}
+
+    @staticmethod
+    def endpoint(verb: str, url: str) -> str:
+        return f"{verb.upper()} {urlparse(url).path}"
+
+    def record(
+        self,
+        verb: str,
+        url: str,
+        status: int,
+        bytes_sent: int,
+        bytes_received: int,
+        seconds: float,
+    ) -> None:
+        call = EndpointStats(
+            calls=1,
+            not_modified=int(status == 304),
+            bytes_sent=bytes_sent,
+            bytes_received=bytes_received,
+            seconds=seconds,
+        )
+        with self._lock:
+            self.endpoints.setdefault(self.endpoint(verb, url), EndpointStats()).add(
+                call
+            )
+
+    def total(self) -> EndpointStats:
+        total = EndpointStats()
+        with self._lock:
+            for stats in self.endpoints.values():
+                total.add(stats)
+
+        return total
+
+    def reset(self) -> None:
+        with self._lock:
+            self.endpoints.clear()
+
+    def format(self) -> list[str]:
+        lines = []
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+
+        for endpoint, stats in endpoints + [("total", self.total())]:
+            lines.append(
+                f"{endpoint}: {stats.calls} calls ({stats.not_modified} not "
+                f"modified), {stats.bytes_sent} B sent, {stats.bytes_received} B "
+                f"received, {stats.seconds * 1000:.0f} ms"
+            )
+
+        return lines
+
+    def report(self, command: Optional[str]) -> None:
+        """
+        Reports calls of the command to stderr if `ALPA_GH_STATS` is `-`,
+        otherwise appends them as a JSON line to the file it names.
+        """
+        total = self.total()
+        if not total.calls:
+            return
+
+        logger.debug(f"GitHub API: {total.calls} calls by {command}")
+        destination = getenv(GH_STATS_ENV_NAME)
+        if not destination:
+            return
+
+        if destination == "-":
+            click.echo(f"GitHub API calls of {command}:", err=True)
+            for line in self.format():
+                click.echo(f"  {line}", err=True)
+
+            return
+
+        with self._lock:
+            endpoints = {
+                endpoint: asdict(stats) for endpoint, stats in self.endpoints.items()
+            }
+
+        report = {"command": command, "total": asdict(total), "endpoints": endpoints}
+        with open(destination, "a") as stats_file:
+            stats_file.write(json.dumps(report) + "\n")
+
+
+api_stats = ApiCallStats()
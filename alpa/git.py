@@ -3,13 +3,24 @@ Wrapper around git cmd using subprocess
 """
 import asyncio
 import logging
+import mmap
+import os
 import subprocess
-from dataclasses import dataclass
-from typing import Optional
+import tempfile
+import threading
+import weakref
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Iterable, Iterator, Optional
 
+from alpa.constants import ALPA_GIT_DIR_NAME, GIT_CMD_MAX_CONCURRENCY
 
 logger = logging.getLogger(__name__)
 
+# streamed output can be huge, log only its beginning
+STREAM_LOG_MAX_LINES = 20
+STREAM_LOG_MAX_STDERR = 4096
+
 
 @dataclass
 class GitCmdResult:
@@ -33,28 +44,679 @@ class GitCmdResult:
         return result
 
 
+class GitRefReader:
+    """
+    Reads HEAD, refs and remotes straight from the git directory, so simple
+    queries don't need to spawn git.
+
+    Every public method returns None if it can't give a definitive answer
+    (unknown format, unreadable file, ...). The caller should ask git then.
+    """
+
+    # order in which `git rev-parse` looks for a short ref name, the bare name
+    # is looked up only for full ref names and all-caps pseudo-refs like HEAD
+    _DWIM_RULES = [
+        "refs/{}",
+        "refs/tags/{}",
+        "refs/heads/{}",
+        "refs/remotes/{}",
+        "refs/remotes/{}/HEAD",
+    ]
+    _MAX_SYMREF_DEPTH = 5
+
+    def __init__(self, git_dir: Path, common_dir: Path) -> None:
+        self.git_dir = git_dir
+        self.common_dir = common_dir
+
+    @classmethod
+    def from_work_tree(cls, work_tree: str) -> Optional["GitRefReader"]:
+        if os.environ.get("GIT_DIR") or os.environ.get("GIT_COMMON_DIR"):
+            logger.debug("Git directory overridden by environment, using git cmd")
+            return None
+
+        dot_git = Path(work_tree) / ".git"
+        try:
+            if dot_git.is_dir():
+                git_dir = dot_git
+            elif dot_git.is_file():
+                # linked worktrees and submodules have `gitdir: <path>` file
+                content = dot_git.read_text().strip()
+                if not content.startswith("gitdir: "):
+                    return None
+
+                git_dir = Path(work_tree) / content.removeprefix("gitdir: ")
+            else:
+                return None
+
+            common_dir = git_dir
+            commondir_file = git_dir / "commondir"
+            if commondir_file.is_file():
+                common_dir = git_dir / commondir_file.read_text().strip()
+        except (OSError, UnicodeDecodeError) as exc:
+            logger.debug(f"Unable to locate git directory of {work_tree}: {exc}")
+            return None
+
+        if (common_dir / "reftable").exists():
+            logger.debug("Repository uses reftable ref storage, using git cmd")
+            return None
+
+        return cls(git_dir.resolve(), common_dir.resolve())
+
+    @staticmethod
+    def _is_valid_refname(refname: str) -> bool:
+        return (
+            refname != ""
+            and not refname.startswith("/")
+            and not refname.endswith("/")
+            and ".." not in refname
+            and "\\" not in refname
+        )
+
+    def _ref_path(self, refname: str) -> Path:
+        if refname.startswith("refs/"):
+            return self.common_dir / refname
+
+        # pseudo refs like HEAD are stored per worktree
+        return self.git_dir / refname
+
+    def _lookup_packed_ref(self, refname: str) -> Optional[str]:
+        packed_refs = self.common_dir / "packed-refs"
+        try:
+            packed_refs_file = open(packed_refs, "rb")
+        except FileNotFoundError:
+            return None
+
+        with packed_refs_file:
+            if os.fstat(packed_refs_file.fileno()).st_size == 0:
+                return None
+
+            with mmap.mmap(
+                packed_refs_file.fileno(), 0, access=mmap.ACCESS_READ
+            ) as packed:
+                return self._search_packed_refs(packed, refname.encode())
+
+    @staticmethod
+    def _line_end(packed: mmap.mmap, line_start: int) -> int:
+        line_end = packed.find(b"\n", line_start)
+        return len(packed) if line_end == -1 else line_end
+
+    @classmethod
+    def _search_packed_refs(cls, packed: mmap.mmap, refname: bytes) -> Optional[str]:
+        start = 0
+        is_sorted = False
+        if packed[:1] == b"#":
+            header_end = cls._line_end(packed, 0)
+            is_sorted = b" sorted" in packed[:header_end]
+            start = header_end + 1
+
+        if not is_sorted:
+            # old git versions didn't guarantee the order, scan the whole file
+            for line in packed[start:].splitlines():
+                if line.startswith(b"^") or b" " not in line:
+                    continue
+
+                sha, name = line.split(b" ", 1)
+                if name == refname:
+                    return sha.decode()
+
+            return None
+
+        low, high = start, len(packed)
+        while low < high:
+            line_start = packed.rfind(b"\n", 0, (low + high) // 2) + 1
+            if packed[line_start : line_start + 1] == b"^":
+                # peeled tag line belongs to the record above it
+                line_start = packed.rfind(b"\n", 0, line_start - 1) + 1
+
+            line_end = cls._line_end(packed, line_start)
+            sha, _, name = packed[line_start:line_end].partition(b" ")
+            if name == refname:
+                return sha.decode()
+
+            if name < refname:
+                low = line_end + 1
+                if packed[low : low + 1] == b"^":
+                    low = cls._line_end(packed, low) + 1
+            else:
+                high = line_start
+
+        return None
+
+    def _resolve(self, refname: str, depth: int = 0) -> Optional[str]:
+        if depth > self._MAX_SYMREF_DEPTH or not self._is_valid_refname(refname):
+            raise ValueError(f"Unable to resolve ref {refname}")
+
+        ref_path = self._ref_path(refname)
+        if ref_path.is_file():
+            content = ref_path.read_text().strip()
+            if content.startswith("ref: "):
+                return self._resolve(content.removeprefix("ref: "), depth + 1)
+
+            if not self._is_object_id(content):
+                # FETCH_HEAD and other files with special format
+                raise ValueError(f"{ref_path} doesn't contain an object id")
+
+            return content
+
+        if not refname.startswith("refs/"):
+            return None
+
+        return self._lookup_packed_ref(refname)
+
+    def resolve_ref(self, refname: str) -> Optional[str]:
+        """
+        Returns commit hash of full ref name (or HEAD) or None if the ref doesn't
+        exist or can't be read.
+        """
+        try:
+            return self._resolve(refname)
+        except (OSError, UnicodeDecodeError, ValueError) as exc:
+            logger.debug(f"Unable to read ref {refname}: {exc}")
+            return None
+
+    def ref_exists(self, refname: str) -> Optional[bool]:
+        try:
+            return self._resolve(refname) is not None
+        except (OSError, UnicodeDecodeError, ValueError) as exc:
+            logger.debug(f"Unable to read ref {refname}: {exc}")
+            return None
+
+    @staticmethod
+    def _is_pseudoref(rev: str) -> bool:
+        return bool(rev) and all(char.isupper() or char == "_" for char in rev)
+
+    @staticmethod
+    def _is_object_id(content: str) -> bool:
+        # SHA-1 or SHA-256
+        return len(content) in (40, 64) and all(
+            char in "0123456789abcdef" for char in content
+        )
+
+    def rev_parse(self, rev: str) -> Optional[str]:
+        rules = self._DWIM_RULES
+        if rev.startswith("refs/") or self._is_pseudoref(rev):
+            rules = ["{}"] + rules
+
+        for rule in rules:
+            commit = self.resolve_ref(rule.format(rev))
+            if commit is not None:
+                return commit
+
+        return None
+
+    def head(self) -> Optional[str]:
+        """
+        Returns short name of the current branch or `HEAD` in detached state,
+        same as `git rev-parse --abbrev-ref HEAD`.
+        """
+        try:
+            content = (self.git_dir / "HEAD").read_text().strip()
+        except (OSError, UnicodeDecodeError) as exc:
+            logger.debug(f"Unable to read HEAD: {exc}")
+            return None
+
+        if not content.startswith("ref: "):
+            return "HEAD"
+
+        refname = content.removeprefix("ref: ")
+        if not refname.startswith("refs/heads/") or not self.ref_exists(refname):
+            # unborn branch or something unusual
+            return None
+
+        return refname.removeprefix("refs/heads/")
+
+    @staticmethod
+    def _parse_config_value(raw_value: str) -> str:
+        value = ""
+        in_quotes = False
+        escaped = False
+        for char in raw_value.strip():
+            if escaped:
+                value += {"n": "\n", "t": "\t", "b": "\b"}.get(char, char)
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_quotes = not in_quotes
+            elif char in "#;" and not in_quotes:
+                break
+            else:
+                value += char
+
+        return value.rstrip() if not in_quotes else value
+
+    def _read_remotes(self) -> Optional[dict[str, list[str]]]:
+        remotes: dict[str, list[str]] = {}
+        current_remote: Optional[str] = None
+        for line in (self.common_dir / "config").read_text().splitlines():
+            line = line.strip()
+            if not line or line[0] in "#;":
+                continue
+
+            if line.endswith("\\"):
+                # line continuations are rare, leave them to git
+                return None
+
+            if line.startswith("["):
+                section = line[1 : line.index("]")].strip()
+                if section.lower().startswith("include"):
+                    # included files may define remotes as well
+                    return None
+
+                current_remote = None
+                name, _, subsection = section.partition(" ")
+                if name.lower() == "remote" and subsection.startswith('"'):
+                    current_remote = subsection.strip('"')
+                elif section.lower().startswith("remote."):
+                    current_remote = section[len("remote.") :]
+
+                if current_remote is not None:
+                    remotes.setdefault(current_remote, [])
+
+                continue
+
+            if current_remote is None:
+                continue
+
+            key, _, raw_value = line.partition("=")
+            if key.strip().lower() == "url":
+                remotes[current_remote].append(self._parse_config_value(raw_value))
+
+        return remotes
+
+    def remotes(self) -> Optional[dict[str, list[str]]]:
+        """
+        Returns remote names with their urls as configured in the repository.
+        """
+        try:
+            return self._read_remotes()
+        except (OSError, UnicodeDecodeError, ValueError) as exc:
+            logger.debug(f"Unable to read remotes from git config: {exc}")
+            return None
+
+
+@dataclass
+class GitStatus:
+    """
+    Snapshot of `git status --porcelain=v2 -z --branch` output.
+    """
+
+    branch: Optional[str] = None
+    upstream: Optional[str] = None
+    ahead: int = 0
+    behind: int = 0
+    staged: list[str] = field(default_factory=list)
+    modified: list[str] = field(default_factory=list)
+    untracked: list[str] = field(default_factory=list)
+    conflicted: list[str] = field(default_factory=list)
+
+    @property
+    def is_dirty(self) -> bool:
+        return bool(self.staged or self.modified or self.untracked or self.conflicted)
+
+    def _parse_header(self, header: str) -> None:
+        key, _, value = header.partition(" ")
+        if key == "branch.head":
+            self.branch = None if value == "(detached)" else value
+        elif key == "branch.upstream":
+            self.upstream = value
+        elif key == "branch.ab":
+            ahead, behind = value.split()
+            self.ahead, self.behind = int(ahead), -int(behind)
+
+    def _add_changed_entry(self, xy: str, path: str) -> None:
+        if xy[0] != ".":
+            self.staged.append(path)
+
+        if xy[1] != ".":
+            self.modified.append(path)
+
+    @classmethod
+    def from_porcelain_v2(cls, output: str) -> "GitStatus":
+        status = cls()
+        entries = iter(output.split("\0"))
+        for entry in entries:
+            kind, _, rest = entry.partition(" ")
+            if kind == "#":
+                status._parse_header(rest)
+            elif kind == "1":
+                # 1 <XY> <sub> <mH> <mI> <mW> <hH> <hI> <path>
+                fields = rest.split(" ", 7)
+                status._add_changed_entry(fields[0], fields[7])
+            elif kind == "2":
+                # 2 <XY> <sub> <mH> <mI> <mW> <hH> <hI> <X><score> <path>\0<orig>
+                fields = rest.split(" ", 8)
+                status._add_changed_entry(fields[0], fields[8])
+                next(entries, None)
+            elif kind == "u":
+                # u <XY> <sub> <m1> <m2> <m3> <mW> <h1> <h2> <h3> <path>
+                status.conflicted.append(rest.split(" ", 9)[9])
+            elif kind == "?":
+                status.untracked.append(rest)
+
+        return status
+
+
+@dataclass
+class GitCacheInfo:
+    hits: int
+    misses: int
+    size: int
+
+
+class GitCatFile:
+    """
+    Long-lived `git cat-file --batch` (or `--batch-check`) co-process. Each query
+    is one line written to its stdin, so reading many objects costs one process.
+    """
+
+    def __init__(self, cwd: str, batch_option: str) -> None:
+        self.cwd = cwd
+        self.batch_option = batch_option
+        self._process: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+
+    def _ensure_process(self) -> subprocess.Popen:
+        if self._process is None or self._process.poll() is not None:
+            logger.debug(f"Starting git cat-file {self.batch_option} in {self.cwd}")
+            self._process = subprocess.Popen(
+                ["git", "cat-file", self.batch_option],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                cwd=self.cwd,
+            )
+
+        return self._process
+
+    @staticmethod
+    def _pipes(process: subprocess.Popen) -> tuple[IO[bytes], IO[bytes]]:
+        assert process.stdin is not None and process.stdout is not None
+        return process.stdin, process.stdout
+
+    def query(self, obj: str) -> tuple[Optional[str], bytes]:
+        """
+        Returns type of the object and its content (empty for `--batch-check`).
+        Type is None if the object doesn't exist.
+        """
+        if "\n" in obj:
+            raise ValueError(f"Object name can't contain new line: {obj!r}")
+
+        with self._lock:
+            stdin, stdout = self._pipes(self._ensure_process())
+            stdin.write(f"{obj}\n".encode())
+            stdin.flush()
+            header = stdout.readline().decode().split()
+            if len(header) != 3:
+                # `<obj> missing` or `<obj> ambiguous`
+                logger.debug(f"git cat-file: {' '.join(header)}")
+                return None, b""
+
+            _, obj_type, size = header
+            content = b""
+            if self.batch_option == "--batch":
+                content = stdout.read(int(size) + 1)[:-1]
+
+            return obj_type, content
+
+    def close(self) -> None:
+        with self._lock:
+            if self._process is None:
+                return
+
+            self._close_process(self._process)
+            self._process = None
+
+    @staticmethod
+    def _close_process(process: subprocess.Popen) -> None:
+        if process.stdin is not None:
+            process.stdin.close()
+        if process.stdout is not None:
+            process.stdout.close()
+        process.wait()
+
+
 class GitCMD:
+    # commands whose output depends only on refs, objects and config
+    _CACHEABLE_COMMANDS = {
+        "cat-file",
+        "for-each-ref",
+        "log",
+        "ls-tree",
+        "merge-base",
+        "rev-list",
+        "rev-parse",
+        "show-ref",
+        "version",
+    }
+    # commands reading the working tree - never cached, but don't change refs
+    _WORK_TREE_QUERIES = {"diff", "ls-files", "status"}
+
+    STATUS_CMD = [
+        "status",
+        "--porcelain=v2",
+        "-z",
+        "--branch",
+        "--untracked-files=all",
+    ]
+
     def __init__(self, cwd: str) -> None:
         self.git_root = cwd
+        self._cache: dict[tuple[tuple[str, ...], str], GitCmdResult] = {}
+        self._cache_hits = 0
+        self._cache_misses = 0
         output = self.git_cmd(["rev-parse", "--show-toplevel"])
         if "not a git repository" in output.stderr:
             raise FileNotFoundError(output.stderr)
 
         self.git_root = output.stdout.strip()
+        self.refs = GitRefReader.from_work_tree(self.git_root)
+
+        # started lazily on the first object read
+        self._cat_file = GitCatFile(self.git_root, "--batch")
+        self._cat_file_check = GitCatFile(self.git_root, "--batch-check")
+        weakref.finalize(self, self._cat_file.close)
+        weakref.finalize(self, self._cat_file_check.close)
+
+    def status(self) -> GitStatus:
+        output = self.git_cmd(self.STATUS_CMD).stdout
+        return GitStatus.from_porcelain_v2(output)
+
+    def read_blob(self, ref: str, path: str) -> Optional[str]:
+        """
+        Reads file from any ref without checking it out. Returns None if there
+        is no such file.
+        """
+        obj_type, content = self._cat_file.query(f"{ref}:{path}")
+        if obj_type != "blob":
+            return None
+
+        return content.decode()
+
+    def read_first_blob(self, ref: str, paths: Iterable[str]) -> Optional[str]:
+        """Reads the first of `paths` existing in `ref`, see `read_blob`"""
+        for path in paths:
+            content = self.read_blob(ref, path)
+            if content is not None:
+                return content
+
+        return None
+
+    def object_exists(self, obj: str) -> bool:
+        obj_type, _ = self._cat_file_check.query(obj)
+        return obj_type is not None
+
+    def close(self) -> None:
+        self._cat_file.close()
+        self._cat_file_check.close()
+
+    @property
+    def common_dir(self) -> Path:
+        if self.refs is not None:
+            return self.refs.common_dir
+
+        common_dir = self.git_cmd(["rev-parse", "--git-common-dir"]).stdout
+        return Path(self.git_root) / common_dir
+
+    @property
+    def alpa_dir(self) -> Path:
+        alpa_dir = self.common_dir / ALPA_GIT_DIR_NAME
+        alpa_dir.mkdir(exist_ok=True)
+        return alpa_dir
+
+    def current_branch(self) -> str:
+        if self.refs is not None:
+            branch = self.refs.head()
+            if branch is not None:
+                return branch
+
+        return self.git_cmd(["rev-parse", "--abbrev-ref", "HEAD"]).stdout
+
+    def rev_parse(self, rev: str) -> str:
+        if self.refs is not None:
+            commit = self.refs.rev_parse(rev)
+            if commit is not None:
+                return commit
+
+        return self.git_cmd(["rev-parse", rev]).stdout
+
+    def branch_exists(self, branch: str) -> bool:
+        if self.refs is not None:
+            exists = self.refs.ref_exists(f"refs/heads/{branch}")
+            if exists is not None:
+                return exists
+
+        ref = f"refs/heads/{branch}"
+        return self.git_cmd(["show-ref", "--verify", "--quiet", ref]).retval == 0
+
+    def remotes(self) -> set[str]:
+        if self.refs is not None:
+            remotes = self.refs.remotes()
+            if remotes is not None:
+                return set(remotes)
+
+        return set(self.git_cmd(["remote"]).stdout.split())
+
+    def remote_url(self, remote: str) -> str:
+        if self.refs is not None:
+            remotes = self.refs.remotes()
+            if remotes is not None and remotes.get(remote):
+                return remotes[remote][-1]
+
+        return self.git_cmd(["config", "--get", f"remote.{remote}.url"]).stdout
+
+    @classmethod
+    def _is_cacheable(cls, arguments: list[str]) -> bool:
+        if not arguments:
+            return False
+
+        command, options = arguments[0], arguments[1:]
+        if command in cls._CACHEABLE_COMMANDS:
+            return True
+
+        if command == "remote":
+            # `git remote show` contacts the remote, don't cache it
+            return options in ([], ["-v"], ["--verbose"]) or options[0] == "get-url"
+
+        if command == "config":
+            return bool({"--get", "--get-all", "--list", "-l"} & set(options))
+
+        if command == "branch":
+            return all(
+                option in ("--list", "-a", "--all", "-r", "--remotes")
+                or option.startswith("--format")
+                for option in options
+            )
+
+        return False
+
+    @classmethod
+    def _is_mutating(cls, arguments: list[str]) -> bool:
+        return not (
+            cls._is_cacheable(arguments)
+            or (arguments and arguments[0] in cls._WORK_TREE_QUERIES)
+        )
+
+    @property
+    def cache_info(self) -> GitCacheInfo:
+        return GitCacheInfo(
+            hits=self._cache_hits, misses=self._cache_misses, size=len(self._cache)
+        )
+
+    def invalidate_cache(self) -> None:
+        if self._cache:
+            logger.debug(f"Invalidating {len(self._cache)} cached git cmd results")
+
+        self._cache.clear()
 
     def git_cmd(
-        self, arguments: list[str], cwd: Optional[str] = None
+        self,
+        arguments: list[str],
+        cwd: Optional[str] = None,
+        input: str = "",
+        use_cache: bool = True,
     ) -> "GitCmdResult":
+        """
+        Runs git command, results of read-only commands are memoized until any
+        mutating command runs. `use_cache=False` always runs the command, e.g.
+        when another process may have changed the repository.
+        """
         if cwd is None:
             context = self.git_root
         else:
             context = cwd
 
+        if input or not use_cache:
+            # result depends on the input or may be outdated, never cache it
+            result = self._run_git_cmd(arguments, context, input)
+            if self._is_mutating(arguments):
+                self.invalidate_cache()
+
+            return result
+
+        cached_result = self._get_cached_result(arguments, context)
+        if cached_result is not None:
+            return cached_result
+
+        result = self._run_git_cmd(arguments, context)
+        self._update_cache(arguments, context, result)
+        return result
+
+    def _get_cached_result(
+        self, arguments: list[str], context: str
+    ) -> Optional["GitCmdResult"]:
+        if not self._is_cacheable(arguments):
+            return None
+
+        cached_result = self._cache.get((tuple(arguments), context))
+        if cached_result is None:
+            self._cache_misses += 1
+            return None
+
+        self._cache_hits += 1
+        logger.debug(
+            f"Using cached result of $ git {' '.join(arguments)}; {self.cache_info}"
+        )
+        return cached_result
+
+    def _update_cache(
+        self, arguments: list[str], context: str, result: "GitCmdResult"
+    ) -> None:
+        if self._is_cacheable(arguments):
+            self._cache[(tuple(arguments), context)] = result
+        elif self._is_mutating(arguments):
+            self.invalidate_cache()
+
+    @staticmethod
+    def _run_git_cmd(
+        arguments: list[str], context: str, input: str = ""
+    ) -> "GitCmdResult":
         logger.debug(
             f"Running git cmd: $ git {' '.join(arguments)}; in context {context}"
         )
         process = subprocess.run(
             ["git"] + arguments,
+            input=input.encode() if input else None,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             cwd=context,
@@ -71,6 +733,55 @@ class GitCMD:
             retval=process.returncode,
         )
 
+    def git_cmd_stream(
+        self, arguments: list[str], cwd: Optional[str] = None
+    ) -> Iterator[str]:
+        """
+        Yields lines of stdout as git produces them, so big outputs aren't held
+        in memory. Only the first few lines are logged.
+        """
+        context = self.git_root if cwd is None else cwd
+        logger.debug(
+            f"Running streamed git cmd: $ git {' '.join(arguments)}; "
+            f"in context {context}"
+        )
+        if self._is_mutating(arguments):
+            self.invalidate_cache()
+
+        line_count = 0
+        # stderr goes to file so the process can't block on a full stderr pipe
+        with tempfile.TemporaryFile() as stderr_file:
+            process = subprocess.Popen(
+                ["git"] + arguments,
+                stdout=subprocess.PIPE,
+                stderr=stderr_file,
+                cwd=context,
+            )
+            assert process.stdout is not None
+            try:
+                for raw_line in process.stdout:
+                    line = raw_line.decode(errors="replace").rstrip("\n")
+                    if line_count < STREAM_LOG_MAX_LINES:
+                        logger.debug(f"git cmd stdout: {line}")
+
+                    line_count += 1
+                    yield line
+            finally:
+                if process.poll() is None:
+                    # consumer stopped reading early
+                    process.terminate()
+
+                process.stdout.close()
+                retval = process.wait()
+                stderr_file.seek(0)
+                stderr = stderr_file.read(STREAM_LOG_MAX_STDERR).decode(
+                    errors="replace"
+                )
+                logger.debug(
+                    f"streamed git cmd results: {line_count} lines of stdout; "
+                    f"stderr: {stderr.strip()}; retval: {retval}"
+                )
+
     async def async_git_cmd(
         self, arguments: list[str], cwd: Optional[str] = None
     ) -> "GitCmdResult":
@@ -79,6 +790,10 @@ class GitCMD:
         else:
             context = cwd
 
+        cached_result = self._get_cached_result(arguments, context)
+        if cached_result is not None:
+            return cached_result
+
         logger.debug(
             f"Running async git cmd: $ git {' '.join(arguments)}; in context {context}"
         )
@@ -94,8 +809,36 @@ class GitCMD:
             f"async git cmd results: stdout: {stdout.decode()}; "
             f"stderr: {stderr.decode()}; retval: {async_subprocess.returncode}"
         )
-        return GitCmdResult(
+        result = GitCmdResult(
             stdout=stdout.decode().strip(),
             stderr=stderr.decode().strip(),
             retval=async_subprocess.returncode,  # type: ignore
         )
+        self._update_cache(arguments, context, result)
+        return result
+
+    async def async_git_cmds(
+        self,
+        commands: list[list[str]],
+        max_concurrency: int = GIT_CMD_MAX_CONCURRENCY,
+    ) -> list["GitCmdResult"]:
+        """
+        Runs independent git commands concurrently, at most `max_concurrency`
+        of them at once. Results are in the same order as the commands.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run_bounded(arguments: list[str]) -> GitCmdResult:
+            async with semaphore:
+                return await self.async_git_cmd(arguments)
+
+        return list(await asyncio.gather(*map(run_bounded, commands)))
+
+    def git_cmds(self, commands: list[list[str]]) -> list["GitCmdResult"]:
+        """
+        Synchronous entry point to `async_git_cmds`.
+        """
+        if len(commands) == 1:
+            return [self.git_cmd(commands[0])]
+
+        return asyncio.run(self.async_git_cmds(commands))
@@ -0,0 +1,117 @@
+"""
+HTTP sessions shared by the whole process, so connections to GitHub and
+upstream hosts are kept alive and reused between requests.
+"""
+import atexit
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from urllib3 import Retry
+
+from alpa.constants import (
+    HTTP_MAX_CONNECTIONS_PER_HOST,
+    HTTP_MAX_HOSTS,
+    HTTP_MAX_RETRIES,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ConnectionStats:
+    requests: int
+    connections: int
+
+    @property
+    def reused(self) -> int:
+        """Requests which didn't need a new connection"""
+        return max(self.requests - self.connections, 0)
+
+
+class HTTPSessionManager:
+    """
+    Hands out named `requests` sessions which all send requests through one
+    transport, so they share its pools of keep-alive connections.
+
+    Every host gets at most `HTTP_MAX_CONNECTIONS_PER_HOST` connections, more
+    concurrent requests wait for a free one. urllib3 never pipelines, each
+    connection carries one request at a time.
+    """
+
+    def __init__(self, transport: Optional[BaseAdapter] = None) -> None:
+        self._lock = threading.Lock()
+        self._sessions: dict[str, requests.Session] = {}
+        self.transport = transport or self._default_transport()
+
+    @staticmethod
+    def _default_transport() -> HTTPAdapter:
+        return HTTPAdapter(
+            pool_connections=HTTP_MAX_HOSTS,
+            pool_maxsize=HTTP_MAX_CONNECTIONS_PER_HOST,
+            pool_block=True,
+            max_retries=Retry(
+                total=HTTP_MAX_RETRIES,
+                backoff_factor=0.5,
+                status_forcelist=[502, 503, 504],
+                allowed_methods=["GET", "HEAD"],
+            ),
+        )
+
+    def session(self, name: str = "default") -> requests.Session:
+        with self._lock:
+            session = self._sessions.get(name)
+            if session is None:
+                session = requests.Session()
+                session.mount("https://", self.transport)
+                session.mount("http://", self.transport)
+                self._sessions[name] = session
+
+            return session
+
+    def set_transport(self, transport: BaseAdapter) -> None:
+        """Sends requests of all sessions through another transport"""
+        with self._lock:
+            self.transport.close()
+            self.transport = transport
+            for session in self._sessions.values():
+                session.mount("https://", transport)
+                session.mount("http://", transport)
+
+    def stats(self) -> ConnectionStats:
+        stats = ConnectionStats(requests=0, connections=0)
+        if not isinstance(self.transport, HTTPAdapter):
+            return stats
+
+        pools = self.transport.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            stats.requests += pool.num_requests
+            stats.connections += pool.num_connections
+
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+
+            self._sessions.clear()
+            self.transport.close()
+
+
+http_sessions = HTTPSessionManager()
+
+
+@atexit.register
+def _log_stats() -> None:
+    stats = http_sessions.stats()
+    if stats.requests:
+        logger.debug(
+            f"HTTP: {stats.requests} requests over {stats.connections} "
+            f"connections, {stats.reused} reused"
+        )
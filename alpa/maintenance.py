@@ -0,0 +1,177 @@
+"""
+Keeps object storage of big Alpa clones in shape, so history queries don't
+slow down with growing number of packages.
+"""
+import logging
+import subprocess
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from alpa.constants import (
+    MAIN_BRANCH,
+    MAINTENANCE_MAX_LOOSE_OBJECTS,
+    MAINTENANCE_MAX_PACKS,
+    MAINTENANCE_MIN_COMMIT_GRAPH_OBJECTS,
+)
+from alpa.git import GitCMD
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ObjectStats:
+    loose: int
+    in_pack: int
+    packs: int
+
+    @classmethod
+    def from_count_objects(cls, output: str) -> "ObjectStats":
+        """Parses output of `git count-objects -v`"""
+        values = {}
+        for line in output.splitlines():
+            key, _, value = line.partition(": ")
+            if value.isdigit():
+                values[key] = int(value)
+
+        return cls(
+            loose=values.get("count", 0),
+            in_pack=values.get("in-pack", 0),
+            packs=values.get("packs", 0),
+        )
+
+
+@dataclass
+class StatusAcceleration:
+    untracked_cache: bool
+    # None if git is built without the fsmonitor daemon
+    fsmonitor: Optional[bool]
+
+
+class RepoMaintenance:
+    """
+    Runs `git maintenance` tasks when the repository crosses thresholds of
+    loose objects or packs, or has a lot of objects and no commit-graph.
+    """
+
+    def __init__(self, git: GitCMD) -> None:
+        self.git = git
+
+    def stats(self) -> ObjectStats:
+        # output changes with every fetch, don't take it from cache
+        result = self.git.git_cmd(["count-objects", "-v"], use_cache=False)
+        return ObjectStats.from_count_objects(result.stdout)
+
+    def _has_commit_graph(self) -> bool:
+        info = self.git.common_dir / "objects" / "info"
+        return (info / "commit-graph").is_file() or (
+            info / "commit-graphs" / "commit-graph-chain"
+        ).is_file()
+
+    def needed_tasks(self, stats: ObjectStats) -> list[str]:
+        tasks = []
+        if stats.loose > MAINTENANCE_MAX_LOOSE_OBJECTS:
+            tasks.append("loose-objects")
+
+        if stats.packs > MAINTENANCE_MAX_PACKS:
+            # writes multi-pack-index and repacks small packs into bigger one
+            tasks.append("incremental-repack")
+
+        if tasks or (
+            stats.in_pack + stats.loose >= MAINTENANCE_MIN_COMMIT_GRAPH_OBJECTS
+            and not self._has_commit_graph()
+        ):
+            tasks.append("commit-graph")
+
+        return tasks
+
+    @staticmethod
+    def all_tasks(stats: ObjectStats) -> list[str]:
+        tasks = ["loose-objects", "commit-graph"]
+        if stats.packs:
+            # multi-pack-index can't be written before there is any pack
+            tasks.insert(1, "incremental-repack")
+
+        return tasks
+
+    @staticmethod
+    def _maintenance_cmd(tasks: list[str]) -> list[str]:
+        return ["maintenance", "run"] + [f"--task={task}" for task in tasks]
+
+    def run(self, tasks: list[str]) -> bool:
+        result = self.git.git_cmd(self._maintenance_cmd(tasks))
+        if result.retval != 0:
+            logger.warning(f"Repository maintenance failed: {result.stderr}")
+            return False
+
+        return True
+
+    def run_in_background_if_needed(self) -> None:
+        tasks = self.needed_tasks(self.stats())
+        if not tasks:
+            return
+
+        # git maintenance takes its own lock, concurrent runs are skipped
+        logger.debug(f"Running maintenance tasks {tasks} in background")
+        subprocess.Popen(
+            ["git"] + self._maintenance_cmd(tasks),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            cwd=self.git.git_root,
+            start_new_session=True,
+        )
+
+    def fsmonitor_supported(self) -> bool:
+        build_options = self.git.git_cmd(["version", "--build-options"]).stdout
+        return "fsmonitor--daemon" in build_options
+
+    def status_acceleration(self) -> StatusAcceleration:
+        untracked_cache = self.git.git_cmd(
+            ["config", "--get", "--bool", "core.untrackedCache"]
+        )
+        fsmonitor = None
+        if self.fsmonitor_supported():
+            daemon = self.git.git_cmd(["fsmonitor--daemon", "status"])
+            fsmonitor = daemon.retval == 0
+
+        return StatusAcceleration(
+            untracked_cache=untracked_cache.stdout == "true", fsmonitor=fsmonitor
+        )
+
+    def enable_status_acceleration(self) -> StatusAcceleration:
+        """
+        Lets `git status` skip directories and files which didn't change
+        instead of scanning the whole working tree.
+        """
+        self.git.git_cmd(["config", "core.untrackedCache", "true"])
+        if self.fsmonitor_supported():
+            self.git.git_cmd(["config", "core.fsmonitor", "true"])
+
+        # status writes the untracked cache to the index and starts the daemon
+        self.git.git_cmd(self.git.STATUS_CMD)
+        return self.status_acceleration()
+
+    def time_hot_queries(self, branch: str) -> dict[str, float]:
+        """
+        Returns seconds each query `push` and `show-history` depend on takes
+        on the branch. Results are never cached.
+        """
+        queries = {
+            "rev-parse": ["rev-parse", branch],
+            "merge-base --is-ancestor": [
+                "merge-base",
+                "--is-ancestor",
+                MAIN_BRANCH,
+                branch,
+            ],
+            "log --graph": ["log", "--decorate", "--graph", "--oneline", branch],
+        }
+        timings = {}
+        for name, arguments in queries.items():
+            start = time.perf_counter()
+            self.git.git_cmd(arguments, use_cache=False)
+            timings[name] = time.perf_counter() - start
+
+        return timings
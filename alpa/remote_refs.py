@@ -0,0 +1,173 @@
+"""
+Locally cached snapshot of branches on a remote, so listing packages doesn't
+need to contact the remote every time.
+"""
+import logging
+import os
+import subprocess
+import time
+from bisect import bisect_left
+from typing import Optional
+
+from alpa.constants import REMOTE_REFS_CACHE_TTL
+from alpa.git import GitCMD
+from alpa.state_file import write_atomically
+
+
+logger = logging.getLogger(__name__)
+
+
+_REGEX_SPECIAL_CHARS = set(".^$*+?{}[]\\|()")
+_REGEX_QUANTIFIERS = set("*?{")
+
+
+def regex_literal_prefix(regex: str) -> str:
+    """
+    Returns literal prefix every string matched by `re.match(regex)` starts with.
+    """
+    if "|" in regex:
+        # alternation may have different prefixes
+        return ""
+
+    prefix = ""
+    chars = iter(regex.removeprefix("^"))
+    for char in chars:
+        if char not in _REGEX_SPECIAL_CHARS:
+            prefix += char
+            continue
+
+        if char == "\\":
+            # escaped punctuation like in `re.escape` output is literal
+            escaped = next(chars, "")
+            if escaped and not escaped.isalnum():
+                prefix += escaped
+                continue
+
+        if char in _REGEX_QUANTIFIERS:
+            # the previous char may be repeated zero times
+            prefix = prefix[:-1]
+
+        break
+
+    return prefix
+
+
+class RemoteRefsCache:
+    """
+    Output of `git ls-remote --heads <remote>` sorted by ref name and stored
+    in the git directory. Stale snapshot is served immediately and refreshed
+    in background.
+    """
+
+    _REFS_PREFIX = "refs/heads/"
+
+    def __init__(
+        self, git: GitCMD, remote: str, ttl: int = REMOTE_REFS_CACHE_TTL
+    ) -> None:
+        self.git = git
+        self.remote = remote
+        self.ttl = ttl
+        self.cache_file = git.alpa_dir / f"remote-refs-{remote}"
+        self._refreshing_file = git.alpa_dir / f"remote-refs-{remote}.refreshing"
+
+    def _age(self) -> Optional[float]:
+        try:
+            return time.time() - self.cache_file.stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    def _write(self, ls_remote_output: str) -> None:
+        lines = []
+        for line in ls_remote_output.splitlines():
+            commit, _, name = line.partition("\t")
+            if name:
+                lines.append(f"{name} {commit}\n")
+
+        write_atomically(self.cache_file, "".join(sorted(lines)))
+
+    def refresh(self) -> bool:
+        result = self.git.git_cmd(["ls-remote", "--heads", self.remote])
+        if result.retval != 0:
+            logger.warning(f"Unable to list branches of {self.remote}: {result.stderr}")
+            return False
+
+        self._write(result.stdout)
+        return True
+
+    def _start_refreshing(self) -> bool:
+        """Creates the marker of running refresh unless another one runs"""
+        try:
+            os.close(
+                os.open(self._refreshing_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            )
+            return True
+        except FileExistsError:
+            pass
+
+        try:
+            if time.time() - self._refreshing_file.stat().st_mtime < self.ttl:
+                return False
+        except FileNotFoundError:
+            # the other refresh has just finished
+            return False
+
+        logger.debug("Previous refresh of remote refs didn't finish, restarting it")
+        self._refreshing_file.touch()
+        return True
+
+    def refresh_in_background(self) -> None:
+        if not self._start_refreshing():
+            logger.debug("Refresh of remote refs is already running")
+            return
+
+        logger.debug(f"Refreshing remote refs of {self.remote} in background")
+        # output is sorted so the snapshot can be searched by prefix
+        script = (
+            'refs=$(git ls-remote --heads "$1") && printf "%s\\n" "$refs" '
+            '| awk -F "\\t" \'NF == 2 {print $2 " " $1}\' | LC_ALL=C sort > "$2" '
+            '&& mv "$2" "$3"; rm -f "$2" "$4"'
+        )
+        tmp_file = self.cache_file.with_suffix(f".{os.getpid()}")
+        try:
+            subprocess.Popen(
+                ["sh", "-c", script, "sh", self.remote]
+                + [str(tmp_file), str(self.cache_file), str(self._refreshing_file)],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                cwd=self.git.git_root,
+                start_new_session=True,
+            )
+        except OSError as exc:
+            logger.warning(f"Unable to refresh remote refs of {self.remote}: {exc}")
+            self._refreshing_file.unlink(missing_ok=True)
+
+    def invalidate(self) -> None:
+        self.cache_file.unlink(missing_ok=True)
+
+    def _load_refs(self) -> list[str]:
+        age = self._age()
+        if age is None:
+            logger.debug(f"No snapshot of remote refs of {self.remote}, fetching it")
+            if not self.refresh():
+                return []
+        elif age > self.ttl:
+            self.refresh_in_background()
+
+        return self.cache_file.read_text().splitlines()
+
+    def branches(self, prefix: str = "") -> list[str]:
+        """
+        Returns remote branches starting with `prefix`. Lookup is a binary
+        search over the snapshot.
+        """
+        refs = self._load_refs()
+        full_prefix = self._REFS_PREFIX + prefix
+        branches = []
+        for line in refs[bisect_left(refs, full_prefix) :]:
+            if not line.startswith(full_prefix):
+                break
+
+            branches.append(line.split(" ")[0].removeprefix(self._REFS_PREFIX))
+
+        return branches
@@ -5,28 +5,37 @@ repository.
 import logging
 import subprocess
 from abc import ABC, abstractmethod
-from json import dumps
+from concurrent.futures import ThreadPoolExecutor
+from json import dumps, loads
 from os import getcwd
 from pathlib import Path
-from typing import Optional, Iterable
+from typing import Iterator, Optional, Iterable
 from urllib.parse import urlparse
 
 from click import UsageError, ClickException
 import click
+from github import GithubException
 
 from alpa.packit import Packit
 from alpa.constants import (
     ALPA_FEAT_BRANCH,
     ALPA_FEAT_BRANCH_PREFIX,
+    MAIN_BRANCH,
     ORIGIN_NAME,
     UPSTREAM_NAME,
     RequestEnum,
     REQUEST_LABEL,
     DELETE_PACKAGE_REQUEST_TITLE,
     CREATE_PACKAGE_REQUEST_TITLE,
+    FETCH_MAX_AGE,
+    GH_MAX_CONCURRENT_REQUESTS,
+    RequestResultEnum,
 )
+from alpa.fetch import FetchCoordinator
+from alpa.maintenance import RepoMaintenance
 from alpa.gh import GithubAPI, GithubRepo
-from alpa.git import GitCMD
+from alpa.git import GitCMD, GitStatus
+from alpa.worktree import PackageWorktrees
 from alpa.messages import (
     CLONED_REPO_IS_NOT_FORK,
     NOT_IN_PREDEFINED_STATE,
@@ -55,6 +64,7 @@ class LocalRepo(ABC):
         # lazy properties
         self._namespace: Optional[str] = None
         self._repo_name: Optional[str] = None
+        self._fetcher: Optional[FetchCoordinator] = None
 
     @abstractmethod
     def get_packages(self, regex: str = "") -> list[str]:
@@ -83,7 +93,7 @@ class LocalRepo(ABC):
 
     @property
     def branch(self) -> str:
-        return self.git_cmd(["rev-parse", "--abbrev-ref", "HEAD"]).stdout
+        return self.git.current_branch()
 
     @staticmethod
     def get_feat_branch_of_package(package: str) -> str:
@@ -94,106 +104,52 @@ class LocalRepo(ABC):
         return ALPA_FEAT_BRANCH.format(pkgname=self.package)
 
     @staticmethod
-    def _get_relevant_remote_refs(remote_refs: Iterable[str]) -> list[str]:
+    def _get_relevant_remote_ref(remote_ref: str) -> Optional[str]:
+        parsed_ref = remote_ref.split("/")[-1]
+        if parsed_ref.startswith(ALPA_FEAT_BRANCH_PREFIX):
+            return None
+
+        logger.debug(f"Relevant remote ref found: {parsed_ref}")
+        return parsed_ref
+
+    @classmethod
+    def _get_relevant_remote_refs(cls, remote_refs: Iterable[str]) -> list[str]:
         relevant_refs = []
         for ref in remote_refs:
-            parsed_ref = ref.split("/")[-1]
-            if not parsed_ref.startswith(ALPA_FEAT_BRANCH_PREFIX):
-                logger.debug(f"Relevant remote ref found: {parsed_ref}")
+            parsed_ref = cls._get_relevant_remote_ref(ref)
+            if parsed_ref is not None:
                 relevant_refs.append(parsed_ref)
 
         return relevant_refs
 
-    def get_remote_branches(self, remote: str) -> list[str]:
-        lines = [
-            line.strip()
-            for line in self.git_cmd(
-                ["remote", "--verbose", "show", remote]
-            ).stdout.split("\n")
-        ]
-        # TODO: do a better job
-        remote_branch_line = ["Remote branch:", "Remote branches:"]
-        start = -1
-        for line_to_match in remote_branch_line:
-            if line_to_match in lines:
-                start = lines.index(line_to_match)
-                break
-
-        if start == -1:
-            return []
-
-        # TODO: do a better job
-        possible_start_of_local_stuff = [
-            "Local branch configured for 'git pull':",
-            "Local branches configured for 'git pull':",
-            "Local ref configured for 'git push':",
-            "Local refs configured for 'git push':",
-        ]
-        end = -1
-        for line_to_match in possible_start_of_local_stuff:
-            if line_to_match in lines:
-                end = lines.index(line_to_match)
-                break
-
-        if end == -1:
-            end = len(lines)
-
-        lines_with_remote_branches = lines[start + 1 : end]
-        return [line.split()[0] for line in lines_with_remote_branches]
-
     @property
     def remotes(self) -> set[str]:
-        return set(self.git_cmd(["remote"]).stdout.split())
+        return self.git.remotes()
 
     def _is_repo_in_predefined_state(self) -> bool:
-        return self.remotes == {ORIGIN_NAME, UPSTREAM_NAME} or self.remotes == {
-            ORIGIN_NAME
-        }
+        return self.remotes in ({ORIGIN_NAME, UPSTREAM_NAME}, {ORIGIN_NAME})
 
     def _should_be_fork(self) -> bool:
         # if repo is prepared via alpa-cli, fork should have 2 remotes and non-fork 1
         return len(self.remotes) > 1
 
+    def status(self) -> GitStatus:
+        return self.git.status()
+
     @property
     def untracked_files(self) -> list[str]:
-        return self.git_cmd(["ls-files", "-o", "--exclude-standard"]).stdout.split()
-
-    def _get_dirty_files(self, staged: bool) -> list[str]:
-        result = []
-        status_output = self.git_cmd(["status", "--porcelain=1"]).stdout
-        if not status_output:
-            return []
-
-        for line in status_output.split("\n"):
-            if line == "":
-                # some empty line in the output
-                continue
-
-            file = line.split()[-1]
-            if line.startswith("MM"):
-                result.append(file)
-                continue
-
-            if not staged and line.startswith(" M"):
-                result.append(file)
-                continue
-
-            if staged and line.startswith("M "):
-                result.append(file)
-                continue
-
-        return result
+        return self.status().untracked
 
     def is_dirty(self) -> bool:
-        return self.git_cmd(["status", "--porcelain"]).stdout != ""
+        return self.status().is_dirty
 
     @property
     def modified_files(self) -> list[str]:
-        return self._get_dirty_files(False)
+        return self.status().modified
 
     @property
     def files_to_be_committed(self) -> list[str]:
-        return self._get_dirty_files(True)
+        return self.status().staged
 
     @property
     def namespace(self) -> str:
@@ -222,25 +178,32 @@ class LocalRepo(ABC):
         output += "\n".join(files)
         return output + "\n"
 
-    def get_status_output(self) -> str:
-        output = self._format_files_to_status(
-            self.files_to_be_committed, "Files to commit:"
+    def get_status_output(self, status: Optional[GitStatus] = None) -> str:
+        if status is None:
+            status = self.status()
+
+        output = self._format_files_to_status(status.staged, "Files to commit:")
+        output += self._format_files_to_status(status.modified, "Modified files:")
+        output += self._format_files_to_status(
+            status.conflicted, "Files with conflicts:"
         )
-        output += self._format_files_to_status(self.modified_files, "Modified files:")
-        output += self._format_files_to_status(self.untracked_files, "Untracked files:")
+        output += self._format_files_to_status(status.untracked, "Untracked files:")
         return output
 
     def branch_exists(self, branch: str) -> bool:
-        branches = self.git_cmd(["branch"]).stdout.split()
-        for ref in branches:
-            if ref.strip() == branch:
-                return True
+        if self.git.branch_exists(branch):
+            return True
 
-        logger.debug(f"Branch {branch} does not exist in {branches}")
+        logger.debug(f"Branch {branch} does not exist")
         return False
 
+    def iter_history_of_branch(self, branch: str, params: list[str]) -> Iterator[str]:
+        return self.git.git_cmd_stream(
+            ["log", "--decorate", "--graph"] + params + [branch]
+        )
+
     def get_history_of_branch(self, branch: str, params: list[str]) -> str:
-        return self.git_cmd(["log", "--decorate", "--graph"] + params + [branch]).stdout
+        return "\n".join(self.iter_history_of_branch(branch, params)).strip()
 
     def commit(self, message: str) -> bool:
         packit_conf = Packit(self.package)
@@ -272,6 +235,10 @@ class LocalRepo(ABC):
         click.echo(self.git_cmd(["pull", self.remote_name, branch]).stderr_and_stdout)
 
     def push(self, branch: str, force: bool = False) -> None:
+        if self.remote_name == ORIGIN_NAME:
+            # push updates remote-tracking ref of the branch, see was_pushed
+            self.track_remote_branch(branch)
+
         # you always want to push to origin, even from a fork
         cmd = ["push", ORIGIN_NAME, branch]
         if force:
@@ -292,12 +259,11 @@ class LocalRepo(ABC):
         return without_git_suffix.split(":")[-1]
 
     def full_reponame(self) -> str:
-        logger.debug(f"Trying to find {self.remote_name} in {self.remotes}")
-        for remote in self.remotes:
+        remotes = self.remotes
+        logger.debug(f"Trying to find {self.remote_name} in {remotes}")
+        for remote in remotes:
             if remote == self.remote_name:
-                remote_url = self.git_cmd(
-                    ["config", "--get", f"remote.{remote}.url"]
-                ).stdout
+                remote_url = self.git.remote_url(remote)
                 logger.debug(
                     f"Remote {remote} found. Parsing its remote url {remote_url}"
                 )
@@ -310,9 +276,189 @@ class LocalRepo(ABC):
     def git_root(self) -> Path:
         return Path(self.git.git_root)
 
+    @property
+    def is_lazy(self) -> bool:
+        """Cloned by `alpa clone --lazy`, only explicitly fetched branches exist"""
+        return self.git_cmd(["config", "--get", "--bool", "alpa.lazy"]).stdout == "true"
+
+    def _branch_refspec(self, branch: str) -> str:
+        return f"+refs/heads/{branch}:refs/remotes/{self.remote_name}/{branch}"
+
+    @property
+    def fetcher(self) -> FetchCoordinator:
+        if self._fetcher is None:
+            max_age = self.git_cmd(["config", "--get", "alpa.fetchMaxAge"]).stdout
+            depth = self.git_cmd(["config", "--get", "alpa.depth"]).stdout
+            self._fetcher = FetchCoordinator(
+                self.git,
+                self.remote_name,
+                int(max_age) if max_age.isdigit() else FETCH_MAX_AGE,
+                int(depth) if depth.isdigit() else None,
+            )
+
+        return self._fetcher
+
+    def fetch_branches(
+        self, branches: Iterable[str], max_age: Optional[float] = None
+    ) -> dict[str, Optional[bool]]:
+        """
+        Fetches branches unless they were fetched recently and returns whether
+        they exist on the remote, None if the fetch failed.
+        """
+        on_remote = self.fetcher.fetch(branches, max_age)
+        self.maintain_in_background()
+        return on_remote
+
+    def maintain_in_background(self) -> None:
+        """
+        Starts repository maintenance if fetches made it necessary. Disable it
+        by `git config alpa.autoMaintenance false`.
+        """
+        # nothing new to pack when all branches were fetched recently
+        if self._fetcher is None or not self._fetcher.fetched:
+            return
+
+        self._fetcher.fetched = False
+        auto = self.git_cmd(["config", "--get", "--bool", "alpa.autoMaintenance"])
+        if auto.stdout != "false":
+            RepoMaintenance(self.git).run_in_background_if_needed()
+
+    def track_remote_branch(self, branch: str) -> None:
+        """Let lazy clone fetch the branch on every `git fetch` from now on"""
+        if not self.is_lazy:
+            return
+
+        key = f"remote.{self.remote_name}.fetch"
+        refspecs = self.git_cmd(["config", "--get-all", key]).stdout.split("\n")
+        if self._branch_refspec(branch) not in refspecs:
+            self.git_cmd(["config", "--add", key, self._branch_refspec(branch)])
+
+    def untrack_remote_branch(self, branch: str) -> None:
+        if not self.is_lazy:
+            return
+
+        self.git_cmd(
+            [
+                "config",
+                "--unset",
+                "--fixed-value",
+                f"remote.{self.remote_name}.fetch",
+                self._branch_refspec(branch),
+            ]
+        )
+
+    @property
+    def is_shallow(self) -> bool:
+        return self.git_cmd(["rev-parse", "--is-shallow-repository"]).stdout == "true"
+
+    def deepen_history(self, branch: str) -> None:
+        """Fetch full history of the branch if the clone is shallow"""
+        if not self.is_shallow:
+            return
+
+        self.git_cmd(
+            ["fetch", "--unshallow", self.remote_name, self._branch_refspec(branch)]
+        )
+
+    def prune_feature_branches(self, dry_run: bool = False) -> dict[str, str]:
+        """
+        Deletes local feature branches which were merged: they are gone from
+        the remote and either were pushed there before, or all their commits
+        are in the package branch. Returns the deleted branches with commits
+        they pointed to.
+        """
+        pattern = f"refs/heads/{ALPA_FEAT_BRANCH_PREFIX}*"
+        refs = self.git_cmd(
+            ["for-each-ref", "--format=%(refname:lstrip=2) %(objectname)", pattern]
+        ).stdout
+        local = dict(line.split(" ") for line in refs.splitlines())
+        if not local:
+            return {}
+
+        on_remote = self.fetcher.remote_branches(list(local))
+        if on_remote is None:
+            raise ClickException(f"Unable to list branches of {self.remote_name}")
+
+        checked_out = set(
+            PackageWorktrees(self.git, self.remote_name).checked_out_branches()
+        )
+        pushed = self.pushed_branches()
+        merged = {
+            branch: commit
+            for branch, commit in local.items()
+            if branch not in checked_out
+            and self.is_feature_branch_merged(
+                branch,
+                branch.removeprefix(ALPA_FEAT_BRANCH_PREFIX),
+                branch in pushed,
+                branch in on_remote,
+            )
+        }
+        if dry_run or not merged:
+            return merged
+
+        transaction = ""
+        for branch, commit in merged.items():
+            transaction += f"delete refs/heads/{branch} {commit}\n"
+            transaction += f"delete refs/remotes/{self.remote_name}/{branch}\n"
+
+        result = self.git_cmd(["update-ref", "--stdin"], input=transaction)
+        if result.retval != 0:
+            raise ClickException(f"Unable to delete feature branches: {result.stderr}")
+
+        for branch in merged:
+            self.untrack_remote_branch(branch)
+
+        self.fetcher.invalidate(merged)
+        return merged
+
+    def was_pushed(self, branch: str) -> bool:
+        """
+        The branch has an upstream or a remote-tracking ref, i.e. it was on
+        the remote at some point.
+        """
+        upstream = self.git_cmd(["config", "--get", f"branch.{branch}.merge"])
+        return bool(upstream.stdout) or self.fetcher.has_tracking_ref(branch)
+
+    def pushed_branches(self) -> set[str]:
+        """Branches `was_pushed` is true for, found by two git calls in total"""
+        upstreams = self.git_cmd(
+            ["config", "--get-regexp", r"^branch\..*\.merge$"]
+        ).stdout
+        pushed = self.fetcher.tracked_branches()
+        for line in upstreams.splitlines():
+            key, _, _ = line.partition(" ")
+            pushed.add(key.removeprefix("branch.").removesuffix(".merge"))
+
+        return pushed
+
+    def is_feature_branch_merged(
+        self,
+        feat_branch: str,
+        package: str,
+        was_pushed: bool,
+        on_remote: Optional[bool],
+    ) -> bool:
+        """
+        The feature branch is not on the remote and either it was pushed
+        before, or all its commits are in the package branch. Unpushed work
+        and failed fetches never make the branch merged.
+        """
+        if on_remote is not False:
+            return False
+
+        if was_pushed:
+            return True
+
+        package_ref = (
+            package if self.branch_exists(package) else f"{self.remote_name}/{package}"
+        )
+        result = self.git_cmd(["merge-base", "--is-ancestor", feat_branch, package_ref])
+        return result.retval == 0
+
     def is_branch_merged(self, branch: str) -> bool:
-        ret = self.git_cmd(["fetch", self.remote_name, branch])
-        return ret.retval != 0 and "couldn't find remote ref" in ret.stderr
+        """Fetch succeeded and the branch isn't on the remote"""
+        return self.fetch_branches([branch])[branch] is False
 
 
 class AlpaRepo(LocalRepo):
@@ -320,17 +466,32 @@ class AlpaRepo(LocalRepo):
         super().__init__(repo_path)
 
         self.gh_api = gh_api or GithubAPI(self.repo_name)
-        self.gh_repo = self.gh_api.get_repo(self.namespace, self.repo_name)
+        self.gh_repo = self.gh_api.bootstrap(self.namespace, self.repo_name)
 
     @abstractmethod
     def create_package(self, package: str) -> None:
         pass
 
-    def _request_package_action(self, request_type: RequestEnum, pkg: str) -> None:
+    def _issue_repo(self) -> GithubRepo:
         ensured_upstream = self.gh_repo.get_root_repo()
-        upstream_namespace = ensured_upstream.namespace
-        issue_repo = self.gh_api.get_repo(upstream_namespace, self.gh_repo.repo_name)
+        return self.gh_api.get_repo(ensured_upstream.namespace, self.gh_repo.repo_name)
 
+    @staticmethod
+    def _open_requests(issue_repo: GithubRepo) -> set[tuple[RequestEnum, str]]:
+        """Returns (request type, package) of every open request issue"""
+        requests: set[tuple[RequestEnum, str]] = set()
+        for issue in issue_repo.iter_issues("open", [REQUEST_LABEL]):
+            try:
+                body = loads(issue.body or "")
+                requests.add((RequestEnum(body["request_type"]), body["package"]))
+            except (ValueError, TypeError, KeyError):
+                logger.debug(f"Issue #{issue.number} is not an Alpa request")
+
+        return requests
+
+    def _create_request_issue(
+        self, issue_repo: GithubRepo, request_type: RequestEnum, pkg: str
+    ) -> RequestResultEnum:
         if request_type == RequestEnum.delete:
             title = DELETE_PACKAGE_REQUEST_TITLE.format(package_name=pkg)
         else:
@@ -341,26 +502,104 @@ class AlpaRepo(LocalRepo):
             "user": self.gh_api.gh_user,
             "package": pkg,
         }
-        issue = issue_repo.create_issue(title, dumps(body))
-        issue.add_to_labels(REQUEST_LABEL)
+        try:
+            issue_repo.create_issue(title, dumps(body), labels=[REQUEST_LABEL])
+        except GithubException as exc:
+            logger.warning(f"Unable to request {request_type} of {pkg}: {exc}")
+            return RequestResultEnum.failed
+
+        return RequestResultEnum.created
+
+    def request_packages(
+        self, request_type: RequestEnum, packages: Iterable[str]
+    ) -> dict[str, RequestResultEnum]:
+        """
+        Opens request issue for every package unless the same request is
+        already open. Open requests are listed once for the whole batch.
+        """
+        packages = list(dict.fromkeys(packages))
+        issue_repo = self._issue_repo()
+        open_requests = self._open_requests(issue_repo)
+        results = {
+            pkg: RequestResultEnum.duplicate
+            for pkg in packages
+            if (request_type, pkg) in open_requests
+        }
+        missing = [pkg for pkg in packages if pkg not in results]
+        if missing:
+            with ThreadPoolExecutor(
+                max_workers=min(GH_MAX_CONCURRENT_REQUESTS, len(missing))
+            ) as executor:
+                created = executor.map(
+                    lambda pkg: self._create_request_issue(
+                        issue_repo, request_type, pkg
+                    ),
+                    missing,
+                )
+                results.update(zip(missing, created))
 
-    def request_package(self, package_name: str) -> None:
-        self._request_package_action(RequestEnum.create, package_name)
+        return {pkg: results[pkg] for pkg in packages}
 
-    def request_package_delete(self, package: str) -> None:
-        self._request_package_action(RequestEnum.delete, package)
+    def request_package(self, package_name: str) -> RequestResultEnum:
+        return self.request_packages(RequestEnum.create, [package_name])[package_name]
+
+    def request_package_delete(self, package: str) -> RequestResultEnum:
+        return self.request_packages(RequestEnum.delete, [package])[package]
 
     @staticmethod
-    def _prepare_cloned_repo(where_to_clone: str, gh_repo: GithubRepo) -> None:
+    def _clone_repo(
+        url: str, where_to_clone: str, lazy: bool = False, depth: Optional[int] = None
+    ) -> None:
+        cmd = ["git", "clone"]
+        if lazy:
+            # blobless clone of main branch only, packages are fetched on demand
+            cmd += ["--filter=blob:none", "--single-branch", "--branch", MAIN_BRANCH]
+            if depth is not None:
+                cmd += ["--depth", str(depth)]
+
+        process = subprocess.run(cmd + [url, where_to_clone], cwd=getcwd())
+        if process.returncode != 0:
+            raise ClickException(f"Unable to clone {url}")
+
+        RepoMaintenance(GitCMD(where_to_clone)).enable_status_acceleration()
+        if not lazy:
+            return
+
+        subprocess.run(["git", "config", "alpa.lazy", "true"], cwd=where_to_clone)
+        if depth is not None:
+            subprocess.run(
+                ["git", "config", "alpa.depth", str(depth)], cwd=where_to_clone
+            )
+
+    @staticmethod
+    def _prepare_cloned_repo(
+        where_to_clone: str, gh_repo: GithubRepo, lazy: bool = False
+    ) -> None:
         if not gh_repo.is_fork:
             return
 
         upstream_clone_url = gh_repo.upstream_clone_url
         assert upstream_clone_url is not None
+        tracked_branches = ["-t", MAIN_BRANCH] if lazy else []
         subprocess.run(
-            ["git", "remote", "add", UPSTREAM_NAME, upstream_clone_url],
+            [
+                "git",
+                "remote",
+                "add",
+                *tracked_branches,
+                UPSTREAM_NAME,
+                upstream_clone_url,
+            ],
             cwd=where_to_clone,
         )
+        if not lazy:
+            return
+
+        for key, value in [("promisor", "true"), ("partialclonefilter", "blob:none")]:
+            subprocess.run(
+                ["git", "config", f"remote.{UPSTREAM_NAME}.{key}", value],
+                cwd=where_to_clone,
+            )
 
     @staticmethod
     def _get_repo_name_from_url(repo_url: str) -> str:
@@ -382,13 +621,19 @@ class AlpaRepo(LocalRepo):
         return True, ""
 
     @classmethod
-    def clone(cls, url: str, clone_fork: bool) -> None:
+    def clone(
+        cls,
+        url: str,
+        clone_fork: bool,
+        lazy: bool = False,
+        depth: Optional[int] = None,
+    ) -> None:
         # in case of `@` in url -> remove the `git@` prefix form it
         repo_path = urlparse(url.split("@")[-1]).path
         parsed_repo_path = repo_path.strip("/").strip(".git")
         namespace, repo_name = parsed_repo_path.split("/")
         api = GithubAPI(repo_name)
-        gh_repo = api.get_repo(namespace, repo_name)
+        gh_repo = api.bootstrap(namespace, repo_name)
 
         check_result, stderr = cls._check_for_permission_and_fork(clone_fork, gh_repo)
         if not check_result:
@@ -396,5 +641,5 @@ class AlpaRepo(LocalRepo):
 
         cwd = getcwd()
         where_to_clone = f"{cwd}/{cls._get_repo_name_from_url(url)}"
-        subprocess.run(["git", "clone", url, where_to_clone], cwd=cwd)
-        cls._prepare_cloned_repo(where_to_clone, gh_repo)
+        cls._clone_repo(url, where_to_clone, lazy, depth)
+        cls._prepare_cloned_repo(where_to_clone, gh_repo, lazy)
@@ -5,7 +5,7 @@ repository.
 
 from pathlib import Path
 import re
-from typing import Optional
+from typing import Iterator, Optional
 
 from click import ClickException
 import click
@@ -14,9 +14,14 @@ from alpa.packit import Packit
 from alpa.constants import (
     ALPA_FEAT_BRANCH_PREFIX,
     MAIN_BRANCH,
+    MAX_PACKAGE_WORKTREES,
 )
-from alpa.gh import GithubAPI
+from alpa.git import GitStatus
+from alpa.catalogue import PackageCatalogue
 from alpa.messages import NO_WRITE_ACCESS_ERR
+from alpa.remote_refs import RemoteRefsCache, regex_literal_prefix
+from alpa.search import PackageSearchIndex
+from alpa.worktree import PackageWorktrees
 from alpa.repository.base import LocalRepo, AlpaRepo
 
 
@@ -31,53 +36,155 @@ class LocalRepoBranch(LocalRepo):
     def get_history_of_package(self, package: str) -> str:
         raise NotImplementedError("Please implement me!")
 
+    def iter_packages(self, regex: str = "") -> Iterator[str]:
+        pattern = re.compile(regex) if regex else None
+        # only the range of branches sharing literal prefix of regex is matched
+        remote_refs = RemoteRefsCache(self.git, self.remote_name)
+        for ref in remote_refs.branches(regex_literal_prefix(regex)):
+            package = self._get_relevant_remote_ref(ref)
+            if package is None or package == MAIN_BRANCH:
+                continue
+
+            if pattern is None or pattern.match(package):
+                yield package
+
     def get_packages(self, regex: str = "") -> list[str]:
-        refs_without_main = filter(
-            lambda ref: ref != "main", self.get_remote_branches(self.remote_name)
-        )
-        relevant_refs = self._get_relevant_remote_refs(refs_without_main)
+        return list(self.iter_packages(regex))
+
+    def search_packages(self, query: str, limit: int = 20) -> list[str]:
+        search_index = PackageSearchIndex(self.git.alpa_dir)
+        search_index.sync(self.iter_packages())
+        return search_index.search(query, limit)
+
+    def fetch_packages(self) -> None:
+        """
+        Fetches main and every package branch unless fetched recently. Locally
+        tracked packages are fetched too, so refs of deleted ones are removed.
+        """
+        tracked = self.git_cmd(
+            [
+                "for-each-ref",
+                "--format=%(refname:lstrip=3)",
+                f"refs/remotes/{self.remote_name}/",
+            ]
+        ).stdout.split()
+        packages = set(self.iter_packages()) | {
+            branch
+            for branch in tracked
+            if branch not in (MAIN_BRANCH, "HEAD")
+            and not branch.startswith(ALPA_FEAT_BRANCH_PREFIX)
+        }
+        self.fetch_branches([MAIN_BRANCH] + sorted(packages))
+
+    def query_packages(
+        self,
+        regex: str = "",
+        maintainer: Optional[str] = None,
+        target: Optional[str] = None,
+        arch: Optional[str] = None,
+        autoupdate: bool = False,
+    ) -> list[str]:
+        """
+        Filters packages by their metadata using the package catalogue.
+        """
+        self.fetch_packages()
+        catalogue = PackageCatalogue(self.git, self.remote_name)
+        try:
+            catalogue.update()
+            packages = catalogue.query(
+                regex_literal_prefix(regex), maintainer, target, arch, autoupdate
+            )
+        finally:
+            catalogue.close()
 
-        if regex == "":
-            return list(relevant_refs)
+        if not regex:
+            return packages
 
         pattern = re.compile(regex)
-        return [ref for ref in relevant_refs if pattern.match(ref)]
+        return [package for package in packages if pattern.match(package)]
 
     def switch_to_package(self, package: str) -> None:
-        if self.is_dirty():
+        feat_branch = self.get_feat_branch_of_package(package)
+        feat_branch_exists = self.branch_exists(feat_branch)
+
+        branches = [package, feat_branch]
+        stale = self.fetcher.stale_branches(branches)
+        commands = [self.git.STATUS_CMD]
+        if stale:
+            commands.append(self.fetcher.ls_remote_cmd(stale))
+
+        # local status runs while the remote is asked for the branches
+        status_result, *ls_remote = self.git.git_cmds(commands)
+        status = GitStatus.from_porcelain_v2(status_result.stdout)
+        if status.is_dirty:
             click.secho(
                 "Repo is dirty, please commit your changes before switching to"
-                f" another package.\n {self.get_status_output()}",
+                f" another package.\n {self.get_status_output(status)}",
                 fg="red",
                 err=True,
             )
             return None
 
-        feat_branch = self.get_feat_branch_of_package(package)
-        if self.branch_exists(feat_branch) and not self.is_branch_merged(feat_branch):
-            branch_to_switch = feat_branch
-        else:
-            branch_to_switch = package
-            if self.branch_exists(feat_branch):
-                self.git_cmd(["branch", "-D", feat_branch])
-
-        result = self.git_cmd(["switch", branch_to_switch])
-        if result.retval == 0:
-            click.echo(result.stderr_and_stdout.replace("branch", "package"))
+        # fetch removes remote-tracking ref of the deleted feature branch
+        feat_branch_pushed = feat_branch_exists and self.was_pushed(feat_branch)
+        on_remote = self.fetcher.fetch_listed(
+            branches, stale, ls_remote[0] if ls_remote else None
+        )
+        self.maintain_in_background()
+        if feat_branch_exists and self.is_feature_branch_merged(
+            feat_branch, package, feat_branch_pushed, on_remote[feat_branch]
+        ):
+            self.git_cmd(["branch", "-D", feat_branch])
+            self.untrack_remote_branch(feat_branch)
+            feat_branch_exists = False
+
+        branch_to_switch = feat_branch if feat_branch_exists else package
+        if on_remote[branch_to_switch]:
+            self.track_remote_branch(branch_to_switch)
+
+        first_time = not self.branch_exists(branch_to_switch)
+        if first_time and on_remote[branch_to_switch] is None:
+            click.secho(
+                f"Unable to fetch package {package} from {self.remote_name}",
+                fg="red",
+                err=True,
+            )
             return
 
-        process = self.git_cmd(["fetch", self.remote_name, branch_to_switch])
-        if process.retval != 0:
+        if first_time and not on_remote[branch_to_switch]:
             click.secho(f"Package {package} doesn't exist!", fg="red", err=True)
             return
 
-        click.echo(f"Switching to the package {package} for the first time")
+        if first_time:
+            click.echo(f"Switching to the package {package} for the first time")
+
         click.echo(
             self.git_cmd(["switch", branch_to_switch]).stderr_and_stdout.replace(
                 "branch", "package"
             )
         )
 
+    @property
+    def worktrees_enabled(self) -> bool:
+        return self.git_cmd(["config", "--get", "--bool", "alpa.worktrees"]).stdout == (
+            "true"
+        )
+
+    def get_package_worktree(self, package: str) -> Optional[Path]:
+        """
+        Returns persistent worktree of the package, its feature branch is
+        preferred. Returns None if the package doesn't exist.
+        """
+        max_worktrees = self.git_cmd(["config", "--get", "alpa.maxWorktrees"]).stdout
+        worktrees = PackageWorktrees(
+            self.git,
+            self.remote_name,
+            int(max_worktrees) if max_worktrees.isdigit() else MAX_PACKAGE_WORKTREES,
+        )
+        return worktrees.get(
+            package, [self.get_feat_branch_of_package(package), package]
+        )
+
     def _ensure_feature_branch(self) -> None:
         if self.branch != self.package:
             return None
@@ -94,11 +201,12 @@ class LocalRepoBranch(LocalRepo):
         return True
 
     def _rebase_needed(self) -> bool:
-        self.git_cmd(["fetch", self.remote_name])
-        last_package_commit = self.git_cmd(["rev-parse", self.branch]).stdout
-        last_remote_main_commit = self.git_cmd(
-            ["rev-parse", f"{self.remote_name}/{MAIN_BRANCH}"]
-        ).stdout
+        # always compare with current main, even if it was fetched recently
+        self.fetch_branches([MAIN_BRANCH], max_age=0)
+        last_package_commit = self.git.rev_parse(self.branch)
+        last_remote_main_commit = self.git.rev_parse(
+            f"{self.remote_name}/{MAIN_BRANCH}"
+        )
         return (
             last_package_commit != last_remote_main_commit
             and self.git_cmd(
@@ -127,12 +235,6 @@ class LocalRepoBranch(LocalRepo):
 
 
 class AlpaRepoBranch(AlpaRepo, LocalRepoBranch):
-    def __init__(self, repo_path: Path, gh_api: Optional[GithubAPI] = None) -> None:
-        super().__init__(repo_path, gh_api)
-
-        self.gh_api = gh_api or GithubAPI(self.repo_name)
-        self.gh_repo = self.gh_api.get_repo(self.namespace, self.repo_name)
-
     def create_package(self, package: str) -> None:
         upstream = self.gh_repo.get_upstream()
         if upstream and not upstream.has_write_access(self.gh_api.gh_user):
@@ -140,5 +242,14 @@ class AlpaRepoBranch(AlpaRepo, LocalRepoBranch):
 
         self.git_cmd(["switch", MAIN_BRANCH])
         self.git_cmd(["switch", "-c", package])
-        self.git_cmd(["push", self.remote_name, package])
+        result = self.git_cmd(["push", self.remote_name, package])
+        if result.retval != 0:
+            # write access may have been revoked since it was cached
+            if upstream:
+                upstream.forget_permission(self.gh_api.gh_user)
+
+            self.gh_repo.forget_permission(self.gh_api.gh_user)
+            raise ClickException(f"Unable to create package {package}: {result.stderr}")
+
+        RemoteRefsCache(self.git, self.remote_name).invalidate()
         click.echo(f"Package {package} created")
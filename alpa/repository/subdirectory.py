@@ -6,6 +6,7 @@ Classes for communication with Alpa subdirectory type of git
 from pathlib import Path
 from typing import Optional
 
+from alpa.constants import RequestResultEnum
 from alpa.gh import GithubAPI
 
 from alpa.repository.base import LocalRepo, AlpaRepo
@@ -44,7 +45,7 @@ class AlpaRepoSubdirectory(AlpaRepo, LocalRepoSubdirectory):
     def create_package(self, package: str) -> None:
         raise NotImplementedError("Please implement me.")
 
-    def request_package_delete(self, package_name: str) -> None:
+    def request_package_delete(self, package_name: str) -> RequestResultEnum:
         raise NotImplementedError("Please implement me.")
 
     def delete_package(self, package: str) -> bool:
@@ -0,0 +1,228 @@
+"""
+Fuzzy and substring search over package names.
+"""
+import heapq
+import json
+import logging
+import math
+from collections import Counter
+from itertools import accumulate
+from pathlib import Path
+from typing import Iterable, Iterator, Mapping
+
+from alpa.state_file import write_atomically
+
+
+logger = logging.getLogger(__name__)
+
+
+class _CompactPostings(Mapping[str, set[str]]):
+    """
+    Posting lists as gap encoded positions in the sorted list of names. Each
+    list is decoded on the first lookup of its trigram.
+    """
+
+    def __init__(self, names: list[str], encoded: dict[str, str]) -> None:
+        self._names = names
+        self._encoded = encoded
+        self._decoded: dict[str, set[str]] = {}
+
+    @staticmethod
+    def encode(positions: list[int]) -> str:
+        return " ".join(
+            str(position - previous)
+            for previous, position in zip([0] + positions, positions)
+        )
+
+    def __getitem__(self, trigram: str) -> set[str]:
+        postings = self._decoded.get(trigram)
+        if postings is None:
+            gaps = map(int, self._encoded[trigram].split())
+            postings = {self._names[position] for position in accumulate(gaps)}
+            self._decoded[trigram] = postings
+
+        return postings
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._encoded)
+
+    def __len__(self) -> int:
+        return len(self._encoded)
+
+
+class TrigramIndex:
+    """
+    Inverted index from trigrams of lowercased names to the names. Search ranks
+    names by trigram similarity with bonus for substring and prefix matches.
+    """
+
+    # similarity under which non-substring matches are considered noise
+    MIN_SIMILARITY = 0.2
+
+    def __init__(self, names: Iterable[str] = ()) -> None:
+        self._postings: Mapping[str, set[str]] = {}
+        self._sizes: dict[str, int] = {}
+        for name in names:
+            self.add(name)
+
+    @staticmethod
+    def trigrams(text: str) -> set[str]:
+        # padding makes start of the name significant
+        padded = f"  {text.lower()} "
+        return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+    @property
+    def names(self) -> set[str]:
+        return set(self._sizes)
+
+    def _mutable_postings(self) -> dict[str, set[str]]:
+        if not isinstance(self._postings, dict):
+            # compact posting lists are all decoded before the first change
+            self._postings = {
+                trigram: set(names) for trigram, names in self._postings.items()
+            }
+
+        return self._postings
+
+    def add(self, name: str) -> None:
+        if name in self._sizes:
+            return
+
+        name_trigrams = self.trigrams(name)
+        self._sizes[name] = len(name_trigrams)
+        postings = self._mutable_postings()
+        for trigram in name_trigrams:
+            postings.setdefault(trigram, set()).add(name)
+
+    def remove(self, name: str) -> None:
+        if self._sizes.pop(name, None) is None:
+            return
+
+        postings = self._mutable_postings()
+        for trigram in self.trigrams(name):
+            postings[trigram].discard(name)
+            if not postings[trigram]:
+                del postings[trigram]
+
+    def update(self, names: Iterable[str]) -> bool:
+        """
+        Makes the index contain exactly `names`. Returns True if it changed.
+        """
+        new_names = set(names)
+        old_names = self.names
+        for name in old_names - new_names:
+            self.remove(name)
+
+        for name in new_names - old_names:
+            self.add(name)
+
+        return new_names != old_names
+
+    def _score(self, query: str, name: str, shared: int, query_size: int) -> float:
+        score = shared / (query_size + self._sizes[name] - shared)
+        lower_name = name.lower()
+        if query in lower_name:
+            score += 1
+            if lower_name.startswith(query):
+                score += 1
+
+        return score
+
+    def _min_shared_trigrams(self, query: str, query_size: int) -> int:
+        if len(query) < 3:
+            return 0
+
+        # similarity is at most shared / query_size and a substring match shares
+        # all trigrams of the query except the 3 padded ones
+        return min(math.ceil(self.MIN_SIMILARITY * query_size), query_size - 3)
+
+    def search(self, query: str, limit: int = 20) -> list[str]:
+        query = query.lower()
+        query_trigrams = self.trigrams(query)
+        shared_trigrams: Counter = Counter()
+        for trigram in query_trigrams:
+            shared_trigrams.update(self._postings.get(trigram, ()))
+
+        if len(query) < 3:
+            # too short for trigrams in the middle of names
+            for name in self._sizes:
+                if query in name.lower():
+                    shared_trigrams.setdefault(name, 0)
+
+        min_shared = self._min_shared_trigrams(query, len(query_trigrams))
+        scored = []
+        for name, shared in shared_trigrams.items():
+            if shared < min_shared:
+                continue
+
+            score = self._score(query, name, shared, len(query_trigrams))
+            if score >= self.MIN_SIMILARITY:
+                scored.append((score, name))
+
+        best = heapq.nsmallest(limit, scored, key=lambda item: (-item[0], item[1]))
+        return [name for _, name in best]
+
+    def to_dict(self) -> dict:
+        names = sorted(self._sizes)
+        positions = {name: position for position, name in enumerate(names)}
+        return {
+            "names": names,
+            "sizes": [self._sizes[name] for name in names],
+            "postings": {
+                trigram: _CompactPostings.encode(
+                    sorted(positions[name] for name in trigram_names)
+                )
+                for trigram, trigram_names in sorted(self._postings.items())
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "TrigramIndex":
+        index = cls()
+        index._sizes = dict(zip(d["names"], d["sizes"]))
+        index._postings = _CompactPostings(d["names"], d["postings"])
+        return index
+
+
+class PackageSearchIndex:
+    """
+    Trigram index of package names persisted in the git directory and kept
+    in sync with the list of packages. The file is rewritten only when the
+    packages change, a search decodes only posting lists of the query.
+    """
+
+    FILE_NAME = "search-index.json"
+    _FORMAT_VERSION = 2
+
+    def __init__(self, alpa_dir: Path) -> None:
+        self.index_file = alpa_dir / self.FILE_NAME
+        self.index = self._load()
+
+    def _load(self) -> TrigramIndex:
+        try:
+            content = json.loads(self.index_file.read_text())
+            if content.get("version") == self._FORMAT_VERSION:
+                return TrigramIndex.from_dict(content["index"])
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError) as exc:
+            logger.warning(f"Broken package search index, rebuilding it: {exc}")
+
+        return TrigramIndex()
+
+    def _save(self) -> None:
+        write_atomically(
+            self.index_file,
+            json.dumps(
+                {"version": self._FORMAT_VERSION, "index": self.index.to_dict()},
+                separators=(",", ":"),
+            ),
+        )
+
+    def sync(self, packages: Iterable[str]) -> None:
+        if self.index.update(packages):
+            logger.debug("Package search index changed, saving it")
+            self._save()
+
+    def search(self, query: str, limit: int = 20) -> list[str]:
+        return self.index.search(query, limit)
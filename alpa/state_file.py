@@ -0,0 +1,51 @@
+"""
+State files Alpa keeps between its runs. Several processes may use them at
+once, so they are always replaced as a whole and never written in place.
+"""
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any
+
+
+logger = logging.getLogger(__name__)
+
+
+def write_atomically(path: Path, content: str, mode: int = 0o666) -> None:
+    """
+    Replaces the file by one with `content` and permissions `mode` (minus
+    umask). The temporary file is unique per process and thread.
+    """
+    tmp_file = path.with_name(f"{path.name}.{os.getpid()}-{threading.get_ident()}")
+    fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    try:
+        with os.fdopen(fd, "w") as tmp:
+            tmp.write(content)
+
+        tmp_file.replace(path)
+    except BaseException:
+        tmp_file.unlink(missing_ok=True)
+        raise
+
+
+def load_json_state(path: Path, description: str) -> dict[str, Any]:
+    """Returns the state stored in the file, empty if it's missing or broken"""
+    try:
+        state = json.loads(path.read_text())
+    except FileNotFoundError:
+        return {}
+    except ValueError as exc:
+        logger.warning(f"Broken {description}, resetting it: {exc}")
+        return {}
+
+    if not isinstance(state, dict):
+        logger.warning(f"Broken {description}, resetting it: not a JSON object")
+        return {}
+
+    return state
+
+
+def save_json_state(path: Path, state: dict[str, Any], mode: int = 0o666) -> None:
+    write_atomically(path, json.dumps(state), mode)
@@ -8,11 +8,12 @@ from pathlib import Path
 from typing import Optional
 
 import click
-import requests
 from alpa.config import MetadataConfig
 from click import ClickException
 from specfile import Specfile
 
+from alpa.constants import HTTP_DOWNLOAD_CHUNK_SIZE, HTTP_TIMEOUT
+from alpa.http_sessions import http_sessions
 from alpa.repository.branch import LocalRepoBranch
 
 
@@ -85,15 +86,20 @@ class UpstreamIntegration(LocalRepoBranch):
 
     @staticmethod
     def download_upstream_source(upstream_source_url: str, name_version: str) -> None:
-        resp = requests.get(upstream_source_url, allow_redirects=True)
-        if not resp.ok:
-            raise ConnectionError(
-                f"Couldn't download source from {upstream_source_url}. "
-                f"Reason: {resp.reason}"
-            )
-
-        with open(f"{name_version}.tar.gz", "wb") as archive:
-            archive.write(resp.content)
+        session = http_sessions.session()
+        with session.get(
+            upstream_source_url, allow_redirects=True, stream=True, timeout=HTTP_TIMEOUT
+        ) as resp:
+            if not resp.ok:
+                raise ConnectionError(
+                    f"Couldn't download source from {upstream_source_url}. "
+                    f"Reason: {resp.reason}"
+                )
+
+            # don't hold whole archive in memory
+            with open(f"{name_version}.tar.gz", "wb") as archive:
+                for chunk in resp.iter_content(chunk_size=HTTP_DOWNLOAD_CHUNK_SIZE):
+                    archive.write(chunk)
 
     def mockbuild(self, chroots: list[str]) -> None:
         with self.specfile.sources() as sources:
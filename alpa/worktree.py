@@ -0,0 +1,126 @@
+"""
+Persistent worktree per package, so switching between packages doesn't
+rewrite the working tree and isn't blocked by uncommitted changes.
+"""
+import logging
+import time
+from pathlib import Path
+from typing import Optional
+
+from alpa.constants import MAX_PACKAGE_WORKTREES
+from alpa.git import GitCMD
+from alpa.state_file import load_json_state, save_json_state
+
+
+logger = logging.getLogger(__name__)
+
+
+class PackageWorktrees:
+    """
+    Worktrees of packages created lazily in `<git common dir>/alpa/worktrees`.
+    When there are more than `max_worktrees` of them, the least recently used
+    clean ones are removed.
+    """
+
+    STATE_FILE_NAME = "worktrees.json"
+
+    def __init__(
+        self, git: GitCMD, remote: str, max_worktrees: int = MAX_PACKAGE_WORKTREES
+    ) -> None:
+        self.git = git
+        self.remote = remote
+        self.max_worktrees = max_worktrees
+        self.root = git.alpa_dir / "worktrees"
+        self._state_file = git.alpa_dir / self.STATE_FILE_NAME
+
+    def _load_last_used(self) -> dict[str, float]:
+        return load_json_state(self._state_file, "worktree state file")
+
+    def _save_last_used(self, last_used: dict[str, float]) -> None:
+        save_json_state(self._state_file, last_used)
+
+    def checked_out_branches(self) -> dict[str, Path]:
+        """
+        Returns branches checked out in any worktree of the repository.
+        """
+        branches = {}
+        worktree: Optional[Path] = None
+        output = self.git.git_cmd(["worktree", "list", "--porcelain"]).stdout
+        for line in output.splitlines():
+            if line.startswith("worktree "):
+                worktree = Path(line.removeprefix("worktree "))
+            elif line.startswith("branch refs/heads/") and worktree is not None:
+                branches[line.removeprefix("branch refs/heads/")] = worktree
+
+        return branches
+
+    def _is_dirty(self, worktree: Path) -> bool:
+        status = self.git.git_cmd(["status", "--porcelain"], cwd=str(worktree))
+        return status.retval != 0 or status.stdout != ""
+
+    def _create(self, package: str, branch: str) -> Optional[Path]:
+        worktree = self.root / package
+        if self.git.branch_exists(branch):
+            cmd = ["worktree", "add", str(worktree), branch]
+        else:
+            fetch = self.git.git_cmd(
+                ["fetch", self.remote, f"+{branch}:refs/remotes/{self.remote}/{branch}"]
+            )
+            if fetch.retval != 0:
+                logger.debug(f"Unable to fetch {branch}: {fetch.stderr}")
+                return None
+
+            cmd = ["worktree", "add", "--track", "-b", branch, str(worktree)]
+            cmd.append(f"{self.remote}/{branch}")
+
+        result = self.git.git_cmd(cmd)
+        if result.retval != 0:
+            logger.debug(f"Unable to create worktree of {package}: {result.stderr}")
+            return None
+
+        return worktree
+
+    def get(self, package: str, branches: list[str]) -> Optional[Path]:
+        """
+        Returns worktree with the first of `branches` which exists, creating it
+        if needed. Returns None if the package doesn't exist.
+        """
+        checked_out = self.checked_out_branches()
+        worktree = None
+        for branch in branches:
+            if branch in checked_out:
+                worktree = checked_out[branch]
+                break
+
+        if worktree is None:
+            branch = next(filter(self.git.branch_exists, branches), branches[-1])
+            worktree = self._create(package, branch)
+            if worktree is None:
+                return None
+
+        last_used = self._load_last_used()
+        last_used[package] = time.time()
+        self._save_last_used(self._evict(last_used, keep=package))
+        return worktree
+
+    def _evict(self, last_used: dict[str, float], keep: str) -> dict[str, float]:
+        managed = {
+            package: used
+            for package, used in last_used.items()
+            if (self.root / package).is_dir()
+        }
+        to_evict = len(managed) - self.max_worktrees
+        for package in sorted(managed, key=managed.__getitem__):
+            if to_evict <= 0:
+                break
+
+            worktree = self.root / package
+            if package == keep or self._is_dirty(worktree):
+                continue
+
+            logger.debug(f"Evicting idle worktree of package {package}")
+            self.git.git_cmd(["worktree", "remove", str(worktree)])
+            del managed[package]
+            to_evict -= 1
+
+        return managed
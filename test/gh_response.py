@@ -0,0 +1,18 @@
+"""
+Responses of GitHub API for tests faking the session of a connection.
+"""
+from typing import Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+def gh_response(
+    status: int, body: str = "", headers: Optional[dict[str, str]] = None
+) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response.encoding = "utf-8"
+    response.headers = CaseInsensitiveDict(headers or {})
+    response._content = body.encode()
+    return response
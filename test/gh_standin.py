@@ -0,0 +1,247 @@
+"""
+Local stand-in of GitHub REST and GraphQL API for offline tests and benchmarks.
+Point Alpa at it by `ALPA_GH_API_URL`. It replays interactions from a fixture
+file, or records them while passing requests to real GitHub:
+
+    python -m test.gh_standin --record fixture.json
+    python -m test.gh_standin fixture.json
+"""
+import argparse
+import json
+import threading
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Mapping, Optional
+
+import requests
+
+
+GITHUB_API_URL = "https://api.github.com"
+# recorded URLs point to the stand-in serving them
+BASE_URL_PLACEHOLDER = "{base_url}"
+# headers of the recorded connection, not of the response
+_CONNECTION_HEADERS = {
+    "connection",
+    "content-encoding",
+    "content-length",
+    "date",
+    "keep-alive",
+    "server",
+    "transfer-encoding",
+}
+
+
+@dataclass
+class Interaction:
+    method: str
+    path: str
+    status: int
+    body: str = ""
+    headers: dict[str, str] = field(default_factory=dict)
+    # JSON of the request, None matches any request body
+    request_body: Any = None
+
+    def matches(self, method: str, path: str, request_body: Any) -> bool:
+        return (
+            self.method == method
+            and self.path == path
+            and (self.request_body is None or self.request_body == request_body)
+        )
+
+
+class GithubStandIn:
+    """
+    Serves recorded interactions in their order. The last matching interaction
+    is served again once all of them were used. Requests carrying ETag of the
+    response get `304 Not Modified` like from GitHub.
+    """
+
+    def __init__(
+        self,
+        interactions: Optional[list[Interaction]] = None,
+        record_from: Optional[str] = None,
+    ) -> None:
+        self.interactions = interactions or []
+        self.record_from = record_from
+        # (method, path) of every request in order of arrival
+        self.requests: list[tuple[str, str]] = []
+        self.unmatched: list[tuple[str, str]] = []
+
+        self._lock = threading.Lock()
+        self._served: set[int] = set()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    @classmethod
+    def from_file(cls, path: Path) -> "GithubStandIn":
+        interactions = json.loads(Path(path).read_text())
+        return cls([Interaction(**interaction) for interaction in interactions])
+
+    def save(self, path: Path) -> None:
+        interactions = [asdict(interaction) for interaction in self.interactions]
+        Path(path).write_text(json.dumps(interactions, indent=2) + "\n")
+
+    def start(self) -> "GithubStandIn":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "GithubStandIn":
+        return self.start()
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
+
+    def _handler_class(self) -> type[BaseHTTPRequestHandler]:
+        standin = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                raw_body = self.rfile.read(length).decode() if length else ""
+                interaction = standin.serve(
+                    self.command, self.path, raw_body, self.headers
+                )
+                body = interaction.body.replace(BASE_URL_PLACEHOLDER, standin.url)
+                self.send_response(interaction.status)
+                for name, value in interaction.headers.items():
+                    self.send_header(
+                        name, value.replace(BASE_URL_PLACEHOLDER, standin.url)
+                    )
+
+                self.send_header("Content-Length", str(len(body.encode())))
+                self.end_headers()
+                self.wfile.write(body.encode())
+
+            do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = _handle
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        return _Handler
+
+    def serve(
+        self, method: str, path: str, raw_body: str, headers: Mapping[str, str]
+    ) -> Interaction:
+        try:
+            request_body = json.loads(raw_body) if raw_body else None
+        except ValueError:
+            request_body = raw_body
+
+        with self._lock:
+            self.requests.append((method, path))
+
+        if self.record_from is not None:
+            return self._record(method, path, raw_body, request_body, headers)
+
+        interaction = self._find(method, path, request_body)
+        if interaction is None:
+            with self._lock:
+                self.unmatched.append((method, path))
+
+            return Interaction(
+                method, path, 501, json.dumps({"message": "No recorded interaction"})
+            )
+
+        etag = interaction.headers.get("ETag")
+        if etag is not None and headers.get("If-None-Match") == etag:
+            return Interaction(method, path, 304, headers={"ETag": etag})
+
+        return interaction
+
+    def _find(self, method: str, path: str, request_body: Any) -> Optional[Interaction]:
+        with self._lock:
+            last = None
+            for index, interaction in enumerate(self.interactions):
+                if not interaction.matches(method, path, request_body):
+                    continue
+
+                if index not in self._served:
+                    self._served.add(index)
+                    return interaction
+
+                last = interaction
+
+            return last
+
+    def _record(
+        self,
+        method: str,
+        path: str,
+        raw_body: str,
+        request_body: Any,
+        headers: Mapping[str, str],
+    ) -> Interaction:
+        assert self.record_from is not None
+        forwarded = {
+            name: value
+            for name, value in headers.items()
+            if name.lower() not in ("host", "accept-encoding", "content-length")
+            and not name.lower().startswith("if-")
+        }
+        response = requests.request(
+            method,
+            f"{self.record_from}{path}",
+            headers=forwarded,
+            data=raw_body.encode() or None,
+            allow_redirects=False,
+        )
+        interaction = Interaction(
+            method=method,
+            path=path,
+            status=response.status_code,
+            body=response.text.replace(self.record_from, BASE_URL_PLACEHOLDER),
+            headers={
+                name: value.replace(self.record_from, BASE_URL_PLACEHOLDER)
+                for name, value in response.headers.items()
+                if name.lower() not in _CONNECTION_HEADERS
+            },
+            request_body=request_body,
+        )
+        with self._lock:
+            self.interactions.append(interaction)
+            self._served.add(len(self.interactions) - 1)
+
+        return interaction
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("fixture", type=Path)
+    parser.add_argument(
+        "--record",
+        action="store_true",
+        help="pass requests to GitHub and save interactions to the fixture",
+    )
+    args = parser.parse_args()
+
+    if args.record:
+        standin = GithubStandIn(record_from=GITHUB_API_URL)
+    else:
+        standin = GithubStandIn.from_file(args.fixture)
+
+    with standin:
+        print(f"export ALPA_GH_API_URL={standin.url}", flush=True)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+    if args.record:
+        standin.save(args.fixture)
+
+
+if __name__ == "__main__":
+    main()
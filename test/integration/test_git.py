@@ -0,0 +1,201 @@
+from pathlib import Path
+
+import pytest
+
+from alpa.git import GitCMD, GitRefReader, GitStatus
+from test.fake_alpa_repo import FakeAlpaRepo
+
+
+PORCELAIN_V2_OUTPUT = "\0".join(
+    [
+        "# branch.oid 0123456789abcdef0123456789abcdef01234567",
+        "# branch.head pkg",
+        "# branch.upstream origin/pkg",
+        "# branch.ab +2 -1",
+        "1 M. N... 100644 100644 100644 aaaa bbbb staged file",
+        "1 .M N... 100644 100644 100644 aaaa aaaa modified file",
+        "1 MM N... 100644 100644 100644 aaaa bbbb both",
+        "2 R. N... 100644 100644 100644 aaaa aaaa R100 new name",
+        "old name",
+        "u UU N... 100644 100644 100644 100644 aaaa bbbb cccc conflict",
+        "? untracked file",
+        "",
+    ]
+)
+
+
+class Test:
+    def test_status_from_porcelain_v2(self):
+        status = GitStatus.from_porcelain_v2(PORCELAIN_V2_OUTPUT)
+        assert status.branch == "pkg"
+        assert status.upstream == "origin/pkg"
+        assert (status.ahead, status.behind) == (2, 1)
+        assert status.staged == ["staged file", "both", "new name"]
+        assert status.modified == ["modified file", "both"]
+        assert status.conflicted == ["conflict"]
+        assert status.untracked == ["untracked file"]
+        assert status.is_dirty
+
+    def test_clean_status(self):
+        status = GitStatus.from_porcelain_v2("# branch.oid abc\0# branch.head main\0")
+        assert status.branch == "main"
+        assert not status.is_dirty
+
+
+class TestGitRefReader(FakeAlpaRepo):
+    def _reader(self):
+        reader = GitRefReader.from_work_tree(self.local_git_root)
+        assert reader is not None
+        return reader
+
+    def test_head(self):
+        assert self._reader().head() == "main"
+
+        self.git_cmd(["switch", "-c", "some/branch"])
+        assert self._reader().head() == "some/branch"
+
+        self.git_cmd(["switch", "--detach"])
+        assert self._reader().head() == "HEAD"
+
+    @pytest.mark.parametrize("packed", [False, True])
+    def test_resolve_ref(self, packed):
+        branches = [f"pkg-{i:03}" for i in range(50)]
+        for branch in branches:
+            self.git_cmd(["branch", branch])
+
+        self.git_cmd(["tag", "-a", "v1", "-m", "annotated tag"])
+        if packed:
+            self.git_cmd(["pack-refs", "--all"])
+
+        reader = self._reader()
+        for branch in branches + ["main"]:
+            expected = self.git_cmd(["rev-parse", f"refs/heads/{branch}"]).strip()
+            assert reader.resolve_ref(f"refs/heads/{branch}") == expected
+            assert reader.rev_parse(branch) == expected
+
+        assert (
+            reader.rev_parse("origin/main")
+            == self.git_cmd(["rev-parse", "origin/main"]).strip()
+        )
+        assert reader.resolve_ref("refs/heads/pkg-0") is None
+        assert reader.ref_exists("refs/heads/pkg-999") is False
+        assert reader.ref_exists("refs/tags/v1")
+
+    def test_rev_parse_ignores_other_git_files(self):
+        reader = self._reader()
+        head = self.git_cmd(["rev-parse", "HEAD"]).strip()
+        assert reader.rev_parse("HEAD") == head
+        assert reader.rev_parse("refs/heads/main") == head
+
+        # files in git dir which aren't refs
+        for name in ["config", "description"]:
+            assert reader.rev_parse(name) is None
+
+        self.git_cmd(["branch", "config"])
+        assert reader.rev_parse("config") == head
+
+        # FETCH_HEAD has its own format, git has to parse it
+        (reader.git_dir / "FETCH_HEAD").write_text(f"{head}\t\tbranch 'main'\n")
+        assert reader.rev_parse("FETCH_HEAD") is None
+
+    def test_remotes(self):
+        self.git_cmd(["remote", "add", "upstream", "git@example.org:ns/repo.git"])
+        with open(f"{self.local_git_root}/.git/config", "a") as f:
+            f.write('[remote "quoted"]\n\turl = "https://example.org/a b.git" # c\n')
+
+        remotes = self._reader().remotes()
+        assert remotes is not None
+        assert set(remotes) == {"origin", "upstream", "quoted"}
+        assert remotes["upstream"] == ["git@example.org:ns/repo.git"]
+        assert remotes["quoted"] == ["https://example.org/a b.git"]
+
+    def test_fallback_to_git_cmd(self):
+        with open(f"{self.local_git_root}/.git/config", "a") as f:
+            f.write("[include]\n\tpath = other.config\n")
+
+        assert self._reader().remotes() is None
+        assert GitCMD(self.local_git_root).remotes() == {"origin"}
+
+
+class TestGitCMDCache(FakeAlpaRepo):
+    def test_read_only_commands_are_cached(self):
+        git = GitCMD(self.local_git_root)
+        hits = git.cache_info.hits
+
+        first = git.git_cmd(["rev-parse", "HEAD"])
+        assert git.git_cmd(["rev-parse", "HEAD"]) is first
+        assert git.cache_info.hits == hits + 1
+
+        git.git_cmd(["status", "--porcelain"])
+        git.git_cmd(["status", "--porcelain"])
+        assert git.cache_info.hits == hits + 1
+        assert git.git_cmd(["rev-parse", "HEAD"]) is first
+
+    def test_mutating_command_invalidates_cache(self):
+        git = GitCMD(self.local_git_root)
+        before = git.git_cmd(["rev-parse", "HEAD"]).stdout
+
+        git.git_cmd(["commit", "--allow-empty", "-m", "empty commit"])
+        assert git.cache_info.size == 0
+        assert git.git_cmd(["rev-parse", "HEAD"]).stdout != before
+
+    def test_uncached_command(self):
+        git = GitCMD(self.local_git_root)
+        before = git.git_cmd(["rev-parse", "HEAD"])
+
+        # another process changes the repository
+        self.git_cmd(["commit", "--allow-empty", "-m", "empty commit"])
+        assert git.git_cmd(["rev-parse", "HEAD"]) is before
+        after = git.git_cmd(["rev-parse", "HEAD"], use_cache=False)
+        assert after.stdout != before.stdout
+        assert git.git_cmd(["rev-parse", "HEAD"]) is before
+
+    @pytest.mark.parametrize(
+        "arguments, cacheable",
+        [
+            pytest.param(["remote"], True),
+            pytest.param(["remote", "--verbose", "show", "origin"], False),
+            pytest.param(["config", "--get", "remote.origin.url"], True),
+            pytest.param(["config", "alpa.key", "value"], False),
+            pytest.param(["branch"], True),
+            pytest.param(["branch", "-D", "some-branch"], False),
+            pytest.param(["status"], False),
+        ],
+    )
+    def test_is_cacheable(self, arguments, cacheable):
+        assert GitCMD._is_cacheable(arguments) == cacheable
+
+    def test_concurrent_git_cmds(self):
+        git = GitCMD(self.local_git_root)
+        commands = [["rev-parse", "HEAD"], ["status", "--porcelain"], ["remote"]]
+        results = git.git_cmds(commands)
+
+        assert [result.stdout for result in results] == [
+            git.git_cmd(command).stdout for command in commands
+        ]
+
+    def test_git_cmd_stream(self):
+        for i in range(5):
+            self.git_cmd(["commit", "--allow-empty", "-m", f"commit {i}"])
+
+        git = GitCMD(self.local_git_root)
+        lines = list(git.git_cmd_stream(["log", "--oneline"]))
+        assert lines == git.git_cmd(["log", "--oneline"]).stdout.split("\n")
+
+        stream = git.git_cmd_stream(["log", "--oneline"])
+        assert next(stream) == lines[0]
+        stream.close()
+
+    def test_status(self):
+        Path(f"{self.local_git_root}/dir").mkdir()
+        for file in ["file with spaces", "staged", "dir/nested"]:
+            with open(f"{self.local_git_root}/{file}", "w") as f:
+                f.write("content")
+
+        self.git_cmd(["add", "staged"])
+        status = GitCMD(self.local_git_root).status()
+
+        assert status.branch == "main"
+        assert status.upstream == "origin/main"
+        assert status.staged == ["staged"]
+        assert status.untracked == ["dir/nested", "file with spaces"]
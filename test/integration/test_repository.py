@@ -1,11 +1,25 @@
+import os
+import time
 from pathlib import Path
 from unittest.mock import patch, PropertyMock
 
 import pytest
+from click import ClickException
 
+from alpa.catalogue import PackageCatalogue
+from alpa.cli.local_repo import _complete_package_name
 from alpa.constants import ALPA_FEAT_BRANCH_PREFIX
-from alpa.repository.base import LocalRepo
+from alpa.fetch import FetchCoordinator
+from alpa.foreach import PackageForeach
+from alpa.maintenance import ObjectStats, RepoMaintenance
+from alpa.remote_refs import RemoteRefsCache
+from alpa.worktree import PackageWorktrees
+from alpa.repository.base import AlpaRepo, LocalRepo
 from alpa.repository.branch import LocalRepoBranch
+from test.constants import (
+    METADATA_CONFIG_ALL_KEYS,
+    METADATA_CONFIG_MANDATORY_ONLY_KEYS,
+)
 from test.fake_alpa_repo import FakeAlpaBranchRepo, FakeAlpaRepo
 
 
@@ -50,7 +64,8 @@ class TestBaseRepo(FakeAlpaRepo):
         self.git_cmd(["switch", "-c", branch])
         assert self.local_repo.feat_branch == "__feat_test-branch"
 
-    def test_get_remote_branches(self):
+    def test_remote_branches(self):
+        remote_refs = RemoteRefsCache(self.local_repo.git, "origin")
         result = ["main"]
         for branch in ["branch1", "branch2", "branch3"]:
             result.append(branch)
@@ -61,9 +76,8 @@ class TestBaseRepo(FakeAlpaRepo):
             self.git_cmd(["add", "file"])
             self.git_cmd(["commit", "-m", "commit some change"])
             self.git_cmd(["push", "origin", branch])
-            assert sorted(self.local_repo.get_remote_branches("origin")) == sorted(
-                result
-            )
+            remote_refs.invalidate()
+            assert sorted(remote_refs.branches()) == sorted(result)
 
     def test_remotes(self):
         assert self.local_repo.remotes == {"origin"}
@@ -135,6 +149,160 @@ class TestBranchRepo(FakeAlpaBranchRepo):
             LocalRepoBranch(Path(self.local_git_root)).get_packages()
         )
 
+    def test_get_packages_with_pattern(self):
+        self.setup_package("hele-extra")
+        self.git_cmd(["switch", "-c", "__feat_hele"])
+        self.git_cmd(["push", "origin", "__feat_hele"])
+
+        local_repo = LocalRepoBranch(Path(self.local_git_root))
+        assert local_repo.get_packages("hele") == ["hele", "hele-extra"]
+        assert local_repo.get_packages("^h.*a$") == ["hele-extra"]
+        assert local_repo.get_packages(".*ka") == ["pikachu"]
+
+    def test_get_packages_from_stale_cache(self):
+        cache_file = Path(self.local_git_root) / ".git" / "alpa" / "remote-refs-origin"
+        assert set(self.local_repo.get_packages()) == set(self.packages)
+        assert cache_file.is_file()
+
+        self.setup_package("new-package")
+        # fresh snapshot is used as is
+        assert "new-package" not in self.local_repo.get_packages()
+
+        cache_file.unlink()
+        assert "new-package" in self.local_repo.get_packages()
+
+    def test_remote_refs_background_refresh(self):
+        remote_refs = RemoteRefsCache(self.local_repo.git, "origin")
+        assert "new-package" not in remote_refs.branches()
+
+        self.setup_package("new-package")
+        os.utime(remote_refs.cache_file, (0, 0))
+        # stale snapshot is served while it is refreshed
+        assert "new-package" not in remote_refs.branches()
+        for _ in range(50):
+            if "new-package" in remote_refs.branches():
+                break
+
+            time.sleep(0.1)
+
+        assert remote_refs.branches("new") == ["new-package"]
+
+    def test_remote_refs_refresh_runs_once(self):
+        remote_refs = RemoteRefsCache(self.local_repo.git, "origin")
+        remote_refs.refresh()
+        os.utime(remote_refs.cache_file, (0, 0))
+        with patch("alpa.remote_refs.subprocess.Popen") as popen:
+            remote_refs.branches()
+            remote_refs.branches()
+
+        popen.assert_called_once()
+        assert remote_refs._refreshing_file.exists()
+
+        # marker of the refresh which never ran is too old
+        os.utime(remote_refs._refreshing_file, (0, 0))
+        remote_refs.refresh_in_background()
+        for _ in range(50):
+            if not remote_refs._refreshing_file.exists():
+                break
+
+            time.sleep(0.1)
+
+        assert not remote_refs._refreshing_file.exists()
+        assert remote_refs._age() < remote_refs.ttl
+
+    def test_query_packages(self):
+        assert self.local_repo.query_packages(maintainer="naruto") == sorted(
+            self.packages
+        )
+        assert self.local_repo.query_packages(
+            "p", target="fedora-37", arch="x86_64"
+        ) == ["pikachu"]
+        assert self.local_repo.query_packages(arch="s390x") == []
+        assert self.local_repo.query_packages(autoupdate=True) == []
+
+        self.git_cmd(["switch", "hele"])
+        with open(f"{self.local_git_root}/metadata.yaml", "w") as f:
+            f.write(METADATA_CONFIG_ALL_KEYS)
+
+        self.git_cmd(["commit", "-am", "enable autoupdate"])
+        self.git_cmd(["push", "origin", "hele"])
+        assert self.local_repo.query_packages(autoupdate=True) == ["hele"]
+        assert self.local_repo.query_packages(arch="s390x") == ["hele"]
+
+    def test_catalogue_is_updated_incrementally(self):
+        self.git_cmd(["fetch", "origin"])
+        catalogue = PackageCatalogue(self.local_repo.git, "origin")
+        assert catalogue.update() == len(self.packages)
+        assert catalogue.update() == 0
+
+        self.setup_package("new-package")
+        self.local_repo.git_cmd(["fetch", "origin"])
+        assert catalogue.update() == 1
+        assert "new-package" in catalogue.query(maintainer="narutothebest@konoha.jp")
+
+    def test_catalogue_with_malformed_metadata(self):
+        self.git_cmd(["switch", "hele"])
+        with open(f"{self.local_git_root}/metadata.yaml", "w") as f:
+            f.write("- not\n- a mapping\n")
+
+        self.git_cmd(["commit", "-am", "break metadata"])
+        self.git_cmd(["switch", "je"])
+        with open(f"{self.local_git_root}/metadata.yaml", "w") as f:
+            f.write("maintainers: [naruto]\ntargets: fedora-rawhide\n")
+
+        self.git_cmd(["commit", "-am", "unusual metadata"])
+        self.git_cmd(["push", "origin", "hele", "je"])
+        self.git_cmd(["fetch", "origin"])
+
+        catalogue = PackageCatalogue(self.local_repo.git, "origin")
+        assert catalogue.update() == len(self.packages)
+        assert "hele" in catalogue.query()
+        assert catalogue.query(target="fedora-rawhide") == ["je"]
+        assert catalogue.query(target="f") == []
+
+    def test_search_packages(self):
+        assert self.local_repo.search_packages("pika") == ["pikachu"]
+
+        self.setup_package("pikachu-extra")
+        RemoteRefsCache(self.local_repo.git, "origin").invalidate()
+        assert self.local_repo.search_packages("pikachu") == [
+            "pikachu",
+            "pikachu-extra",
+        ]
+
+    def test_complete_package_name(self, monkeypatch):
+        self.setup_package("pikachu-extra")
+        self.setup_package("raichu")
+        RemoteRefsCache(self.local_repo.git, "origin").invalidate()
+        monkeypatch.chdir(self.local_git_root)
+
+        assert _complete_package_name(None, None, "pika") == [
+            "pikachu",
+            "pikachu-extra",
+        ]
+        assert _complete_package_name(None, None, "ichu") == []
+        assert "raichu" in _complete_package_name(None, None, "")
+
+    def test_read_first_blob(self):
+        pkg = self.packages[1]
+        self.git_cmd(["switch", self.packages[0]])
+        git = self.local_repo.git
+        metadata = git.read_first_blob(
+            f"origin/{pkg}", ["metadata.yml", "metadata.yaml"]
+        )
+        assert metadata == METADATA_CONFIG_MANDATORY_ONLY_KEYS
+
+        spec = git.read_first_blob(f"origin/{pkg}", [f"{pkg}.spec"])
+        assert "Name:           test-package" in spec
+        assert git.read_first_blob(f"origin/{pkg}", [".packit.yaml"]) is None
+        assert git.read_first_blob("origin/missing", ["metadata.yaml"]) is None
+        assert self.local_repo.branch == self.packages[0]
+
+    def test_object_exists(self):
+        assert self.local_repo.git.object_exists(f"origin/{self.packages[0]}")
+        assert self.local_repo.git.object_exists("main:.alpa.yaml")
+        assert not self.local_repo.git.object_exists("main:metadata.yaml")
+
     def test_switch_to_package(self):
         pkg = self.packages[0]
         pkg_to_switch = self.packages[1]
@@ -142,6 +310,18 @@ class TestBranchRepo(FakeAlpaBranchRepo):
         self.local_repo.switch_to_package(pkg_to_switch)
         assert self.local_repo.package == self.local_repo.branch == pkg_to_switch
 
+    def test_switch_lists_remote_with_status(self):
+        pkg_to_switch = self.packages[1]
+        self.git_cmd(["switch", self.packages[0]])
+        git = self.local_repo.git
+        with patch.object(git, "git_cmds", wraps=git.git_cmds) as git_cmds:
+            self.local_repo.switch_to_package(pkg_to_switch)
+
+        (commands,), _ = git_cmds.call_args
+        assert commands[0] == git.STATUS_CMD
+        assert commands[1][0] == "ls-remote"
+        assert self.local_repo.branch == pkg_to_switch
+
     def test_switch_to_non_existing_package(self):
         pkg = self.packages[0]
         self.git_cmd(["switch", pkg])
@@ -173,6 +353,188 @@ class TestBranchRepo(FakeAlpaBranchRepo):
         self.local_repo.switch_to_package(pkg_to_switch)
         assert self.local_repo.package == self.local_repo.branch == pkg_to_switch
 
+    def test_clone_failure(self):
+        missing = f"file://{self.other_local_git_root}/missing"
+        with pytest.raises(ClickException):
+            AlpaRepo._clone_repo(missing, f"{self.other_local_git_root}/clone")
+
+    def test_switch_to_package_in_lazy_clone(self):
+        self.git_cmd(["config", "uploadpack.allowFilter", "true"], self._bare_repo.name)
+        lazy_root = f"{self.other_local_git_root}/lazy"
+        AlpaRepo._clone_repo(f"file://{self._bare_repo.name}", lazy_root, True, 1)
+        lazy_repo = LocalRepoBranch(Path(lazy_root))
+        assert lazy_repo.is_lazy
+        assert lazy_repo.branch == "main"
+        assert not self.git_cmd(["branch", "--remotes"], lazy_root).count("je")
+
+        lazy_repo.switch_to_package("je")
+        assert lazy_repo.branch == "je"
+        assert lazy_repo.is_shallow
+        fetch_refspecs = self.git_cmd(
+            ["config", "--get-all", "remote.origin.fetch"], lazy_root
+        ).split()
+        assert "+refs/heads/je:refs/remotes/origin/je" in fetch_refspecs
+
+        lazy_repo.deepen_history("je")
+        assert not lazy_repo.is_shallow
+        assert "Add package je" in lazy_repo.get_history_of_branch("je", [])
+
+    def test_fetch_branches(self):
+        fetcher = FetchCoordinator(self.local_repo.git, "origin")
+        assert fetcher.fetch(["je", "non-existing"]) == {
+            "je": True,
+            "non-existing": False,
+        }
+
+        self.git_cmd(["switch", "je"], self.other_local_git_root)
+        self.git_cmd(
+            ["commit", "--allow-empty", "-m", "new"], self.other_local_git_root
+        )
+        self.git_cmd(["push", "origin", "je"], self.other_local_git_root)
+        remote_je = self.git_cmd(["rev-parse", "je"], self.other_local_git_root)
+
+        # fetched recently, remote isn't contacted again
+        fetcher.fetch(["je"])
+        assert self.git_cmd(["rev-parse", "origin/je"]) != remote_je
+
+        fetcher.fetch(["je"], max_age=0)
+        assert self.git_cmd(["rev-parse", "origin/je"]) == remote_je
+
+        self.git_cmd(["push", "origin", "--delete", "je"], self.other_local_git_root)
+        assert fetcher.fetch(["je"], max_age=0) == {"je": False}
+        assert not fetcher.has_tracking_ref("je")
+        assert self.local_repo.is_branch_merged("je")
+
+    def test_maintenance_only_after_fetch(self):
+        with patch.object(RepoMaintenance, "run_in_background_if_needed") as run:
+            self.local_repo.fetch_branches(["je"], max_age=0)
+            assert run.call_count == 1
+
+            # fetched recently, there is nothing new to maintain
+            self.local_repo.fetch_branches(["je"])
+            self.local_repo.maintain_in_background()
+            assert run.call_count == 1
+
+    def test_fetch_only_requested_branches(self):
+        self.git_cmd(["push", "origin", "hele:hele-devel"], self.other_local_git_root)
+        self.git_cmd(["update-ref", "-d", "refs/remotes/origin/hele-devel"])
+
+        fetcher = FetchCoordinator(self.local_repo.git, "origin")
+        assert fetcher.fetch(["hele"], max_age=0) == {"hele": True}
+        assert not fetcher.has_tracking_ref("hele-devel")
+
+    def test_fetch_from_unreachable_remote(self):
+        self.git_cmd(["remote", "set-url", "origin", "/nonexistent/repo"])
+        fetcher = FetchCoordinator(self.local_repo.git, "origin")
+        assert fetcher.fetch(["je", "non-existing"], max_age=0) == {
+            "je": None,
+            "non-existing": None,
+        }
+        assert fetcher.has_tracking_ref("je")
+        assert not self.local_repo.is_branch_merged("je")
+
+    def test_switch_keeps_unpushed_feature_branch(self):
+        pkg, pkg_to_switch = self.packages[0], self.packages[1]
+        self.git_cmd(["switch", pkg_to_switch])
+        self.local_repo._ensure_feature_branch()
+        self.git_cmd(["commit", "--allow-empty", "-m", "work in progress"])
+        self.git_cmd(["switch", pkg])
+
+        # offline and online, local commits of unpushed branch are kept
+        remote_url = self.git_cmd(["remote", "get-url", "origin"])
+        for url in ["/nonexistent/repo", remote_url]:
+            self.git_cmd(["remote", "set-url", "origin", url])
+            self.local_repo.fetcher.invalidate()
+            self.local_repo.switch_to_package(pkg_to_switch)
+            assert self.local_repo.branch == self.local_repo.feat_branch
+            self.git_cmd(["switch", pkg])
+
+    def test_prune_feature_branches(self):
+        for package in self.packages:
+            self.git_cmd(["switch", package])
+            self.local_repo._ensure_feature_branch()
+            self.git_cmd(["push", "origin", f"{ALPA_FEAT_BRANCH_PREFIX}{package}"])
+
+        # merged feature branch of je is deleted on remote
+        self.git_cmd(["push", "origin", "--delete", f"{ALPA_FEAT_BRANCH_PREFIX}je"])
+        # feature branch of pikachu is checked out
+        self.git_cmd(
+            ["push", "origin", "--delete", f"{ALPA_FEAT_BRANCH_PREFIX}pikachu"]
+        )
+
+        assert list(self.local_repo.prune_feature_branches(dry_run=True)) == [
+            f"{ALPA_FEAT_BRANCH_PREFIX}je"
+        ]
+        assert self.local_repo.branch_exists(f"{ALPA_FEAT_BRANCH_PREFIX}je")
+
+        assert list(self.local_repo.prune_feature_branches()) == [
+            f"{ALPA_FEAT_BRANCH_PREFIX}je"
+        ]
+        assert not self.local_repo.branch_exists(f"{ALPA_FEAT_BRANCH_PREFIX}je")
+        assert self.local_repo.branch_exists(f"{ALPA_FEAT_BRANCH_PREFIX}hele")
+        assert self.local_repo.prune_feature_branches() == {}
+
+    def test_prune_keeps_unpushed_work(self):
+        feat_hele = f"{ALPA_FEAT_BRANCH_PREFIX}hele"
+        feat_je = f"{ALPA_FEAT_BRANCH_PREFIX}je"
+        for package in ["hele", "je"]:
+            self.git_cmd(["switch", package])
+            self.local_repo._ensure_feature_branch()
+            self.git_cmd(["commit", "--allow-empty", "-m", f"update {package}"])
+
+        # hele was pushed and then merged with squash, je was never pushed
+        self.git_cmd(["push", "origin", feat_hele])
+        self.git_cmd(["switch", "main"])
+        self.git_cmd(
+            ["push", "origin", "--delete", feat_hele], self.other_local_git_root
+        )
+
+        assert list(self.local_repo.prune_feature_branches()) == [feat_hele]
+        assert self.local_repo.branch_exists(feat_je)
+
+        self.git_cmd(["remote", "set-url", "origin", "/nonexistent/repo"])
+        with pytest.raises(ClickException):
+            self.local_repo.prune_feature_branches()
+
+    def test_maintenance(self):
+        maintenance = RepoMaintenance(self.local_repo.git)
+        stats = maintenance.stats()
+        assert stats.loose > 0
+        assert maintenance.needed_tasks(stats) == []
+        assert maintenance.needed_tasks(ObjectStats(5000, 0, 50)) == [
+            "loose-objects",
+            "incremental-repack",
+            "commit-graph",
+        ]
+
+        assert maintenance.all_tasks(stats) == ["loose-objects", "commit-graph"]
+        assert maintenance.run(maintenance.all_tasks(stats))
+        packed = maintenance.stats()
+        assert packed.packs > stats.packs
+        assert maintenance._has_commit_graph()
+        assert "incremental-repack" in maintenance.all_tasks(packed)
+        assert maintenance.run(maintenance.all_tasks(packed))
+        assert set(maintenance.time_hot_queries("je")) == {
+            "rev-parse",
+            "merge-base --is-ancestor",
+            "log --graph",
+        }
+
+    def test_status_acceleration(self):
+        maintenance = RepoMaintenance(self.local_repo.git)
+        assert not maintenance.status_acceleration().untracked_cache
+
+        acceleration = maintenance.enable_status_acceleration()
+        assert acceleration.untracked_cache
+        assert (acceleration.fsmonitor is None) != maintenance.fsmonitor_supported()
+        if acceleration.fsmonitor:
+            self.git_cmd(["fsmonitor--daemon", "stop"])
+
+        with open(f"{self.local_git_root}/untracked", "w") as f:
+            f.write("content")
+
+        assert self.local_repo.untracked_files == ["untracked"]
+
     def test_ensure_feature_branch(self):
         self.local_repo._ensure_feature_branch()
         assert self.local_repo.branch.startswith(ALPA_FEAT_BRANCH_PREFIX)
@@ -201,3 +563,52 @@ class TestBranchRepo(FakeAlpaBranchRepo):
 
         self.git_cmd(["switch", pkg])
         assert self.local_repo._rebase_needed()
+
+    def test_foreach(self):
+        results = PackageForeach(self.local_repo.git, "origin", 2).run(
+            self.packages,
+            ["sh", "-c", 'test -f "$ALPA_PACKAGE.spec" && test "$ALPA_PACKAGE" != je'],
+        )
+
+        assert {result.package: result.succeeded for result in results} == {
+            "je": False,
+            "hele": True,
+            "pikachu": True,
+        }
+        assert len(self.git_cmd(["worktree", "list"]).splitlines()) == 1
+
+    def test_foreach_in_lazy_clone(self):
+        self.git_cmd(["config", "uploadpack.allowFilter", "true"], self._bare_repo.name)
+        lazy_root = f"{self.other_local_git_root}/lazy"
+        AlpaRepo._clone_repo(f"file://{self._bare_repo.name}", lazy_root, True, 1)
+        lazy_repo = LocalRepoBranch(Path(lazy_root))
+
+        results = PackageForeach(lazy_repo.git, "origin", 2, lazy_repo.fetcher).run(
+            self.packages, ["sh", "-c", 'test -f "$ALPA_PACKAGE.spec"']
+        )
+        assert all(result.succeeded for result in results)
+        # fetched packages are not fetched again by the next command
+        assert set(lazy_repo.fetch_branches(self.packages).values()) == {True}
+
+    def test_package_worktrees(self):
+        self.git_cmd(["switch", "main"])
+        worktrees = PackageWorktrees(self.local_repo.git, "origin", max_worktrees=1)
+        je = worktrees.get("je", ["__feat_je", "je"])
+        assert je == worktrees.root / "je"
+        assert (je / "je.spec").is_file()
+        with open(je / "je.spec", "a") as f:
+            f.write("uncommitted change")
+
+        hele = worktrees.get("hele", ["__feat_hele", "hele"])
+        # dirty worktree is never evicted
+        assert je.is_dir() and hele.is_dir()
+        assert worktrees.get("hele", ["__feat_hele", "hele"]) == hele
+
+        self.git_cmd(["checkout", "je.spec"], str(je))
+        worktrees.get("pikachu", ["__feat_pikachu", "pikachu"])
+        assert not je.is_dir() and not hele.is_dir()
+        assert worktrees.get("non-existing", ["non-existing"]) is None
+
+    def test_package_worktree_of_checked_out_branch(self):
+        self.git_cmd(["switch", "je"])
+        assert self.local_repo.get_package_worktree("je") == Path(self.local_git_root)
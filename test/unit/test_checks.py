@@ -0,0 +1,158 @@
+import json
+
+import pytest
+
+from alpa.checks import CheckResult, ChecksWatcher, PullRequestChecks
+from alpa.constants import CheckStateEnum
+from alpa.gh import GithubAPI
+from alpa.gh_stats import api_stats
+from test.gh_standin import GithubStandIn, Interaction
+
+
+def _check_run(name, status="COMPLETED", conclusion="SUCCESS"):
+    return {
+        "__typename": "CheckRun",
+        "name": name,
+        "status": status,
+        "conclusion": conclusion,
+        "detailsUrl": f"https://copr/{name}",
+    }
+
+
+def _status(context, state):
+    return {
+        "__typename": "StatusContext",
+        "context": context,
+        "state": state,
+        "targetUrl": None,
+    }
+
+
+def _pull_request(number, head_repo, contexts):
+    return {
+        "number": number,
+        "url": f"https://github.com/alpa-team/repo/pull/{number}",
+        "headRefOid": "abc123",
+        "headRepository": {"nameWithOwner": head_repo},
+        "commits": {
+            "nodes": [
+                {
+                    "commit": {
+                        "statusCheckRollup": {
+                            "contexts": {"totalCount": len(contexts), "nodes": contexts}
+                        }
+                    }
+                }
+            ]
+        },
+    }
+
+
+def _graphql(*pull_requests):
+    data = {"repository": {"pullRequests": {"nodes": list(pull_requests)}}}
+    return Interaction("POST", "/graphql", 200, json.dumps({"data": data}))
+
+
+def _rest(path, body, etag):
+    return Interaction("GET", path, 200, json.dumps(body), headers={"ETag": etag})
+
+
+@pytest.mark.parametrize(
+    "contexts, state",
+    [
+        ([], CheckStateEnum.pending),
+        ([_check_run("copr"), _status("packit", "SUCCESS")], CheckStateEnum.success),
+        ([_check_run("copr", conclusion="SKIPPED")], CheckStateEnum.success),
+        (
+            [_check_run("copr", status="IN_PROGRESS", conclusion=None)],
+            CheckStateEnum.pending,
+        ),
+        (
+            [_check_run("copr", conclusion="TIMED_OUT"), _status("packit", "PENDING")],
+            CheckStateEnum.failure,
+        ),
+        ([_status("packit", "ERROR")], CheckStateEnum.failure),
+    ],
+)
+def test_state(contexts, state):
+    checks = PullRequestChecks.from_graphql(_pull_request(1, "user/repo", contexts))
+    assert checks.state == state
+    assert [check.name for check in checks.checks] == [
+        CheckResult.from_graphql(context).name for context in contexts
+    ]
+
+
+class TestChecksWatcher:
+    @pytest.fixture
+    def watcher(self, tmp_path, monkeypatch):
+        def make(interactions):
+            standin = GithubStandIn(interactions).start()
+            monkeypatch.setenv("ALPA_GH_API_URL", standin.url)
+            api = GithubAPI("repo", gh_token="token")
+            watcher = ChecksWatcher(
+                api,
+                api.get_repo("alpa-team", "repo"),
+                api.get_repo("user", "repo"),
+                head="__feat_je",
+                base="je",
+                sleep=sleeps.append,
+            )
+            standins.append(standin)
+            return watcher
+
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+        api_stats.reset()
+        sleeps: list[float] = []
+        standins: list[GithubStandIn] = []
+        make.sleeps = sleeps
+        yield make
+
+        for standin in standins:
+            standin.stop()
+
+        api_stats.reset()
+
+    def test_pr_of_own_fork(self, watcher):
+        checks = watcher(
+            [
+                _graphql(
+                    _pull_request(2, "other/repo", [_status("packit", "ERROR")]),
+                    _pull_request(1, "User/Repo", [_check_run("copr")]),
+                )
+            ]
+        ).fetch()
+
+        assert checks.number == 1
+        assert checks.state == CheckStateEnum.success
+
+    def test_no_pr(self, watcher):
+        changes = []
+        assert watcher([_graphql()]).watch(changes.append) is None
+        assert changes == [None]
+
+    def test_watch_polls_until_finished(self, watcher):
+        check_runs = "/repos/alpa-team/repo/commits/abc123/check-runs?per_page=100"
+        running = [_check_run("copr", status="IN_PROGRESS", conclusion=None)]
+        interactions = [
+            _graphql(_pull_request(1, "user/repo", running)),
+            _graphql(_pull_request(1, "user/repo", [_check_run("copr")])),
+            _rest("/repos/alpa-team/repo/pulls/1", {"number": 1}, '"pr"'),
+            _rest(check_runs, {"check_runs": ["running"]}, '"running"'),
+            _rest(check_runs, {"check_runs": ["running"]}, '"running"'),
+            _rest(check_runs, {"check_runs": ["done"]}, '"done"'),
+            _rest(
+                "/repos/alpa-team/repo/commits/abc123/status", {"statuses": []}, '"st"'
+            ),
+        ]
+        changes = []
+        checks = watcher(interactions).watch(changes.append)
+
+        assert checks.state == CheckStateEnum.success
+        assert [change.state for change in changes] == [
+            CheckStateEnum.pending,
+            CheckStateEnum.success,
+        ]
+        assert watcher.sleeps == [10, 15]
+        assert api_stats.endpoints["POST /graphql"].calls == 2
+        # polls with unchanged responses didn't cost any rate limit
+        assert api_stats.total().not_modified == 5
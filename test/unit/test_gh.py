@@ -0,0 +1,236 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from github import RateLimitExceededException
+
+from alpa.gh import GithubAPI, RateLimitScheduler, ScheduledHTTPSConnection
+from test.gh_response import gh_response
+
+
+class TestGithubAPI:
+    @pytest.fixture
+    def gh_api(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+        with patch("alpa.gh.Github", MagicMock()):
+            yield GithubAPI("repo", gh_token="token")
+
+    def test_repo_is_fetched_lazily_once(self, gh_api):
+        gh_repo = gh_api.get_repo("Alpa-Team", "Repo")
+        assert gh_api.get_repo("alpa-team", "repo") is gh_repo
+        gh_api.client.get_repo.assert_not_called()
+
+        repo = gh_api.client.get_repo.return_value
+        repo.get_collaborator_permission.return_value = "write"
+        gh_repo.is_fork
+        gh_repo.clone_url
+        gh_api.client.get_repo.assert_called_once_with("Alpa-Team/Repo")
+
+    def test_upstream_comes_from_fork(self, gh_api):
+        source = gh_api.client.get_repo.return_value.source
+        source.full_name = "alpa-team/repo"
+
+        fork = gh_api.get_repo("user", "repo")
+        upstream = fork.get_upstream()
+        assert upstream is fork.get_root_repo()
+        assert upstream is gh_api.get_repo("alpa-team", "repo")
+        assert upstream._repo is source
+        gh_api.client.get_repo.assert_called_once_with("user/repo")
+
+    def test_user_is_memoized(self, gh_api):
+        assert gh_api.gh_user == gh_api.get_repo("ns", "repo").api_user
+        gh_api.client.get_user.assert_called_once()
+
+    def test_bootstrap(self, gh_api):
+        repo = {
+            "nameWithOwner": "user/repo",
+            "isFork": True,
+            "sshUrl": "git@github.com:user/repo.git",
+            "url": "https://github.com/user/repo",
+            "viewerPermission": "ADMIN",
+        }
+        parent = {
+            "nameWithOwner": "alpa-team/repo",
+            "isFork": False,
+            "sshUrl": "git@github.com:alpa-team/repo.git",
+            "url": "https://github.com/alpa-team/repo",
+            "viewerPermission": "READ",
+        }
+        gh_api.client.requester.graphql_query.return_value = (
+            {},
+            {
+                "data": {
+                    "viewer": {"login": "user"},
+                    "repository": {**repo, "parent": parent},
+                }
+            },
+        )
+
+        fork = gh_api.bootstrap("user", "repo")
+        assert gh_api.bootstrap("user", "repo") is fork
+        assert fork.is_fork and fork.api_user == "user"
+        assert fork.clone_url == "git@github.com:user/repo.git"
+        upstream = fork.get_upstream()
+        assert upstream is gh_api.get_repo("alpa-team", "repo")
+        assert not upstream.has_write_access("user")
+        assert fork.upstream_clone_url == "https://github.com/alpa-team/repo.git"
+
+        gh_api.client.requester.graphql_query.assert_called_once()
+        gh_api.client.get_repo.assert_not_called()
+        gh_api.client.get_user.assert_not_called()
+
+    def test_bootstrap_fork_of_fork(self, gh_api):
+        def repository(full_name, is_fork):
+            return {
+                "nameWithOwner": full_name,
+                "isFork": is_fork,
+                "sshUrl": f"git@github.com:{full_name}.git",
+                "url": f"https://github.com/{full_name}",
+                "viewerPermission": "READ",
+            }
+
+        gh_api.client.requester.graphql_query.return_value = (
+            {},
+            {
+                "data": {
+                    "viewer": {"login": "user"},
+                    "repository": {
+                        **repository("user/repo", True),
+                        "parent": repository("other/repo", True),
+                    },
+                }
+            },
+        )
+        gh_api.client.get_repo.return_value.source.full_name = "alpa-team/repo"
+
+        fork = gh_api.bootstrap("user", "repo")
+        # the same root of the fork network as without the bootstrap
+        assert fork.get_root_repo() is gh_api.get_repo("alpa-team", "repo")
+
+
+class TestRateLimitScheduler:
+    def test_pacing(self):
+        scheduler = RateLimitScheduler()
+        assert scheduler.delay() == 0
+
+        reset = str(time.time() + 100)
+        headers = {"X-RateLimit-Limit": "5000", "X-RateLimit-Reset": reset}
+        scheduler.update(200, {**headers, "X-RateLimit-Remaining": "1000"}, "")
+        assert scheduler.delay() == 0
+
+        scheduler.update(200, {**headers, "X-RateLimit-Remaining": "10"}, "")
+        assert 9 < scheduler.delay() <= 10
+        assert scheduler.budgets["core"].remaining == 9
+
+    def test_budgets_of_resources(self):
+        scheduler = RateLimitScheduler()
+        reset = str(time.time() + 100)
+        scheduler.update(
+            200,
+            {
+                "X-RateLimit-Limit": "5000",
+                "X-RateLimit-Remaining": "0",
+                "X-RateLimit-Reset": reset,
+                "X-RateLimit-Resource": "graphql",
+            },
+            "",
+        )
+        assert scheduler.delay("core") == 0
+        assert 99 < scheduler.delay("graphql") <= 100
+
+    @pytest.mark.parametrize(
+        "url, resource",
+        [
+            pytest.param("/graphql", "graphql"),
+            pytest.param("/api/graphql", "graphql"),
+            pytest.param("/search/issues?q=repo", "search"),
+            pytest.param("/api/v3/search/code?q=x", "code_search"),
+            pytest.param("/repos/alpa-team/search/issues", "core"),
+        ],
+    )
+    def test_resource(self, url, resource):
+        assert RateLimitScheduler.resource(url) == resource
+
+    def test_too_long_wait_fails(self, monkeypatch):
+        sleep = MagicMock()
+        monkeypatch.setattr("alpa.gh.time.sleep", sleep)
+        scheduler = RateLimitScheduler()
+        scheduler.update(
+            200,
+            {
+                "X-RateLimit-Limit": "5000",
+                "X-RateLimit-Remaining": "0",
+                "X-RateLimit-Reset": str(time.time() + 3600),
+            },
+            "",
+        )
+        with pytest.raises(RateLimitExceededException):
+            scheduler.wait()
+
+        sleep.assert_not_called()
+
+    @pytest.mark.parametrize(
+        "headers, body, retry_after",
+        [
+            pytest.param({"Retry-After": "30"}, "", 30),
+            pytest.param({}, "You have exceeded a secondary rate limit", 60),
+            pytest.param({}, "Resource not accessible by integration", 0),
+        ],
+    )
+    def test_rate_limit_hit(self, headers, body, retry_after):
+        scheduler = RateLimitScheduler()
+        assert scheduler.update(403, headers, body) == retry_after
+        if retry_after:
+            assert retry_after - 1 < scheduler.delay() <= retry_after
+
+
+class TestScheduledHTTPSConnection:
+    @pytest.fixture
+    def connection(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+        monkeypatch.setattr(ScheduledHTTPSConnection, "_schedulers", {})
+        monkeypatch.setattr("alpa.gh.time.sleep", MagicMock())
+        connection = ScheduledHTTPSConnection("api.github.com")
+        connection.session = MagicMock()
+        return connection
+
+    def test_retry_after_rate_limit(self, connection):
+        connection.session.get.side_effect = [
+            gh_response(429, "", {"Retry-After": "5"}),
+            gh_response(200, "{}"),
+        ]
+        connection.request("GET", "/user", None, {})
+        assert connection.getresponse().status == 200
+        assert connection.session.get.call_count == 2
+
+    def test_identical_requests_in_flight_are_coalesced(self, connection):
+        sent = threading.Event()
+        release = threading.Event()
+
+        def slow_get(*args, **kwargs):
+            sent.set()
+            release.wait(5)
+            return gh_response(200, '{"login": "user"}')
+
+        connection.session.get.side_effect = slow_get
+        follower = ScheduledHTTPSConnection("api.github.com")
+        follower.session = connection.session
+        responses = []
+
+        def get(conn):
+            conn.request("GET", "/user", None, {})
+            responses.append(conn.getresponse())
+
+        leader_thread = threading.Thread(target=get, args=(connection,))
+        leader_thread.start()
+        sent.wait(5)
+        follower_thread = threading.Thread(target=get, args=(follower,))
+        follower_thread.start()
+        time.sleep(0.1)
+        release.set()
+        leader_thread.join(5)
+        follower_thread.join(5)
+
+        assert connection.session.get.call_count == 1
+        assert responses[0] is responses[1]
@@ -0,0 +1,157 @@
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+from github import GithubException
+
+from alpa.gh import GithubRepo
+from alpa.gh_cache import (
+    CachedResponse,
+    GITHUB_SESSION,
+    CachingHTTPSConnection,
+    PermissionCache,
+    ResponseCache,
+)
+from alpa.http_sessions import http_sessions
+from test.gh_response import gh_response
+
+
+class TestPermissionCache:
+    def test_get_and_set(self, tmp_path):
+        cache = PermissionCache(tmp_path)
+        assert cache.get("Alpa-Team/Repo", "user") is None
+
+        cache.set("Alpa-Team/Repo", "User", "write")
+        assert cache.get("alpa-team/repo", "user") == "write"
+        assert PermissionCache(tmp_path).get("alpa-team/repo", "user") == "write"
+
+    def test_expired(self, tmp_path):
+        cache = PermissionCache(tmp_path, ttl=10)
+        cache.set("ns/repo", "user", "write")
+        cached = cache._load()
+        cached["ns/repo:user"][1] = time.time() - 11
+        cache._save(cached)
+
+        assert cache.get("ns/repo", "user") is None
+
+    @pytest.mark.parametrize(
+        "repo, user, left",
+        [
+            pytest.param("ns/repo", "user", {"ns/repo:other", "ns/other:user"}),
+            pytest.param("ns/repo", None, {"ns/other:user"}),
+            pytest.param(None, "user", {"ns/repo:other"}),
+            pytest.param(None, None, set()),
+        ],
+    )
+    def test_invalidate(self, tmp_path, repo, user, left):
+        cache = PermissionCache(tmp_path)
+        for key in ["ns/repo:user", "ns/repo:other", "ns/other:user"]:
+            cache.set(*key.split(":"), "write")
+
+        cache.invalidate(repo, user)
+        assert set(cache._load()) == left
+
+
+class TestGithubRepoPermission:
+    @pytest.fixture
+    def gh_repo(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+        return GithubRepo(MagicMock(), "ns", "repo")
+
+    def test_write_access_is_cached(self, gh_repo):
+        gh_repo._repo.get_collaborator_permission.return_value = "write"
+
+        assert gh_repo.has_write_access("user")
+        assert gh_repo.has_write_access("user")
+        gh_repo._repo.get_collaborator_permission.assert_called_once_with("user")
+
+        gh_repo.forget_permission("user")
+        assert gh_repo.has_write_access("user")
+        assert gh_repo._repo.get_collaborator_permission.call_count == 2
+
+    def test_missing_write_access_is_verified(self, gh_repo):
+        gh_repo._repo.get_collaborator_permission.side_effect = GithubException(
+            403, {"message": "Must have push access"}
+        )
+
+        assert not gh_repo.has_write_access("user")
+        assert not gh_repo.has_write_access("user")
+        assert gh_repo._repo.get_collaborator_permission.call_count == 2
+
+
+class TestResponseCache:
+    def test_evict_least_recently_used(self, tmp_path):
+        cache = ResponseCache(tmp_path, max_size=250)
+        for key in ["a", "b", "c"]:
+            cache.set(key, CachedResponse("x" * 50, {}))
+            time.sleep(0.01)
+
+        cache.get("a")
+        cache.set("d", CachedResponse("x" * 50, {}))
+        assert [key for key in "abcd" if cache.get(key) is not None] == ["a", "c", "d"]
+
+
+class TestCachingHTTPSConnection:
+    @pytest.fixture
+    def connection(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+        connection = CachingHTTPSConnection("api.github.com")
+        connection.session = MagicMock()
+        return connection
+
+    def _get(self, connection, token="token abc"):
+        connection.request("GET", "/repos/ns/repo", None, {"Authorization": token})
+        return connection.getresponse()
+
+    def test_not_modified_response_is_served_from_cache(self, connection):
+        connection.session.get.return_value = gh_response(
+            200, '{"name": "repo"}', {"ETag": '"v1"', "X-RateLimit-Remaining": "10"}
+        )
+        assert self._get(connection).read() == '{"name": "repo"}'
+
+        connection.session.get.return_value = gh_response(
+            304, headers={"ETag": '"v1"', "X-RateLimit-Remaining": "9"}
+        )
+        response = self._get(connection)
+        sent_headers = connection.session.get.call_args.kwargs["headers"]
+        assert sent_headers["If-None-Match"] == '"v1"'
+        assert response.status == 200
+        assert response.read() == '{"name": "repo"}'
+        assert response.headers["X-RateLimit-Remaining"] == "9"
+
+        # responses of other tokens are never used
+        self._get(connection, token="token other")
+        sent_headers = connection.session.get.call_args.kwargs["headers"]
+        assert "If-None-Match" not in sent_headers
+
+    def test_other_requests_are_not_cached(self, connection):
+        connection.session.post.return_value = gh_response(201, "{}", {"ETag": '"v1"'})
+        connection.request("POST", "/repos/ns/repo/issues", "{}", {})
+        assert connection.getresponse().status == 201
+        assert not list(ResponseCache.for_token(None).cache_dir.iterdir())
+
+    def test_connections_share_session(self):
+        shared = http_sessions.session(GITHUB_SESSION)
+        with patch("requests.Session", wraps=requests.Session) as session_class:
+            first = CachingHTTPSConnection("api.github.com")
+            second = CachingHTTPSConnection("api.github.com", timeout=10)
+
+        assert first.session is second.session is shared
+        assert second.timeout == 10
+        session_class.assert_not_called()
+
+
+class TestPrivateCache:
+    def test_cache_is_private(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+        (tmp_path / "alpa").mkdir(mode=0o755)
+        cache = ResponseCache.for_token("token abc")
+        cache.set("key", CachedResponse("{}", {}))
+        PermissionCache().set("ns/repo", "user", "write")
+
+        for path in [tmp_path / "alpa", cache.cache_dir.parent, cache.cache_dir]:
+            assert path.stat().st_mode & 0o777 == 0o700
+
+        for path in [cache._path("key"), tmp_path / "alpa" / "permissions.json"]:
+            assert path.stat().st_mode & 0o777 == 0o600
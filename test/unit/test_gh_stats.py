@@ -0,0 +1,115 @@
+import json
+
+import pytest
+
+from alpa.gh import GithubAPI
+from alpa.gh_stats import api_stats
+from test.gh_standin import BASE_URL_PLACEHOLDER, GithubStandIn, Interaction
+
+
+def _repo(name, parent=None):
+    return {
+        "nameWithOwner": name,
+        "isFork": parent is not None,
+        "sshUrl": f"git@github.com:{name}.git",
+        "url": f"https://github.com/{name}",
+        "viewerPermission": "ADMIN",
+        "parent": parent,
+    }
+
+
+BOOTSTRAP = Interaction(
+    "POST",
+    "/graphql",
+    200,
+    json.dumps(
+        {
+            "data": {
+                "viewer": {"login": "user"},
+                "repository": _repo("user/repo", _repo("alpa-team/repo")),
+            }
+        }
+    ),
+)
+REPO = Interaction(
+    "GET",
+    "/repos/user/repo",
+    200,
+    json.dumps(
+        {
+            "full_name": "user/repo",
+            "name": "repo",
+            "url": f"{BASE_URL_PLACEHOLDER}/repos/user/repo",
+        }
+    ),
+    headers={"ETag": '"repo-v1"', "Content-Type": "application/json"},
+)
+
+
+@pytest.fixture
+def standin(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    with GithubStandIn([BOOTSTRAP, REPO]) as standin:
+        monkeypatch.setenv("ALPA_GH_API_URL", standin.url)
+        api_stats.reset()
+        yield standin
+
+    api_stats.reset()
+
+
+class TestApiCallStats:
+    def test_bootstrap_is_one_call(self, standin):
+        gh_repo = GithubAPI("repo", gh_token="token").bootstrap("user", "repo")
+
+        assert gh_repo.is_fork
+        assert gh_repo.clone_url == "git@github.com:user/repo.git"
+        assert gh_repo.get_upstream().namespace == "alpa-team"
+        assert standin.requests == [("POST", "/graphql")]
+        assert list(api_stats.endpoints) == ["POST /graphql"]
+        total = api_stats.total()
+        assert total.calls == 1
+        assert total.bytes_sent > 0 and total.bytes_received > 0
+
+    def test_unchanged_response_is_not_modified(self, standin):
+        for _ in range(2):
+            gh_repo = GithubAPI("repo", gh_token="token").get_repo("user", "repo")
+            assert gh_repo._repo.full_name == "user/repo"
+
+        stats = api_stats.endpoints["GET /repos/user/repo"]
+        assert stats.calls == 2
+        assert stats.not_modified == 1
+        assert not standin.unmatched
+
+    def test_report_to_file(self, standin, tmp_path, monkeypatch):
+        GithubAPI("repo", gh_token="token").bootstrap("user", "repo")
+        stats_file = tmp_path / "stats.jsonl"
+        monkeypatch.setenv("ALPA_GH_STATS", str(stats_file))
+        api_stats.report("clone")
+
+        report = json.loads(stats_file.read_text())
+        assert report["command"] == "clone"
+        assert report["total"]["calls"] == 1
+        assert report["endpoints"]["POST /graphql"]["calls"] == 1
+
+
+class TestGithubStandIn:
+    def test_record_and_replay(self, standin, tmp_path, monkeypatch):
+        with GithubStandIn(record_from=standin.url) as recorder:
+            monkeypatch.setenv("ALPA_GH_API_URL", recorder.url)
+            gh_repo = GithubAPI("repo", gh_token="token").get_repo("user", "repo")
+            assert gh_repo._repo.url == f"{recorder.url}/repos/user/repo"
+
+        fixture = tmp_path / "fixture.json"
+        recorder.save(fixture)
+        recorded = json.loads(fixture.read_text())
+        assert [(i["method"], i["path"]) for i in recorded] == [
+            ("GET", "/repos/user/repo")
+        ]
+        assert f"{BASE_URL_PLACEHOLDER}/repos/user/repo" in recorded[0]["body"]
+
+        with GithubStandIn.from_file(fixture) as replay:
+            monkeypatch.setenv("ALPA_GH_API_URL", replay.url)
+            monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "replay"))
+            gh_repo = GithubAPI("repo", gh_token="token").get_repo("user", "repo")
+            assert gh_repo._repo.url == f"{replay.url}/repos/user/repo"
+            assert replay.requests == [("GET", "/repos/user/repo")]
@@ -0,0 +1,52 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock
+
+import pytest
+
+from alpa.http_sessions import HTTPSessionManager
+
+CONTENT = b"tarball content" * 1000
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(CONTENT)))
+        self.end_headers()
+        self.wfile.write(CONTENT)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+class TestHTTPSessionManager:
+    def test_connections_are_reused(self, server_url):
+        manager = HTTPSessionManager()
+        for name in ["default", "default", "github"]:
+            assert manager.session(name).get(f"{server_url}/file").content == CONTENT
+
+        assert manager.session("github") is manager.session("github")
+        stats = manager.stats()
+        assert (stats.requests, stats.connections, stats.reused) == (3, 1, 2)
+        manager.close()
+
+    def test_set_transport(self):
+        manager = HTTPSessionManager()
+        session = manager.session()
+        transport = MagicMock()
+        manager.set_transport(transport)
+        assert session.get_adapter("https://example.com") is transport
+        assert manager.stats().requests == 0
@@ -0,0 +1,63 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from github import GithubException
+
+from alpa.constants import REQUEST_LABEL, RequestEnum, RequestResultEnum
+from alpa.repository.branch import AlpaRepoBranch
+
+
+def _issue(number, request_type, package):
+    issue = MagicMock()
+    issue.number = number
+    issue.body = json.dumps(
+        {"request_type": request_type, "user": "someone", "package": package}
+    )
+    return issue
+
+
+class TestRequestPackages:
+    @pytest.fixture
+    def issue_repo(self):
+        issue_repo = MagicMock()
+        issue_repo.iter_issues.return_value = iter(
+            [
+                _issue(1, "create", "je"),
+                _issue(2, "delete", "hele"),
+                MagicMock(number=3, body="not a request"),
+            ]
+        )
+        return issue_repo
+
+    @pytest.fixture
+    def alpa_repo(self, issue_repo):
+        alpa_repo = object.__new__(AlpaRepoBranch)
+        alpa_repo.gh_repo = MagicMock(repo_name="repo")
+        alpa_repo.gh_api = MagicMock(gh_user="user")
+        alpa_repo.gh_api.get_repo.return_value = issue_repo
+        return alpa_repo
+
+    def test_duplicates_are_skipped(self, alpa_repo, issue_repo):
+        results = alpa_repo.request_packages(
+            RequestEnum.create, ["je", "hele", "pikachu", "hele"]
+        )
+
+        assert results == {
+            "je": RequestResultEnum.duplicate,
+            "hele": RequestResultEnum.created,
+            "pikachu": RequestResultEnum.created,
+        }
+        issue_repo.iter_issues.assert_called_once_with("open", [REQUEST_LABEL])
+        assert issue_repo.create_issue.call_count == 2
+        for call in issue_repo.create_issue.call_args_list:
+            assert call.kwargs["labels"] == [REQUEST_LABEL]
+            assert json.loads(call.args[1])["request_type"] == "create"
+
+    def test_delete_of_requested_package(self, alpa_repo, issue_repo):
+        assert alpa_repo.request_package_delete("hele") == RequestResultEnum.duplicate
+        issue_repo.create_issue.assert_not_called()
+
+    def test_failed_request(self, alpa_repo, issue_repo):
+        issue_repo.create_issue.side_effect = GithubException(422, "nope", None)
+        assert alpa_repo.request_package("pikachu") == RequestResultEnum.failed
@@ -0,0 +1,24 @@
+import pytest
+
+from alpa.remote_refs import regex_literal_prefix
+
+
+class TestRemoteRefs:
+    @pytest.mark.parametrize(
+        "regex, prefix",
+        [
+            pytest.param("", ""),
+            pytest.param("python-", "python-"),
+            pytest.param("^python-.*", "python-"),
+            pytest.param("python3?-", "python"),
+            pytest.param("py[a-z]+", "py"),
+            pytest.param("python|perl", ""),
+            pytest.param(r"python\-requests\.", "python-requests."),
+            pytest.param(r"python\-?", "python"),
+            pytest.param(r"lib\d", "lib"),
+            pytest.param("(?i)python", ""),
+            pytest.param(".*python", ""),
+        ],
+    )
+    def test_regex_literal_prefix(self, regex, prefix):
+        assert regex_literal_prefix(regex) == prefix
@@ -0,0 +1,67 @@
+import pytest
+
+from alpa.search import PackageSearchIndex, TrigramIndex
+
+
+PACKAGES = [
+    "python-requests",
+    "python-requests-toolbelt",
+    "python3-pyyaml",
+    "rust-serde",
+    "requests-oauthlib",
+    "perl-JSON",
+    "golang-x-net",
+]
+
+
+class TestTrigramIndex:
+    @pytest.mark.parametrize(
+        "query, first",
+        [
+            pytest.param("python-requests", "python-requests"),
+            pytest.param("requests", "requests-oauthlib"),
+            pytest.param("reqests", "requests-oauthlib"),
+            pytest.param("pyaml", "python3-pyyaml"),
+            pytest.param("json", "perl-JSON"),
+            pytest.param("go", "golang-x-net"),
+        ],
+    )
+    def test_search(self, query, first):
+        assert TrigramIndex(PACKAGES).search(query)[0] == first
+
+    def test_search_substring_of_short_query(self):
+        assert TrigramIndex(PACKAGES).search("x") == ["golang-x-net"]
+
+    def test_search_limit(self):
+        assert len(TrigramIndex(PACKAGES).search("python", limit=2)) == 2
+
+    def test_search_without_match(self):
+        assert TrigramIndex(PACKAGES).search("zzzzzz") == []
+
+    def test_update(self):
+        index = TrigramIndex(PACKAGES)
+        assert not index.update(PACKAGES)
+        assert index.update(PACKAGES[1:] + ["new-package"])
+        assert index.names == set(PACKAGES[1:] + ["new-package"])
+        assert "python-requests" not in index.search("python-requests")
+
+        rebuilt = TrigramIndex(PACKAGES[1:] + ["new-package"])
+        assert rebuilt.to_dict() == index.to_dict()
+        assert TrigramIndex.from_dict(index.to_dict()).to_dict() == index.to_dict()
+
+
+class TestPackageSearchIndex:
+    def test_persisted_index(self, tmp_path):
+        PackageSearchIndex(tmp_path).sync(PACKAGES)
+        index_file = tmp_path / PackageSearchIndex.FILE_NAME
+        mtime = index_file.stat().st_mtime_ns
+
+        search_index = PackageSearchIndex(tmp_path)
+        search_index.sync(PACKAGES)
+        assert index_file.stat().st_mtime_ns == mtime
+        assert search_index.search("reqests")[0] == "requests-oauthlib"
+
+        search_index.sync(PACKAGES[1:] + ["new-package"])
+        reloaded = PackageSearchIndex(tmp_path)
+        assert reloaded.index.names == set(PACKAGES[1:] + ["new-package"])
+        assert reloaded.search("new")[0] == "new-package"
@@ -0,0 +1,38 @@
+import os
+import stat
+
+import pytest
+
+from alpa.state_file import load_json_state, save_json_state, write_atomically
+
+
+class TestStateFile:
+    def test_save_and_load(self, tmp_path):
+        state_file = tmp_path / "state.json"
+        assert load_json_state(state_file, "state") == {}
+
+        save_json_state(state_file, {"je": 1.5})
+        assert load_json_state(state_file, "state") == {"je": 1.5}
+        assert os.listdir(tmp_path) == ["state.json"]
+
+    @pytest.mark.parametrize("content", ["{broken", "[1, 2]"])
+    def test_broken_state_is_reset(self, tmp_path, content):
+        state_file = tmp_path / "state.json"
+        state_file.write_text(content)
+        assert load_json_state(state_file, "state") == {}
+
+    def test_mode(self, tmp_path):
+        state_file = tmp_path / "state.json"
+        save_json_state(state_file, {}, mode=0o600)
+        assert stat.S_IMODE(state_file.stat().st_mode) == 0o600
+
+    def test_failed_write_leaves_no_temporary_file(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            write_atomically(tmp_path / "missing" / "state.json", "{}")
+
+        state_file = tmp_path / "state.json"
+        state_file.mkdir()
+        with pytest.raises(OSError):
+            write_atomically(state_file, "{}")
+
+        assert os.listdir(tmp_path) == ["state.json"]